@@ -0,0 +1,124 @@
+"""
+Manifiesto de entradas de cada reporte generado, para recompilar solo lo que
+cambió.
+
+Por cada PDF final se guarda ``OUTPUT/<fecha>/.manifest/<pdf>.json`` con los
+tokens de DETALLE, un hash de la fila del Excel maestro, el motor de
+carátulas, los warnings del reporte y la lista exacta de archivos de entrada
+(ruta, tamaño, mtime y SHA-256). Un paciente se puede omitir si su reporte
+existe y todo eso coincide con lo que resuelve la corrida actual. Un archivo
+por reporte permite que varios procesos registren a la vez sin pisarse.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+
+MANIFEST_DIRNAME = ".manifest"
+
+# Cambiarla invalida todos los manifiestos (fuerza recompilar todo).
+MANIFEST_VERSION = 1
+
+# (ruta, tamaño, mtime) -> SHA-256 de los archivos ya hasheados en este
+# proceso: un PDF maestro que comparten todos los pacientes (separación
+# virtual) se lee una sola vez por corrida.
+_sha_cache: Dict[Tuple[str, int, int], str] = {}
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def row_fingerprint(row: pd.Series) -> str:
+    """Hash de todos los valores de la fila del Excel maestro."""
+    values = {str(k): str(v) for k, v in row.items()}
+    return hashlib.sha256(json.dumps(values, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class BuildManifest:
+    """Manifiestos de los reportes de un directorio de salida."""
+
+    def __init__(self, output_dir: Path):
+        self.manifest_dir = Path(output_dir) / MANIFEST_DIRNAME
+
+    def _path_for(self, report_name: str) -> Path:
+        return self.manifest_dir / f"{report_name}.json"
+
+    def get(self, report_name: str) -> Optional[Dict]:
+        """Retorna el manifiesto registrado para ``report_name`` o None."""
+        try:
+            with open(self._path_for(report_name), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if entry.get("version") != MANIFEST_VERSION:
+            return None
+        return entry
+
+    def describe_inputs(self, paths: List[Path], previous: Optional[Dict] = None) -> List[Dict]:
+        """Describe los archivos de entrada (ruta, tamaño, mtime, SHA-256).
+
+        El hash se reutiliza del manifiesto ``previous`` cuando ruta, tamaño
+        y mtime no cambiaron, así una corrida sin cambios no relee los PDFs.
+        """
+        known = {}
+        if previous:
+            known = {item["path"]: item for item in previous.get("inputs", [])}
+        inputs = []
+        for path in paths:
+            path = Path(path)
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                inputs.append({"path": str(path), "size": None, "mtime_ns": None, "sha256": None})
+                continue
+            old = known.get(str(path))
+            cache_key = (str(path), stat.st_size, stat.st_mtime_ns)
+            if old and old["size"] == stat.st_size and old["mtime_ns"] == stat.st_mtime_ns:
+                sha = old["sha256"]
+            elif cache_key in _sha_cache:
+                sha = _sha_cache[cache_key]
+            else:
+                sha = file_sha256(path)
+                _sha_cache[cache_key] = sha
+            inputs.append({"path": str(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha})
+        return inputs
+
+    @staticmethod
+    def matches(previous: Optional[Dict], current: Dict) -> bool:
+        """True si ``current`` tiene las mismas entradas que ``previous``.
+        Un archivo cuyo mtime cambió pero con el mismo contenido no cuenta
+        como cambio."""
+        if not previous:
+            return False
+        for key in ("tokens", "row_hash", "caratula_renderer"):
+            if previous.get(key) != current.get(key):
+                return False
+        old_inputs = [(i["path"], i["sha256"]) for i in previous.get("inputs", [])]
+        new_inputs = [(i["path"], i["sha256"]) for i in current.get("inputs", [])]
+        return old_inputs == new_inputs
+
+    def record(self, report_name: str, entry: Dict):
+        """Guarda el manifiesto de ``report_name`` (escritura atómica)."""
+        self.manifest_dir.mkdir(parents=True, exist_ok=True)
+        entry = dict(entry, version=MANIFEST_VERSION)
+        fd, tmp_name = tempfile.mkstemp(suffix=".tmp", dir=self.manifest_dir)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_name, self._path_for(report_name))
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    def forget(self, report_name: str):
+        self._path_for(report_name).unlink(missing_ok=True)
@@ -0,0 +1,129 @@
+"""
+Caché persistente de carátulas convertidas a PDF.
+
+Las carátulas se identifican por el SHA-256 de los bytes del XLSX más la
+versión del conversor que las generó, así una carátula que no cambió se
+reutiliza entre corridas (y entre el modo "un paciente" y "todos") sin
+volver a pasar por LibreOffice. El tamaño total está acotado: al superar
+``max_bytes`` se borran las entradas usadas hace más tiempo (LRU por mtime,
+que se actualiza en cada acierto).
+
+Como otra corrida (u otro proceso de la misma) puede desalojar una entrada
+en cualquier momento, quien necesita el PDF hasta más tarde (el merge del
+paciente) lo saca con ``checkout`` a su directorio de trabajo en lugar de
+usar la ruta del caché.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+
+CARATULA_CACHE_DIR = Path(__file__).resolve().parent.parent / "OUTPUT" / ".cache" / "caratulas"
+
+DEFAULT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Versión de cada conversor. Cambiarla invalida las carátulas cacheadas que
+# generó ese motor (por ejemplo, al corregir el renderer nativo).
+CONVERTER_VERSIONS = {
+    "libreoffice": "libreoffice-1",
+    "native": "native-1",
+}
+
+
+class CaratulaCache:
+    """Caché direccionado por contenido de PDFs de carátulas."""
+
+    def __init__(self, cache_dir: Path = CARATULA_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+    def key_for(self, xlsx_path: Path, renderer: str = "libreoffice") -> str:
+        """Clave de la carátula: SHA-256 de la versión del conversor + bytes del XLSX."""
+        digest = hashlib.sha256()
+        digest.update(CONVERTER_VERSIONS.get(renderer, renderer).encode("utf-8"))
+        digest.update(b"\0")
+        with open(xlsx_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _path_for(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.pdf"
+
+    def get(self, key: str) -> Optional[Path]:
+        """Retorna el PDF cacheado para ``key`` (y lo marca como recién usado) o None."""
+        path = self._path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def checkout(self, key: str, dest: Path) -> Optional[Path]:
+        """Como ``get`` pero deja la entrada en ``dest`` (hard link o, si no
+        se puede, copia) y retorna ``dest``, o None si no está. ``dest``
+        sigue valiendo aunque la entrada se desaloje después."""
+        path = self.get(key)
+        if path is None:
+            return None
+        dest = Path(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        dest.unlink(missing_ok=True)
+        try:
+            os.link(path, dest)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            try:
+                shutil.copyfile(path, dest)
+            except FileNotFoundError:
+                return None
+        return dest
+
+    def put(self, key: str, pdf_path: Path) -> Path:
+        """Copia ``pdf_path`` al caché bajo ``key`` y retorna la ruta cacheada.
+
+        La escritura es atómica (archivo temporal + ``os.replace``) para que
+        una corrida en paralelo nunca lea un PDF a medio copiar.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        target = self._path_for(key)
+        fd, tmp_name = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+        os.close(fd)
+        try:
+            shutil.copyfile(pdf_path, tmp_name)
+            os.replace(tmp_name, target)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        self.evict(keep=target)
+        return target
+
+    def evict(self, keep: Optional[Path] = None):
+        """Borra las entradas menos usadas hasta quedar debajo de ``max_bytes``."""
+        entries = []
+        total = 0
+        for path in self.cache_dir.glob("*.pdf"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        print(f"🧹 Caché de carátulas: {removed} entradas eliminadas ({total / 1e6:.1f} MB en uso)")
@@ -0,0 +1,418 @@
+"""
+Renderer nativo de carátulas: dibuja la hoja XLSX directamente en una página
+de ``fitz`` sin pasar por LibreOffice.
+
+Las carátulas son formularios chicos y siempre con la misma plantilla, así
+que alcanza con soportar lo que usan: textos, bordes, rellenos sólidos,
+celdas combinadas, anchos de columna / altos de fila, imágenes ancladas a
+celdas y el formato de fecha argentino (DD/MM/AAAA) que ``libreoffice-arg``
+fuerza con su perfil. Cualquier otra cosa (gráficos, formatos numéricos
+raros, caracteres fuera de Latin-1, hojas que no entran en una página) lanza
+``CaratulaRenderError`` para que el llamador use LibreOffice.
+"""
+import datetime
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import fitz
+import openpyxl
+from openpyxl.styles.colors import COLOR_INDEX
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.cell import range_boundaries
+
+
+# Motores de carátula seleccionables por corrida.
+CARATULA_RENDERERS = ("libreoffice", "native")
+
+# A4 en puntos.
+_PAGE_SIZES = {"portrait": (595.0, 842.0), "landscape": (842.0, 595.0)}
+
+# Por debajo de esta escala la hoja no entra razonablemente en una página
+# (LibreOffice la partiría en varias) y se prefiere el fallback.
+_MIN_SCALE = 0.5
+
+_EMU_PER_POINT = 12700
+
+_BORDER_WIDTHS = {
+    "hair": 0.25, "thin": 0.5, "dotted": 0.5, "dashed": 0.5, "dashDot": 0.5,
+    "dashDotDot": 0.5, "medium": 1.0, "mediumDashed": 1.0, "mediumDashDot": 1.0,
+    "mediumDashDotDot": 1.0, "slantDashDot": 1.0, "double": 1.5, "thick": 1.5,
+}
+_BORDER_DASHES = {
+    "dotted": "[1 1] 0", "dashed": "[3 2] 0", "mediumDashed": "[4 2] 0",
+}
+
+# Formatos de número que se saben reproducir (además de los de fecha).
+_NUMBER_FORMAT_RE = re.compile(r'^(#,##)?0(\.(0+))?(%)?$')
+
+
+class CaratulaRenderError(Exception):
+    """La hoja usa algo que el renderer nativo no sabe dibujar."""
+
+
+def _column_width_points(width_chars: float) -> float:
+    """Convierte el ancho de columna de Excel (en caracteres) a puntos,
+    con la misma fórmula que usan Excel/LibreOffice para Calibri 11."""
+    pixels = int(((256 * width_chars + int(128 / 7)) / 256) * 7)
+    return pixels * 0.75
+
+
+def _rgb(color) -> Optional[Tuple[float, float, float]]:
+    """Color de openpyxl a RGB de fitz. ``None`` si no tiene color explícito."""
+    if color is None:
+        return None
+    if color.type == "rgb" and isinstance(color.rgb, str):
+        argb = color.rgb[-6:]
+    elif color.type == "indexed" and color.indexed is not None:
+        if color.indexed >= len(COLOR_INDEX):
+            return None  # "system foreground/background": usar el default
+        argb = COLOR_INDEX[color.indexed][-6:]
+    elif color.type == "theme":
+        raise CaratulaRenderError("colores de tema no soportados")
+    else:
+        return None
+    return tuple(int(argb[i:i + 2], 16) / 255 for i in (0, 2, 4))
+
+
+def _font_color(font) -> Tuple[float, float, float]:
+    try:
+        return _rgb(font.color) or (0, 0, 0)
+    except CaratulaRenderError:
+        # El texto en plantillas casi siempre usa el color de tema 1 (negro).
+        return (0, 0, 0)
+
+
+_MESES = ("enero", "febrero", "marzo", "abril", "mayo", "junio", "julio",
+          "agosto", "septiembre", "octubre", "noviembre", "diciembre")
+_DIAS = ("lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo")
+
+# Formatos "fecha corta del sistema": LibreOffice los muestra según el
+# locale, que el perfil de ``libreoffice-arg`` fija en DD/MM/AAAA.
+_LOCALE_DATE_FORMATS = {BUILTIN_FORMATS[14], "General"}
+_LOCALE_DATETIME_FORMATS = {BUILTIN_FORMATS[22]}
+
+_DATE_TOKEN_RE = re.compile(r'y+|m+|d+|h+|s+|.', re.IGNORECASE)
+
+
+def _format_date(value, number_format: str) -> str:
+    """Formatea fechas/horas como LibreOffice con locale es_AR."""
+    if isinstance(value, datetime.time):
+        value = datetime.datetime.combine(datetime.date(1899, 12, 30), value)
+    elif not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time())
+    if number_format in _LOCALE_DATE_FORMATS:
+        return value.strftime("%d/%m/%Y")
+    if number_format in _LOCALE_DATETIME_FORMATS:
+        return value.strftime("%d/%m/%Y %H:%M")
+
+    fmt = number_format.split(";")[0]
+    fmt = re.sub(r'\[[^\]]*\]', "", fmt).replace("\\", "").replace('"', "")
+    tokens = _DATE_TOKEN_RE.findall(fmt)
+    out = []
+    for i, token in enumerate(tokens):
+        kind, size = token[0].lower(), len(token)
+        if kind == "y":
+            out.append(f"{value.year:04d}" if size > 2 else f"{value.year % 100:02d}")
+        elif kind == "d":
+            if size >= 4:
+                out.append(_DIAS[value.weekday()])
+            elif size == 3:
+                out.append(_DIAS[value.weekday()][:3])
+            else:
+                out.append(f"{value.day:0{size}d}")
+        elif kind == "m":
+            # "m" después de horas o antes de segundos son minutos.
+            previous = next((t[0].lower() for t in reversed(tokens[:i]) if t[0].lower() in "ydhms"), "")
+            following = next((t[0].lower() for t in tokens[i + 1:] if t[0].lower() in "ydhms"), "")
+            if previous == "h" or following == "s":
+                out.append(f"{value.minute:0{min(size, 2)}d}")
+            elif size >= 4:
+                out.append(_MESES[value.month - 1])
+            elif size == 3:
+                out.append(_MESES[value.month - 1][:3])
+            else:
+                out.append(f"{value.month:0{size}d}")
+        elif kind == "h":
+            out.append(f"{value.hour:0{min(size, 2)}d}")
+        elif kind == "s":
+            out.append(f"{value.second:0{min(size, 2)}d}")
+        else:
+            out.append(token)
+    return "".join(out)
+
+
+def _format_number(value: float, number_format: str) -> str:
+    if number_format in ("General", BUILTIN_FORMATS[0]):
+        if float(value).is_integer():
+            return str(int(value))
+        text = f"{value:.10g}"
+        return text.replace(".", ",")
+    match = _NUMBER_FORMAT_RE.match(number_format)
+    if not match:
+        raise CaratulaRenderError(f"formato numérico no soportado: {number_format!r}")
+    thousands, _, decimals, percent = match.groups()
+    if percent:
+        value = value * 100
+    text = f"{value:,.{len(decimals or '')}f}"
+    if not thousands:
+        text = text.replace(",", "")
+    # Separadores argentinos: miles con punto, decimales con coma.
+    text = text.replace(",", "\x00").replace(".", ",").replace("\x00", ".")
+    return text + ("%" if percent else "")
+
+
+def format_cell_value(cell) -> str:
+    """Texto que muestra la celda, con formatos argentinos."""
+    value = cell.value
+    if value is None:
+        return ""
+    number_format = cell.number_format or "General"
+    if isinstance(value, (datetime.date, datetime.time)):
+        return _format_date(value, number_format)
+    if isinstance(value, bool):
+        return "VERDADERO" if value else "FALSO"
+    if isinstance(value, (int, float)):
+        if is_date_format(number_format):
+            base = datetime.datetime(1899, 12, 30) + datetime.timedelta(days=value)
+            return _format_date(base, number_format)
+        return _format_number(value, number_format)
+    text = str(value)
+    if any(ord(c) > 255 for c in text):
+        raise CaratulaRenderError("caracteres fuera de Latin-1 en la hoja")
+    return text
+
+
+def _font_name(font) -> str:
+    if font.b and font.i:
+        return "hebi"
+    if font.b:
+        return "hebo"
+    if font.i:
+        return "heit"
+    return "helv"
+
+
+def _used_range(ws) -> Tuple[int, int, int, int]:
+    """(min_col, min_row, max_col, max_row) a dibujar: el área de impresión
+    si está definida, si no la dimensión usada de la hoja."""
+    print_area = ws.print_area
+    if print_area:
+        areas = print_area if isinstance(print_area, list) else print_area.split(",")
+        if len(areas) != 1:
+            raise CaratulaRenderError("áreas de impresión múltiples no soportadas")
+        ref = areas[0].split("!")[-1].replace("$", "")
+        return range_boundaries(ref)
+    return range_boundaries(ws.calculate_dimension())
+
+
+def _image_rect(image, col_x: Dict[int, float], row_y: Dict[int, float]) -> fitz.Rect:
+    anchor = image.anchor
+    kind = type(anchor).__name__
+    if kind not in ("OneCellAnchor", "TwoCellAnchor"):
+        raise CaratulaRenderError(f"ancla de imagen no soportada: {kind}")
+
+    def point(marker):
+        col, row = marker.col + 1, marker.row + 1
+        if col not in col_x or row not in row_y:
+            raise CaratulaRenderError("imagen fuera del área dibujada")
+        return (col_x[col] + marker.colOff / _EMU_PER_POINT,
+                row_y[row] + marker.rowOff / _EMU_PER_POINT)
+
+    x0, y0 = point(anchor._from)
+    if kind == "TwoCellAnchor":
+        x1, y1 = point(anchor.to)
+    else:
+        x1 = x0 + anchor.ext.width / _EMU_PER_POINT
+        y1 = y0 + anchor.ext.height / _EMU_PER_POINT
+    return fitz.Rect(x0, y0, x1, y1)
+
+
+def render_caratula_to_pdf(xlsx_path: Path, output_pdf_path: Path):
+    """Dibuja la hoja activa de ``xlsx_path`` en un PDF de una página.
+
+    Cualquier falla del dibujo (un XLSX que openpyxl no puede leer, una
+    imagen enlazada o en un formato que MuPDF no abre) se relanza como
+    ``CaratulaRenderError`` y no deja un PDF a medias, así el llamador
+    siempre puede recurrir a LibreOffice.
+
+    Raises:
+        FileNotFoundError: si no existe ``xlsx_path``.
+        CaratulaRenderError: si la hoja usa algo no soportado o no se pudo
+            dibujar.
+    """
+    xlsx_path = Path(xlsx_path)
+    output_pdf_path = Path(output_pdf_path)
+    if not xlsx_path.exists():
+        raise FileNotFoundError(f"XLSX de entrada no existe: {xlsx_path}")
+
+    try:
+        _render_caratula(xlsx_path, output_pdf_path)
+    except CaratulaRenderError:
+        output_pdf_path.unlink(missing_ok=True)
+        raise
+    except Exception as e:
+        output_pdf_path.unlink(missing_ok=True)
+        raise CaratulaRenderError(f"error inesperado: {type(e).__name__}: {e}") from e
+
+
+def _render_caratula(xlsx_path: Path, output_pdf_path: Path):
+    wb = openpyxl.load_workbook(xlsx_path)
+    ws = wb.active
+    if getattr(ws, "_charts", None):
+        raise CaratulaRenderError("la hoja tiene gráficos")
+    has_formulas = any(
+        cell.data_type == "f" for row in ws.iter_rows() for cell in row
+    )
+    if has_formulas:
+        # Se usan los valores cacheados por quien guardó el archivo; si no
+        # hay (el XLSX nunca se abrió en Excel/LibreOffice) hay que recalcular
+        # y eso solo lo hace LibreOffice.
+        formula_cells = [
+            cell.coordinate for row in ws.iter_rows() for cell in row if cell.data_type == "f"
+        ]
+        wb = openpyxl.load_workbook(xlsx_path, data_only=True)
+        ws = wb.active
+        if any(ws[coord].value is None for coord in formula_cells):
+            raise CaratulaRenderError("fórmulas sin valor calculado")
+
+    min_col, min_row, max_col, max_row = _used_range(ws)
+
+    # Geometría de la grilla, en puntos, sin escalar.
+    default_width = ws.sheet_format.defaultColWidth or ws.sheet_format.baseColWidth or 8.43
+    default_height = ws.sheet_format.defaultRowHeight or 15.0
+    col_x: Dict[int, float] = {}
+    x = 0.0
+    for col in range(min_col, max_col + 2):
+        col_x[col] = x
+        dim = ws.column_dimensions.get(get_column_letter(col))
+        if dim is not None and dim.hidden:
+            continue
+        width = dim.width if dim is not None and dim.width else default_width
+        x += _column_width_points(width)
+    row_y: Dict[int, float] = {}
+    y = 0.0
+    for row in range(min_row, max_row + 2):
+        row_y[row] = y
+        dim = ws.row_dimensions.get(row)
+        if dim is not None and dim.hidden:
+            continue
+        y += dim.height if dim is not None and dim.height else default_height
+    total_width, total_height = col_x[max_col + 1], row_y[max_row + 1]
+
+    orientation = ws.page_setup.orientation if ws.page_setup.orientation in _PAGE_SIZES else "portrait"
+    page_width, page_height = _PAGE_SIZES[orientation]
+    margins = ws.page_margins
+    left, top = (margins.left or 0.7) * 72, (margins.top or 0.75) * 72
+    available_w = page_width - left - (margins.right or 0.7) * 72
+    available_h = page_height - top - (margins.bottom or 0.75) * 72
+    scale = min(1.0, available_w / max(total_width, 1), available_h / max(total_height, 1))
+    if scale < _MIN_SCALE:
+        raise CaratulaRenderError("la hoja no entra en una página")
+
+    def cell_rect(c0: int, r0: int, c1: int, r1: int) -> fitz.Rect:
+        return fitz.Rect(
+            left + col_x[c0] * scale, top + row_y[r0] * scale,
+            left + col_x[c1 + 1] * scale, top + row_y[r1 + 1] * scale,
+        )
+
+    # Celdas combinadas: la celda superior izquierda ocupa todo el rango.
+    merged_spans: Dict[Tuple[int, int], Tuple[int, int]] = {}
+    covered = set()
+    for merged in ws.merged_cells.ranges:
+        merged_spans[(merged.min_row, merged.min_col)] = (merged.max_row, merged.max_col)
+        for r in range(merged.min_row, merged.max_row + 1):
+            for c in range(merged.min_col, merged.max_col + 1):
+                if (r, c) != (merged.min_row, merged.min_col):
+                    covered.add((r, c))
+
+    doc = fitz.open()
+    page = doc.new_page(width=page_width, height=page_height)
+    texts: List[Tuple] = []
+    borders: List[Tuple] = []
+
+    for row in ws.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col):
+        for cell in row:
+            r, c = cell.row, cell.column
+            if (r, c) not in covered:
+                max_r, max_c = merged_spans.get((r, c), (r, c))
+                rect = cell_rect(c, r, min(max_c, max_col), min(max_r, max_row))
+                if rect.is_empty:
+                    continue
+                fill = cell.fill
+                if fill is not None and fill.fill_type == "solid":
+                    color = _rgb(fill.fgColor)
+                    if color is not None:
+                        page.draw_rect(rect, color=None, fill=color, width=0)
+                text = format_cell_value(cell)
+                if text:
+                    texts.append((cell, rect, text))
+
+            border = cell.border
+            if border is not None:
+                rect = cell_rect(c, r, c, r)
+                for side, p0, p1 in (
+                    (border.left, rect.tl, rect.bl), (border.right, rect.tr, rect.br),
+                    (border.top, rect.tl, rect.tr), (border.bottom, rect.bl, rect.br),
+                ):
+                    if side is not None and side.style:
+                        borders.append((side, p0, p1))
+
+    # Bordes por encima de los rellenos y por debajo del texto.
+    for side, p0, p1 in borders:
+        try:
+            color = _rgb(side.color) or (0, 0, 0)
+        except CaratulaRenderError:
+            color = (0, 0, 0)
+        page.draw_line(
+            p0, p1, color=color,
+            width=_BORDER_WIDTHS.get(side.style, 0.5) * max(scale, 0.75),
+            dashes=_BORDER_DASHES.get(side.style),
+        )
+
+    for cell, rect, text in texts:
+        font = cell.font
+        fontname = _font_name(font)
+        fontsize = (font.sz or 11) * scale
+        color = _font_color(font)
+        alignment = cell.alignment
+        horizontal = alignment.horizontal or "general"
+        if horizontal == "general":
+            horizontal = "right" if isinstance(cell.value, (int, float, datetime.date)) \
+                and not isinstance(cell.value, bool) else "left"
+        padding = 2 * scale
+
+        if alignment.wrap_text or "\n" in text:
+            align = {"center": fitz.TEXT_ALIGN_CENTER, "right": fitz.TEXT_ALIGN_RIGHT,
+                     "justify": fitz.TEXT_ALIGN_JUSTIFY}.get(horizontal, fitz.TEXT_ALIGN_LEFT)
+            box = fitz.Rect(rect.x0 + padding, rect.y0 + padding, rect.x1 - padding, rect.y1)
+            page.insert_textbox(box, text, fontsize=fontsize, fontname=fontname,
+                                color=color, align=align)
+            continue
+
+        text_width = fitz.get_text_length(text, fontname=fontname, fontsize=fontsize)
+        if horizontal in ("center", "centerContinuous", "fill"):
+            x = rect.x0 + (rect.width - text_width) / 2
+        elif horizontal == "right":
+            x = rect.x1 - padding - text_width
+        else:
+            x = rect.x0 + padding + (alignment.indent or 0) * 3 * fontsize / 4
+        vertical = alignment.vertical or "bottom"
+        if vertical == "top":
+            y = rect.y0 + fontsize
+        elif vertical in ("center", "distributed", "justify"):
+            y = rect.y0 + (rect.height + fontsize * 0.7) / 2
+        else:
+            y = rect.y1 - fontsize * 0.25
+        page.insert_text((x, y), text, fontsize=fontsize, fontname=fontname, color=color)
+
+    for image in getattr(ws, "_images", []):
+        rect = _image_rect(image, col_x, row_y)
+        rect = fitz.Rect(left + rect.x0 * scale, top + rect.y0 * scale,
+                         left + rect.x1 * scale, top + rect.y1 * scale)
+        page.insert_image(rect, stream=image._data(), keep_proportion=False)
+
+    output_pdf_path.parent.mkdir(parents=True, exist_ok=True)
+    doc.save(output_pdf_path)
+    doc.close()
@@ -1,15 +1,96 @@
+import os
+import signal
 import subprocess
 from pathlib import Path
 import fitz
-import re
-from typing import Optional
+from typing import Dict, List, Optional
 
 from PIL import Image, ImageOps
 import tempfile
 import shutil
-from app.fuzzy_match import normalize_name
+from app.page_classifier import PAGE_RULES, Region, classify_pages
 
-def convert_xlsx_to_pdf(xlsx_path: Path, output_pdf_path: Path):
+
+# Wrapper instalado en el Dockerfile que lanza LibreOffice con locale argentino.
+LIBREOFFICE_BIN = "libreoffice-arg"
+
+# Perfil por defecto de LibreOffice. El Dockerfile deja ahí el
+# ``registrymodifications.xcu`` con el formato de fecha DD/MM/AAAA.
+_DEFAULT_LIBREOFFICE_PROFILE = Path.home() / ".config" / "libreoffice" / "4"
+
+# Tiempo máximo de una conversión por lotes: el arranque de soffice más un
+# margen por archivo. Si se pasa, LibreOffice se mata y los XLSX que no
+# llegaron a convertirse se convierten de a uno, con BATCH_RETRY_TIMEOUT_S
+# cada uno.
+BATCH_TIMEOUT_BASE_S = 60.0
+BATCH_TIMEOUT_PER_FILE_S = 15.0
+BATCH_RETRY_TIMEOUT_S = 120.0
+
+
+def libreoffice_env() -> dict:
+    """Entorno para procesos de LibreOffice con el mismo locale que ``libreoffice-arg``."""
+    env = os.environ.copy()
+    env["LANG"] = "es_AR.UTF-8"
+    env["LC_TIME"] = "es_AR.UTF-8"
+    return env
+
+
+def prepare_libreoffice_profile(profile_dir: Path) -> str:
+    """Crea (si no existe) un perfil de usuario aislado de LibreOffice y
+    retorna el argumento ``-env:UserInstallation`` que lo selecciona.
+
+    Dos instancias de LibreOffice con el mismo perfil no pueden correr a la
+    vez (la segunda le delega el trabajo a la primera y termina), así que
+    cada instancia concurrente necesita su propio perfil. Se copia la
+    configuración de fecha del perfil por defecto para que las carátulas
+    salgan con el mismo formato que con ``libreoffice-arg``.
+    """
+    profile_dir = Path(profile_dir).resolve()
+    user_dir = profile_dir / "user"
+    user_dir.mkdir(parents=True, exist_ok=True)
+    registry_src = _DEFAULT_LIBREOFFICE_PROFILE / "user" / "registrymodifications.xcu"
+    registry_dst = user_dir / "registrymodifications.xcu"
+    if registry_src.exists() and not registry_dst.exists():
+        shutil.copy2(registry_src, registry_dst)
+    return f"-env:UserInstallation={profile_dir.as_uri()}"
+
+
+def _run_libreoffice(cmd: List[str], timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+    """Como ``subprocess.run(cmd, capture_output=True, text=True)`` pero con
+    LibreOffice en un grupo de procesos propio: si se pasa de ``timeout`` (o
+    se interrumpe la espera) se mata el grupo entero, el wrapper y el
+    soffice que lanzó, y se relanza la excepción."""
+    process = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, start_new_session=True
+    )
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except BaseException:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            process.kill()
+        process.communicate()
+        raise
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+
+def _is_complete_pdf(path: Path) -> bool:
+    """True si ``path`` termina con ``%%EOF`` (un LibreOffice cortado a
+    mitad de la escritura deja el PDF truncado)."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(max(0, path.stat().st_size - 1024))
+            return b"%%EOF" in f.read()
+    except OSError:
+        return False
+
+
+def convert_xlsx_to_pdf(xlsx_path: Path, output_pdf_path: Path, profile_dir: Optional[Path] = None,
+                        timeout: Optional[float] = None):
+    """Convierte un XLSX a PDF con una invocación de LibreOffice. Con
+    ``timeout`` lanza ``subprocess.TimeoutExpired`` (después de matar
+    LibreOffice) si no termina a tiempo."""
     xlsx_path = Path(xlsx_path)
     output_pdf_path = Path(output_pdf_path)
 
@@ -19,10 +100,12 @@ def convert_xlsx_to_pdf(xlsx_path: Path, output_pdf_path: Path):
     with tempfile.TemporaryDirectory() as tmpdir:
         tmpdir_path = Path(tmpdir)
         cmd = [
-            "libreoffice-arg", "--headless", "--convert-to", "pdf",
+            LIBREOFFICE_BIN, "--headless", "--convert-to", "pdf",
             "--outdir", str(tmpdir_path), str(xlsx_path)
         ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        if profile_dir is not None:
+            cmd.insert(1, prepare_libreoffice_profile(profile_dir))
+        result = _run_libreoffice(cmd, timeout)
         if result.returncode != 0:
             raise RuntimeError(
                 f"LibreOffice falló convirtiendo {xlsx_path.name} "
@@ -51,18 +134,82 @@ def convert_xlsx_to_pdf(xlsx_path: Path, output_pdf_path: Path):
         shutil.move(str(generated_pdf), str(output_pdf_path))
 
 
-def extract_dni_from_page_text(text: str) -> Optional[str]:
-    # Primero intenta encontrar el patrón "(DNI ...)"
-    match = re.search(r"\(\s*[A-Z]?\s*([0-9.]{6,15})\s*\)", text)
-    if match:
-        return match.group(1).replace('.', '')
-    
-    # Luego intenta encontrar "DNI 36602956" o "DNI 29.432.074"
-    match_alt = re.search(r"DNI[\s:]*([0-9.]{6,15})", text)
-    if match_alt:
-        return match_alt.group(1).replace('.', '')
+def convert_xlsx_batch_to_pdf(xlsx_paths: List[Path], output_dir: Path,
+                              profile_dir: Optional[Path] = None) -> Dict[Path, Path]:
+    """Convierte varios XLSX a PDF en una sola invocación de LibreOffice.
 
-    return None
+    LibreOffice acepta muchos archivos de entrada por llamada y escribe
+    ``{stem}.pdf`` en ``output_dir`` por cada uno, así que se paga un solo
+    arranque de soffice por lote. No lanza excepción si algún archivo no se
+    pudo convertir: retorna solo los que efectivamente generaron PDF y el
+    llamador decide cómo convertir el resto.
+
+    La invocación tiene un timeout proporcional a la cantidad de archivos
+    (ver ``BATCH_TIMEOUT_BASE_S``). Si se pasa, LibreOffice se mata y los
+    archivos que no llegaron a convertirse se convierten de a uno.
+
+    Returns:
+        Diccionario {xlsx_path: pdf_generado}.
+    """
+    output_dir = Path(output_dir)
+    # Stems repetidos pisarían la salida del otro en output_dir.
+    unique_inputs: Dict[str, Path] = {}
+    for xlsx in xlsx_paths:
+        xlsx = Path(xlsx)
+        if xlsx.exists():
+            unique_inputs.setdefault(xlsx.stem, xlsx)
+    if not unique_inputs:
+        return {}
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    cmd = [
+        LIBREOFFICE_BIN, "--headless", "--convert-to", "pdf",
+        "--outdir", str(output_dir), *[str(p) for p in unique_inputs.values()]
+    ]
+    if profile_dir is not None:
+        cmd.insert(1, prepare_libreoffice_profile(profile_dir))
+    timeout = BATCH_TIMEOUT_BASE_S + BATCH_TIMEOUT_PER_FILE_S * len(unique_inputs)
+    timed_out = False
+    try:
+        result = _run_libreoffice(cmd, timeout)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        print(
+            f"⚠️ La conversión por lotes no terminó en {timeout:.0f}s: se cortó LibreOffice "
+            f"y los archivos que faltan se convierten de a uno"
+        )
+    else:
+        if result.returncode != 0:
+            print(
+                f"⚠️ LibreOffice terminó con returncode={result.returncode} en la conversión por lotes.\n"
+                f"STDERR: {result.stderr.strip()}"
+            )
+
+    # El perfil del lote puede haber quedado bloqueado por el soffice muerto.
+    retry_profile = Path(f"{profile_dir}_reintento") if profile_dir is not None else None
+    converted: Dict[Path, Path] = {}
+    for stem, xlsx in unique_inputs.items():
+        pdf = output_dir / f"{stem}.pdf"
+        if pdf.exists() and (not timed_out or _is_complete_pdf(pdf)):
+            converted[xlsx] = pdf
+        elif timed_out:
+            pdf.unlink(missing_ok=True)
+            try:
+                convert_xlsx_to_pdf(xlsx, pdf, profile_dir=retry_profile, timeout=BATCH_RETRY_TIMEOUT_S)
+            except (RuntimeError, FileNotFoundError, subprocess.TimeoutExpired) as e:
+                print(f"⚠️ No se pudo convertir {xlsx.name} después del lote cortado: {e}")
+                continue
+            converted[xlsx] = pdf
+        else:
+            print(f"⚠️ La conversión por lotes no generó PDF para {xlsx.name}")
+    print(f"📚 Conversión por lotes: {len(converted)}/{len(unique_inputs)} carátulas convertidas")
+    return converted
+
+
+def extract_dni_from_page_text(text: str) -> Optional[str]:
+    """DNI de la página: "(DNI ...)" o "DNI 29.432.074" (ver
+    ``PAGE_RULES["dni"]``)."""
+    return PAGE_RULES["dni"].value(text)
 
 '''
 def extract_dni_from_page_text(text: str) -> Optional[str]:
@@ -79,55 +226,40 @@ def extract_dni_from_page_text(text: str) -> Optional[str]:
     return None
 '''
 
-def split_pdf_by_dni(input_pdf: Path, output_dir: Path):
-    doc = fitz.open(input_pdf)
-    output_dir.mkdir(parents=True, exist_ok=True)
+def group_pages_by_dni(doc: "fitz.Document", region: Optional[Region] = None) -> Dict[str, List[int]]:
+    """Índices de página de ``doc`` agrupados por DNI (el nombre, sin
+    ``.pdf``, del archivo que genera ``split_pdf_by_dni``)."""
+    return group_page_keys(doc_page_keys(doc, "dni", region=region), "dni")
 
-    grouped_pages = {}
-    for i, page in enumerate(doc):
-        text = page.get_text()
-        dni = extract_dni_from_page_text(text)
-        if not dni:
-            print(f"⚠️ Página {i+1}: No se detectó DNI.")
-            continue
-        grouped_pages.setdefault(dni, []).append(i)
 
-    for dni, pages in grouped_pages.items():
+def _save_page_groups(doc: "fitz.Document", grouped_pages: Dict[str, List[int]], output_dir: Path):
+    """Escribe un PDF ``<clave>.pdf`` por cada grupo de páginas."""
+    for key, pages in grouped_pages.items():
         subdoc = fitz.open()
         for p in pages:
             subdoc.insert_pdf(doc, from_page=p, to_page=p)
-        output_path = output_dir / f"{dni}.pdf"
-        subdoc.save(output_path)
+        output_path = output_dir / f"{key}.pdf"
+        # Sin /ID nuevo: volver a separar el mismo maestro produce los
+        # mismos bytes y no invalida los manifiestos de los reportes.
+        subdoc.save(output_path, no_new_id=True)
         subdoc.close()
         print(f"✅ Guardado: {output_path.name} ({len(pages)} pág.)")
 
-    doc.close()
     print(f"\n✅ División completa: {len(grouped_pages)} archivos generados en {output_dir}")
 
 
+def split_pdf_by_dni(input_pdf: Path, output_dir: Path, region: Optional[Region] = None):
+    doc = fitz.open(input_pdf)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    _save_page_groups(doc, group_pages_by_dni(doc, region), output_dir)
+    doc.close()
+
+
 def extract_name_from_text(text: str) -> str:
-    """Extrae solo el nombre completo del texto de la página."""
+    """Extrae solo el nombre completo del texto de la página ("Nombre:" o,
+    en psicotécnicos, "SR/A"; ver ``PAGE_RULES["name"]``)."""
+    return PAGE_RULES["name"].value(text)
 
-    # Primer intento: "Nombre:"
-    match = re.search(r"Nombre[s]?:\s*([A-ZÁÉÍÓÚÑ\s]+)", text, re.IGNORECASE)
-    if match:
-        name = match.group(1)
-        name = re.split(r"\bFECHA\b", name, flags=re.IGNORECASE)[0]  # corta si aparece "FECHA" luego
-        name = name.replace('\n', ' ').replace('\r', '').replace('\t', ' ')
-        name = re.sub(r'\s+', ' ', name)  # normaliza espacios
-        return normalize_name(name)
-    
-    # PSICOTECNICO
-    # Segundo intento: "SR/A" seguido de nombre
-    match_alt = re.search(r"SR/A\s+([A-ZÁÉÍÓÚÑ\s]+)", text, re.IGNORECASE)
-    if match_alt:
-        name = match_alt.group(1)
-        name = re.split(r"\b(FECHA|TEST|EVALUADOS?)\b", name, flags=re.IGNORECASE)[0]
-        name = name.replace('\n', ' ').replace('\r', '').replace('\t', ' ')
-        name = re.sub(r'\s+', ' ', name)
-        return normalize_name(name)
-    
-    return None
 
 def extract_espiro_name_from_text(text: str) -> str | None:
     """Extrae el nombre del paciente del formato viejo de espirometría.
@@ -135,69 +267,7 @@ def extract_espiro_name_from_text(text: str) -> str | None:
     Formato viejo: contiene la leyenda ``Grupo pacientes`` seguida en las
     dos líneas siguientes del apellido y el nombre.
     """
-    lines = text.splitlines()
-    name = None
-
-    for i, line in enumerate(lines):
-        if "grupo pacientes" in line.lower():
-            try:
-                apellido = lines[i + 1].strip()
-                nombre = lines[i + 2].strip()
-                raw_name = f"{apellido}_{nombre}".upper().replace(" ", "_")
-                name = normalize_name(raw_name).replace(" ", "_")
-                break
-            except IndexError:
-                return None
-
-    return name
-
-
-# Marca única del nuevo formato de espirometría (nuevo proveedor).
-_NEW_ESPIRO_MARKER = "resultados de espirometr"
-
-
-def _is_new_espiro_format_text(text: str) -> bool:
-    """Detecta si el texto corresponde al nuevo formato de espirometría."""
-    return _NEW_ESPIRO_MARKER in text.lower()
-
-
-# Etiquetas vecinas del layout de espirometría nuevo. Cuando fitz extrae
-# texto, a veces concatena una etiqueta adyacente al valor (p. ej.
-# "Alan Gabriel Sexo") y hay que limpiarla del valor capturado.
-_NEW_ESPIRO_ADJACENT_LABELS = (
-    "sexo",
-    "edad",
-    "bmi",
-    "altura",
-    "peso",
-    "fecha de nacimiento",
-    "origen",
-)
-
-
-def _clean_new_espiro_value(value: str) -> str:
-    """Limpia etiquetas adyacentes que a veces quedan pegadas al valor."""
-    cleaned = value.strip()
-    lowered = cleaned.lower()
-    for label in _NEW_ESPIRO_ADJACENT_LABELS:
-        suffix = " " + label
-        if lowered.endswith(suffix):
-            cleaned = cleaned[: -len(suffix)].strip()
-            lowered = cleaned.lower()
-    return cleaned
-
-
-def _extract_field_after_label(lines: list[str], label: str) -> str | None:
-    """Devuelve la primera línea no vacía posterior a una línea cuyo texto
-    sea exactamente ``label`` (comparación case-insensitive, trimmed)."""
-    target = label.strip().lower()
-    for i, line in enumerate(lines):
-        if line.strip().lower() == target:
-            for j in range(i + 1, min(i + 6, len(lines))):
-                candidate = lines[j].strip()
-                if candidate:
-                    return candidate
-    return None
+    return PAGE_RULES["espiros"].value(text, "old")
 
 
 def extract_espiro_name_from_text_new_format(text: str) -> str | None:
@@ -206,109 +276,99 @@ def extract_espiro_name_from_text_new_format(text: str) -> str | None:
     El layout nuevo tiene campos etiquetados ``Apellido`` / ``Nombre``
     seguidos en líneas separadas del valor correspondiente.
     """
-    lines = text.splitlines()
-    apellido = _extract_field_after_label(lines, "apellido")
-    nombre = _extract_field_after_label(lines, "nombre")
-    if not apellido or not nombre:
-        return None
-    apellido = _clean_new_espiro_value(apellido)
-    nombre = _clean_new_espiro_value(nombre)
-    if not apellido or not nombre:
-        return None
-    combined = f"{apellido}_{nombre}".upper()
-    combined = re.sub(r"\s+", "_", combined).strip("_")
-    return combined or None
-
-
-def split_pdf_by_name(input_pdf: Path, output_dir: Path): # TODO: revisar por que no pone .pdf
-    doc = fitz.open(input_pdf)
-    output_dir.mkdir(parents=True, exist_ok=True)
+    return PAGE_RULES["espiros"].value(text, "new")
 
-    grouped_pages = {}
-    for i, page in enumerate(doc):
-        text = page.get_text()
-        name = extract_name_from_text(text)
-        if not name:
-            print(f"⚠️ Página {i+1}: No se detectó nombre.")
-            continue
-        grouped_pages.setdefault(name, []).append(i)
 
-    for name, pages in grouped_pages.items():
-        subdoc = fitz.open()
-        for p in pages:
-            subdoc.insert_pdf(doc, from_page=p, to_page=p)
-        #safe_name = name.replace(" ", "_")
-        safe_name = re.sub(r'[\n\r\t]', '', name).replace(" ", "_")
-        output_path = output_dir / f"{safe_name}.pdf"
-        subdoc.save(output_path)
-        subdoc.close()
-        print(f"✅ Guardado: {output_path.name} ({len(pages)} pág.)")
+def group_pages_by_name(doc: "fitz.Document", region: Optional[Region] = None) -> Dict[str, List[int]]:
+    """Índices de página de ``doc`` agrupados por nombre del paciente, con
+    la clave ``APELLIDO_NOMBRE`` que usa ``split_pdf_by_name`` como nombre
+    de archivo."""
+    return group_page_keys(doc_page_keys(doc, "name", region=region), "name")
 
+
+def split_pdf_by_name(input_pdf: Path, output_dir: Path, region: Optional[Region] = None): # TODO: revisar por que no pone .pdf
+    doc = fitz.open(input_pdf)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    _save_page_groups(doc, group_pages_by_name(doc, region), output_dir)
     doc.close()
-    print(f"\n✅ División completa: {len(grouped_pages)} archivos generados en {output_dir}")
 
 
-def _detect_espiro_format(doc: "fitz.Document") -> str:
-    """Detecta si un PDF de espirometría es formato viejo o nuevo.
+def group_espiro_pages_by_name(doc: "fitz.Document", region: Optional[Region] = None) -> Dict[str, List[int]]:
+    """Índices de página de un consolidado de espirometrías agrupados por
+    ``APELLIDO_NOMBRE``.
 
-    Revisa hasta las primeras 3 páginas buscando la marca del nuevo
-    proveedor. Si no se encuentra, asume formato viejo.
+    Detecta automáticamente el formato (viejo vs. nuevo proveedor) con
+    las primeras páginas y usa las reglas de ese formato en todas.
     """
-    pages_to_check = min(3, doc.page_count)
-    for i in range(pages_to_check):
-        text = doc[i].get_text()
-        if _is_new_espiro_format_text(text):
-            return "new"
-    return "old"
-
+    classes = classify_pages(doc, "espiros", region=region)
+    fmt = classes[0][1] if classes else PAGE_RULES["espiros"].default_format
+    print(f"🔎 Formato de ESPIROMETRÍA detectado: {fmt}")
+    return group_page_keys([key for key, _ in classes], "espiros")
 
-def split_espiros_by_name(input_pdf: Path, output_dir: Path):
-    """Divide un PDF consolidado de espirometrías en uno por paciente.
 
-    Detecta automáticamente el formato (viejo vs. nuevo proveedor) y
-    usa el extractor de nombre apropiado para cada página.
-    """
+def split_espiros_by_name(input_pdf: Path, output_dir: Path, region: Optional[Region] = None):
+    """Divide un PDF consolidado de espirometrías en uno por paciente
+    (ver ``group_espiro_pages_by_name``)."""
     output_dir.mkdir(parents=True, exist_ok=True)
     doc = fitz.open(input_pdf)
+    _save_page_groups(doc, group_espiro_pages_by_name(doc, region), output_dir)
+    doc.close()
 
-    fmt = _detect_espiro_format(doc)
-    extractor = (
-        extract_espiro_name_from_text_new_format
-        if fmt == "new"
-        else extract_espiro_name_from_text
-    )
-    print(f"🔎 Formato de ESPIROMETRÍA detectado: {fmt}")
 
-    grouped_pages: dict[str, list[int]] = {}
-    for i, page in enumerate(doc):
-        text = page.get_text()
-        name = extractor(text)
-        print(f"📛 Página {i+1}: extraído nombre = {name}")
-        if not name:
-            print(f"⚠️ Página {i+1}: No se detectó nombre.")
+def doc_page_keys(doc: "fitz.Document", method: str, start: int = 0, stop: Optional[int] = None,
+                  espiro_format: Optional[str] = None,
+                  region: Optional[Region] = None) -> List[Optional[str]]:
+    """Clave del paciente de cada página ``start:stop`` de ``doc`` (None si
+    no se detectó), según cómo se separa el maestro: ``"dni"``, ``"name"``
+    o ``"espiros"`` (ver ``app.page_classifier``).
+
+    Con ``region`` (la franja del encabezado, ver ``app.split_regions``)
+    solo se lee el texto de esa zona; si ahí no aparece la clave se lee la
+    página completa.
+    """
+    return [key for key, _ in classify_pages(doc, method, start, stop, region, espiro_format)]
+
+
+def page_keys(input_pdf: Path, method: str, start: int = 0, stop: Optional[int] = None,
+              region: Optional[Region] = None) -> List[Optional[str]]:
+    """``doc_page_keys`` de un tramo de ``input_pdf``: permite extraer el
+    texto de un PDF maestro grande en varios procesos a la vez."""
+    with fitz.open(input_pdf) as doc:
+        return doc_page_keys(doc, method, start, stop, region=region)
+
+
+def group_page_keys(keys: List[Optional[str]], method: str) -> Dict[str, List[int]]:
+    """Agrupa los índices de página por clave (en orden de aparición)."""
+    label = "DNI" if method == "dni" else "nombre"
+    grouped_pages: Dict[str, List[int]] = {}
+    for i, key in enumerate(keys):
+        if method == "espiros":
+            print(f"📛 Página {i+1}: extraído nombre = {key}")
+        if not key:
+            print(f"⚠️ Página {i+1}: No se detectó {label}.")
             continue
-        grouped_pages.setdefault(name, []).append(i)
+        grouped_pages.setdefault(key, []).append(i)
+    return grouped_pages
 
-    for name, pages in grouped_pages.items():
-        subdoc = fitz.open()
-        for p in pages:
-            subdoc.insert_pdf(doc, from_page=p, to_page=p)
-        safe_name = name.replace(" ", "_")
-        output_path = output_dir / f"{safe_name}.pdf"
-        subdoc.save(output_path)
-        subdoc.close()
-        print(f"✅ Guardado: {output_path.name} ({len(pages)} pág.)")
 
+def write_page_groups(input_pdf: Path, grouped_pages: Dict[str, List[int]], output_dir: Path):
+    """Escribe en ``output_dir`` un PDF por cada grupo de páginas de
+    ``input_pdf`` (la escritura de ``split_pdf_by_*``)."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    doc = fitz.open(input_pdf)
+    _save_page_groups(doc, grouped_pages, output_dir)
     doc.close()
-    print(f"\n✅ División completa: {len(grouped_pages)} archivos generados en {output_dir}")
 
 
-def rescale_pdf(input_pdf_path: Path, output_pdf_path: Path, dpi: int = 200, max_width: int = 700):
+def rescale_pdf(input_pdf_path: Path, output_pdf_path: Path, dpi: int = 200, max_width: int = 700,
+                pages: Optional[List[int]] = None):
+    """Rasteriza ``input_pdf_path`` (solo las páginas ``pages`` si se
+    indican) y lo guarda escalado como ``output_pdf_path``."""
 
     doc = fitz.open(str(input_pdf_path))
     images = []
 
-    for page in doc:
+    for page in (doc if pages is None else (doc[i] for i in pages)):
         zoom = dpi / 72  # 72 es la base
         pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))  # sin antialias
         img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
@@ -0,0 +1,171 @@
+"""
+Índice en memoria de una carpeta de fecha.
+
+``get_required_studies`` busca los mismos directorios una y otra vez por cada
+paciente y estudio (globs por patrón, ``iterdir`` de la carpeta RX, listados
+de ``base_path``...). Sobre carpetas DATA montadas por red cada una de esas
+llamadas es un viaje al servidor. ``FolderIndex`` recorre el árbol una sola
+vez (un ``scandir`` por directorio) y responde existencia, listados y globs
+desde memoria, además de buscar por DNI en los nombres y memoizar los
+nombres normalizados para el fuzzy matching.
+
+El índice no se entera solo de los cambios en disco: quien escribe en la
+carpeta (por ejemplo, al separar un PDF maestro) debe llamar a
+``refresh(directorio)``.
+
+También puede tener archivos virtuales (``set_virtual_files``): nombres que
+no existen en disco pero que las búsquedas ven como cualquier otro archivo,
+por ejemplo los PDFs por paciente de una separación virtual (ver
+``app.page_map``).
+"""
+import bisect
+import os
+import re
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from app.fuzzy_match import normalize_name
+
+
+# Secuencias de dígitos en nombres de archivo/carpeta que pueden ser un DNI.
+_DNI_IN_NAME_RE = re.compile(r"\d{6,10}")
+
+
+class FolderIndex:
+    """Listado completo de ``root`` y sus subcarpetas, escaneado una vez."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        # directorio -> {"files": [...], "dirs": [...], "names": set(...)}
+        self._dirs: Dict[Path, Dict] = {}
+        self._dni_index: Optional[Dict[str, List[Path]]] = None
+        self._normalized: Dict[Path, str] = {}
+        # directorio -> nombres de archivos virtuales (sobreviven a refresh)
+        self._virtual: Dict[Path, Set[str]] = {}
+        self.refresh()
+
+    def refresh(self, directory: Optional[Path] = None):
+        """Vuelve a escanear todo el árbol o solo ``directory`` (y sus
+        subcarpetas)."""
+        start = self.root if directory is None else Path(directory)
+        for known in [d for d in self._dirs if d == start or start in d.parents]:
+            del self._dirs[known]
+
+        pending = [start]
+        while pending:
+            current = pending.pop()
+            try:
+                with os.scandir(current) as entries:
+                    files, dirs = [], []
+                    for entry in entries:
+                        try:
+                            is_dir = entry.is_dir()
+                        except OSError:
+                            continue
+                        (dirs if is_dir else files).append(current / entry.name)
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+            files.sort()
+            dirs.sort()
+            self._dirs[current] = {
+                "files": files,
+                "dirs": dirs,
+                "names": {p.name for p in files} | {p.name for p in dirs},
+            }
+            pending.extend(dirs)
+
+        for directory in self._virtual:
+            if directory == start or start in directory.parents:
+                self._merge_virtual(directory)
+        # Registrar el directorio en su padre si se creó después del escaneo.
+        self._register_in_parent(start)
+
+        self._dni_index = None
+        self._normalized = {p: n for p, n in self._normalized.items() if start not in p.parents}
+
+    def _register_in_parent(self, directory: Path):
+        parent = self._dirs.get(directory.parent)
+        if directory in self._dirs and parent is not None and directory.name not in parent["names"]:
+            bisect.insort(parent["dirs"], directory)
+            parent["names"].add(directory.name)
+
+    def _merge_virtual(self, directory: Path):
+        """Agrega al listado de ``directory`` sus archivos virtuales (y lo
+        crea si la carpeta no existe en disco)."""
+        names = self._virtual.get(directory)
+        if not names:
+            return
+        listing = self._dirs.setdefault(directory, {"files": [], "dirs": [], "names": set()})
+        for name in sorted(names - listing["names"]):
+            bisect.insort(listing["files"], directory / name)
+            listing["names"].add(name)
+        self._register_in_parent(directory)
+
+    def set_virtual_files(self, directory: Path, names: List[str]):
+        """Reemplaza los archivos virtuales de ``directory`` por ``names``."""
+        directory = Path(directory)
+        self._virtual[directory] = set(names)
+        self.refresh(directory)
+
+    def _listing(self, directory: Path) -> Optional[Dict]:
+        return self._dirs.get(Path(directory))
+
+    def exists(self, path: Path) -> bool:
+        path = Path(path)
+        if path in self._dirs:
+            return True
+        listing = self._listing(path.parent)
+        return listing is not None and path.name in listing["names"]
+
+    def is_dir(self, path: Path) -> bool:
+        return Path(path) in self._dirs
+
+    def files(self, directory: Path) -> List[Path]:
+        """Archivos de ``directory`` ordenados por nombre ([] si no existe)."""
+        listing = self._listing(directory)
+        return list(listing["files"]) if listing else []
+
+    def dirs(self, directory: Path) -> List[Path]:
+        """Subcarpetas de ``directory`` ordenadas por nombre."""
+        listing = self._listing(directory)
+        return list(listing["dirs"]) if listing else []
+
+    def entries(self, directory: Path) -> List[Path]:
+        """Archivos y subcarpetas de ``directory`` ordenados por nombre."""
+        listing = self._listing(directory)
+        return sorted(listing["files"] + listing["dirs"]) if listing else []
+
+    def glob(self, directory: Path, pattern: str) -> List[Path]:
+        """Equivalente a ``sorted(directory.glob(pattern))`` para patrones
+        sin separadores de ruta (mayúsculas y minúsculas cuentan, como en
+        ``Path.glob`` en Linux)."""
+        return [p for p in self.entries(directory) if fnmatchcase(p.name, pattern)]
+
+    def find_by_dni(self, directory: Path, dni: str) -> List[Path]:
+        """Entradas de ``directory`` cuyo nombre contiene ``dni``.
+
+        Se resuelve con el índice de secuencias de dígitos de los nombres; si
+        ninguna coincide exacta se cae a buscar ``dni`` como subcadena (la
+        semántica de ``dni in nombre`` que usaba el código original).
+        """
+        directory = Path(directory)
+        if self._dni_index is None:
+            self._dni_index = {}
+            for current, listing in self._dirs.items():
+                for path in listing["files"] + listing["dirs"]:
+                    for number in _DNI_IN_NAME_RE.findall(path.name):
+                        self._dni_index.setdefault(number, []).append(path)
+        matches = [p for p in self._dni_index.get(dni, []) if p.parent == directory]
+        if matches:
+            return sorted(set(matches))
+        return [p for p in self.entries(directory) if dni in p.name]
+
+    def normalized_stem(self, path: Path) -> str:
+        """``normalize_name`` del stem de ``path``, memoizado."""
+        path = Path(path)
+        normalized = self._normalized.get(path)
+        if normalized is None:
+            normalized = normalize_name(path.stem)
+            self._normalized[path] = normalized
+        return normalized
@@ -1,8 +1,24 @@
 import unicodedata
 import difflib
+import heapq
+import os
 import re
+import threading
+from collections import Counter
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Callable, Dict, Hashable, List, Optional, Tuple, Union
+
+
+# Con REPORT_FUZZY_EXACT=1 los índices de candidatos comparan contra todos
+# los archivos (el algoritmo original) en vez de preseleccionar por n-gramas.
+FUZZY_EXACT = os.environ.get("REPORT_FUZZY_EXACT", "") == "1"
+
+# Cantidad de candidatos que se comparan con SequenceMatcher por objetivo
+# cuando se preselecciona por n-gramas.
+FUZZY_SHORTLIST_SIZE = 30
+
+# Con menos candidatos que esto se comparan todos: preseleccionar no ahorra nada.
+FUZZY_BLOCKING_MIN_CANDIDATES = 50
 
 
 def normalize_name(name: str) -> str:
@@ -37,6 +53,13 @@ def _extract_name_from_ecg_stem(stem: str) -> str:
     return cleaned.strip('_')
 
 
+def _name_ngrams(name: str, n: int = 3) -> set:
+    """Trigramas de caracteres del nombre (con un espacio de relleno en los
+    bordes, así los nombres cortos también tienen n-gramas)."""
+    padded = f" {name} "
+    return {padded[i:i + n] for i in range(max(1, len(padded) - n + 1))}
+
+
 def _extract_name_from_ergo_stem(stem: str) -> str:
     """Extrae solo la parte del nombre (APELLIDO_NOMBRE) de un stem de archivo
     de ergometria del nuevo proveedor, removiendo marcadores y fechas.
@@ -59,16 +82,133 @@ def _extract_name_from_ergo_stem(stem: str) -> str:
     return cleaned.strip('_')
 
 
+class FuzzyCandidateIndex:
+    """Conjunto de archivos candidatos preparado para fuzzy matching.
+
+    Los stems se normalizan una sola vez (pasando antes por ``extract_name``
+    si se indica, p. ej. ``_extract_name_from_ecg_stem``) y cada candidato
+    guarda un ``SequenceMatcher`` con su nombre ya analizado, así comparar un
+    objetivo nuevo solo analiza el objetivo. Los objetivos normalizados y sus
+    scores quedan memoizados. Los scores son los mismos que da
+    ``SequenceMatcher(None, objetivo, candidato).ratio()``.
+
+    Con muchos candidatos (``FUZZY_BLOCKING_MIN_CANDIDATES`` o más) no se
+    compara el objetivo contra todos: un índice invertido de trigramas y de
+    palabras preselecciona los ``FUZZY_SHORTLIST_SIZE`` candidatos que más
+    comparten con el objetivo y solo esos se puntúan con ``SequenceMatcher``.
+    Los scores y el umbral siguen siendo los de siempre; lo único que puede
+    cambiar es que un candidato muy distinto en trigramas quede afuera. Con
+    ``exact=True`` (o ``REPORT_FUZZY_EXACT=1``) se compara contra todos.
+    """
+
+    def __init__(self, candidate_paths: List[Path],
+                 extract_name: Optional[Callable[[str], str]] = None,
+                 exact: Optional[bool] = None,
+                 shortlist_size: int = FUZZY_SHORTLIST_SIZE):
+        self.paths = list(candidate_paths)
+        self.names = [
+            normalize_name(extract_name(path.stem) if extract_name else path.stem)
+            for path in self.paths
+        ]
+        self.exact = FUZZY_EXACT if exact is None else exact
+        self.shortlist_size = shortlist_size
+        self._matchers: Optional[List[Optional[difflib.SequenceMatcher]]] = None
+        self._postings: Optional[Dict[str, List[int]]] = None
+        self._gram_counts: List[int] = []
+        self._targets: Dict[str, str] = {}
+        self._scores: Dict[str, List[Tuple[int, float]]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def normalize_target(self, target_name: str) -> str:
+        normalized = self._targets.get(target_name)
+        if normalized is None:
+            normalized = normalize_name(target_name)
+            self._targets[target_name] = normalized
+        return normalized
+
+    def _uses_blocking(self) -> bool:
+        return not self.exact and len(self.paths) >= FUZZY_BLOCKING_MIN_CANDIDATES
+
+    def _build_postings(self):
+        """Índice invertido trigrama/palabra -> candidatos que lo contienen."""
+        self._postings = {}
+        self._gram_counts = []
+        for position, name in enumerate(self.names):
+            keys = _name_ngrams(name) | {f"#{word}" for word in name.split()}
+            self._gram_counts.append(len(keys))
+            for key in keys:
+                self._postings.setdefault(key, []).append(position)
+
+    def shortlist(self, normalized_target: str) -> List[int]:
+        """Posiciones de los candidatos a puntuar para el objetivo (ya
+        normalizado), en el orden de los candidatos."""
+        if not self._uses_blocking():
+            return list(range(len(self.paths)))
+        if self._postings is None:
+            self._build_postings()
+        keys = _name_ngrams(normalized_target) | {f"#{word}" for word in normalized_target.split()}
+        shared: Counter = Counter()
+        for key in keys:
+            shared.update(self._postings.get(key, ()))
+        # Coeficiente de Dice sobre trigramas y palabras compartidas.
+        best = heapq.nlargest(
+            self.shortlist_size, shared,
+            key=lambda pos: (2 * shared[pos] / (len(keys) + self._gram_counts[pos]), -pos),
+        )
+        return sorted(best)
+
+    def scores(self, target_name: str) -> List[Tuple[Path, float]]:
+        """Score de cada candidato puntuado contra ``target_name`` (todos, o
+        los preseleccionados por n-gramas), en el orden de los candidatos."""
+        normalized_target = self.normalize_target(target_name)
+        with self._lock:
+            scores = self._scores.get(normalized_target)
+            if scores is None:
+                if self._matchers is None:
+                    self._matchers = [None] * len(self.names)
+                scores = []
+                for position in self.shortlist(normalized_target):
+                    matcher = self._matchers[position]
+                    if matcher is None:
+                        matcher = difflib.SequenceMatcher(None, "", self.names[position])
+                        self._matchers[position] = matcher
+                    matcher.set_seq1(normalized_target)
+                    scores.append((position, matcher.ratio()))
+                self._scores[normalized_target] = scores
+        return [(self.paths[position], score) for position, score in scores]
+
+    def best_match(self, target_name: str) -> Tuple[Optional[Path], float]:
+        """Mejor candidato y su score (el primero si hay empate; None si
+        todos dan 0)."""
+        best_path = None
+        best_score = 0.0
+        for path, score in self.scores(target_name):
+            if score > best_score:
+                best_score = score
+                best_path = path
+        return best_path, best_score
+
+    def all_matches(self, target_name: str, threshold: float = 0.75) -> List[Tuple[Path, float]]:
+        """Candidatos con score >= ``threshold``, de mayor a menor score."""
+        matches = [(path, score) for path, score in self.scores(target_name) if score >= threshold]
+        matches.sort(key=lambda x: x[1], reverse=True)
+        return matches
+
+
 def fuzzy_find_best_match(
     target_name: str,
-    candidate_paths: List[Path],
+    candidate_paths: Union[List[Path], FuzzyCandidateIndex],
     threshold: float = 0.75
 ) -> Optional[Path]:
     """Busca el mejor candidato por similitud difusa entre el nombre objetivo y los stems de los archivos.
 
     Args:
         target_name: Nombre del paciente (desde Excel).
-        candidate_paths: Lista de rutas de archivos candidatos.
+        candidate_paths: Lista de rutas de archivos candidatos, o un
+            ``FuzzyCandidateIndex`` ya armado para reutilizarlo entre pacientes.
         threshold: Umbral minimo de similitud (0.0 a 1.0).
 
     Returns:
@@ -77,16 +217,9 @@ def fuzzy_find_best_match(
     if not candidate_paths:
         return None
 
-    normalized_target = normalize_name(target_name)
-    best_path = None
-    best_score = 0.0
-
-    for path in candidate_paths:
-        normalized_stem = normalize_name(path.stem)
-        score = difflib.SequenceMatcher(None, normalized_target, normalized_stem).ratio()
-        if score > best_score:
-            best_score = score
-            best_path = path
+    if not isinstance(candidate_paths, FuzzyCandidateIndex):
+        candidate_paths = FuzzyCandidateIndex(candidate_paths)
+    best_path, best_score = candidate_paths.best_match(target_name)
 
     if best_score >= threshold and best_path is not None:
         print(f"🔍 Fuzzy match: '{target_name}' -> '{best_path.name}' (score={best_score:.2f})")
@@ -99,14 +232,15 @@ def fuzzy_find_best_match(
 
 def fuzzy_find_all_matches(
     target_name: str,
-    candidate_paths: List[Path],
+    candidate_paths: Union[List[Path], FuzzyCandidateIndex],
     threshold: float = 0.75
 ) -> List[Tuple[Path, float]]:
     """Retorna todos los candidatos que superan el umbral, ordenados por score descendente.
 
     Args:
         target_name: Nombre del paciente (desde Excel).
-        candidate_paths: Lista de rutas de archivos candidatos.
+        candidate_paths: Lista de rutas de archivos candidatos, o un
+            ``FuzzyCandidateIndex`` ya armado.
         threshold: Umbral minimo de similitud (0.0 a 1.0).
 
     Returns:
@@ -115,14 +249,64 @@ def fuzzy_find_all_matches(
     if not candidate_paths:
         return []
 
-    normalized_target = normalize_name(target_name)
-    matches = []
+    if not isinstance(candidate_paths, FuzzyCandidateIndex):
+        candidate_paths = FuzzyCandidateIndex(candidate_paths)
+    return candidate_paths.all_matches(target_name, threshold)
+
+
+def assign_best_matches(
+    targets: Dict[Hashable, str],
+    candidates: FuzzyCandidateIndex,
+    threshold: float = 0.75,
+    strict: bool = False,
+) -> Tuple[Dict[Hashable, Tuple[Path, float]], List[str]]:
+    """Asigna archivos a pacientes de una sola pasada, para toda la tanda.
+
+    Puntúa cada objetivo de ``targets`` (clave del paciente -> nombre) contra
+    ``candidates`` y resuelve los conflictos globalmente: se recorren los
+    pares de mayor a menor score y cada archivo va a un solo paciente (y
+    cada paciente recibe un solo archivo). Solo cuentan los pares con score
+    >= ``threshold`` (> con ``strict``).
+
+    Returns:
+        La asignación ``{clave: (Path, score)}`` y la lista de warnings:
+        empates ambiguos (un archivo con el mismo score para dos pacientes, o
+        un paciente con el mismo score en dos archivos) y archivos que no
+        quedaron asignados a ningún paciente.
+    """
+    order = {key: position for position, key in enumerate(targets)}
+    pairs = []
+    for key, target_name in targets.items():
+        for path, score in candidates.scores(target_name):
+            if score > threshold or (score == threshold and not strict):
+                pairs.append((score, key, path))
+    path_order = {path: position for position, path in enumerate(candidates.paths)}
+    pairs.sort(key=lambda pair: (-pair[0], order[pair[1]], path_order[pair[2]]))
 
-    for path in candidate_paths:
-        normalized_stem = normalize_name(path.stem)
-        score = difflib.SequenceMatcher(None, normalized_target, normalized_stem).ratio()
-        if score >= threshold:
-            matches.append((path, score))
+    assignment: Dict[Hashable, Tuple[Path, float]] = {}
+    owners: Dict[Path, Tuple[Hashable, float]] = {}
+    warnings: List[str] = []
+    for score, key, path in pairs:
+        if key in assignment:
+            assigned_path, assigned_score = assignment[key]
+            if score == assigned_score and path not in owners:
+                warnings.append(
+                    f"Empate ambiguo para '{targets[key]}': '{assigned_path.name}' y '{path.name}' "
+                    f"(score={score:.2f}); se usa '{assigned_path.name}'"
+                )
+            continue
+        if path in owners:
+            owner, owner_score = owners[path]
+            if score == owner_score:
+                warnings.append(
+                    f"Empate ambiguo por '{path.name}' entre '{targets[owner]}' y '{targets[key]}' "
+                    f"(score={score:.2f}); se asigna a '{targets[owner]}'"
+                )
+            continue
+        assignment[key] = (path, score)
+        owners[path] = (key, score)
 
-    matches.sort(key=lambda x: x[1], reverse=True)
-    return matches
+    for path in candidates.paths:
+        if path not in owners:
+            warnings.append(f"Archivo sin paciente asignado: {path.name}")
+    return assignment, warnings
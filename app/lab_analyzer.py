@@ -1,23 +1,32 @@
 """
 Lógica de análisis y detección de valores fuera de rango en laboratorios.
 """
+import os
 from pathlib import Path
 from typing import List, Dict, Optional
 from app.lab_extractor import LaboratoryPDFExtractor, parse_laboratory_data, normalize_parametro_name
 from app.lab_ranges import LaboratoryRanges
 
 
+# REPORT_LAB_LAYOUT=1 busca los parámetros primero en las filas de tabla
+# reconstruidas con las coordenadas de las palabras (ver ``app.lab_extractor``).
+LAB_LAYOUT = os.environ.get("REPORT_LAB_LAYOUT") == "1"
+
+
 class LaboratoryAnalyzer:
     """Analiza PDFs de laboratorio para detectar valores fuera de rango."""
     
-    def __init__(self, ranges_config_path: Optional[Path] = None):
+    def __init__(self, ranges_config_path: Optional[Path] = None, layout: Optional[bool] = None):
         """
         Inicializa el analizador.
         
         Args:
             ranges_config_path: Ruta al archivo de configuración de rangos
+            layout: Si es True, busca los parámetros primero en las filas de
+                tabla del PDF (por defecto, ``LAB_LAYOUT``)
         """
         self.ranges = LaboratoryRanges(ranges_config_path)
+        self.layout = LAB_LAYOUT if layout is None else layout
     
     def analyze_pdf(self, pdf_path: Path) -> Dict:
         """
@@ -39,9 +48,10 @@ class LaboratoryAnalyzer:
         if not pdf_path.exists():
             raise FileNotFoundError(f"PDF no encontrado: {pdf_path}")
         
-        # Extraer texto del PDF
+        # Extraer texto (y filas de tabla) del PDF
         with LaboratoryPDFExtractor(pdf_path) as extractor:
             text = extractor.extract_text()
+            rows = extractor.extract_rows() if self.layout else None
         
         # Extraer información del paciente (incluyendo sexo)
         from app.lab_extractor import extract_patient_info
@@ -52,7 +62,8 @@ class LaboratoryAnalyzer:
         parametros_encontrados = parse_laboratory_data(
             text, 
             include_patient_info=False,
-            config_ranges=self.ranges.ranges
+            matcher=self.ranges.parameter_matcher(),
+            rows=rows
         )
         
         # Guardar el sexo del paciente para usarlo en el análisis de parámetros
@@ -1,10 +1,24 @@
 """
 Módulo para extraer datos de PDFs de laboratorio.
+
+Los parámetros se buscan de dos formas:
+
+- en el texto plano de las páginas (``LabParameterMatcher.match``), con
+  patrones que toleran que fitz separe el nombre, el valor y la unidad en
+  líneas distintas;
+- en las filas de las tablas (``layout_rows``), reconstruidas con las
+  coordenadas de las palabras: cada fila queda con su nombre, valor, unidad
+  y referencia, y el parámetro se busca por nombre en un diccionario
+  (``LabParameterMatcher.match_rows``). Los parámetros que no aparecen así
+  se buscan igual en el texto.
 """
 import fitz
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import re
+from bisect import bisect_right
+
+from app.page_text_cache import Word, page_text, page_words
 
 
 class LaboratoryPDFExtractor:
@@ -34,7 +48,8 @@ class LaboratoryPDFExtractor:
     
     def extract_text(self) -> str:
         """
-        Extrae todo el texto del PDF.
+        Extrae todo el texto del PDF (del caché de texto de páginas si ya se
+        leyó, ver ``app.page_text_cache``).
         
         Returns:
             Texto completo del PDF
@@ -45,17 +60,34 @@ class LaboratoryPDFExtractor:
         text_parts = []
         for page_num in range(len(self.doc)):
             page = self.doc[page_num]
-            text = page.get_text()
+            text = page_text(page)
             text_parts.append(text)
         
         return "\n".join(text_parts)
     
-    def extract_tables(self) -> List[Dict]:
+    def extract_rows(self) -> List[Dict]:
+        """
+        Filas de las tablas de todas las páginas, reconstruidas con las
+        coordenadas de las palabras (ver ``layout_rows``).
+        
+        Returns:
+            Filas en orden de lectura; cada una con su ``page`` (desde 1)
+        """
+        rows = []
+        for table in self.extract_tables(include_text=False):
+            rows.extend(table["rows"])
+        return rows
+    
+    def extract_tables(self, include_text: bool = True) -> List[Dict]:
         """
-        Extrae tablas estructuradas del PDF.
+        Extrae tablas estructuradas del PDF: por página, sus filas con
+        nombre, valor, unidad y referencia (ver ``layout_rows``).
+        
+        Args:
+            include_text: Si es True, incluye también el texto de la página
         
         Returns:
-            Lista de diccionarios con información de tablas encontradas
+            Lista de diccionarios ``{"page", "rows"}`` (y ``"text"``), uno por página
         """
         if not self.doc:
             self.doc = fitz.open(self.pdf_path)
@@ -63,17 +95,117 @@ class LaboratoryPDFExtractor:
         tables = []
         for page_num in range(len(self.doc)):
             page = self.doc[page_num]
-            # Intentar extraer tablas usando get_text con formato
-            text = page.get_text("text")
-            # Por ahora retornamos texto estructurado, luego se puede mejorar con pdfplumber
-            tables.append({
-                "page": page_num + 1,
-                "text": text
-            })
+            rows = layout_rows(page_words(page))
+            for row in rows:
+                row["page"] = page_num + 1
+            table = {"page": page_num + 1, "rows": rows}
+            if include_text:
+                table["text"] = page_text(page)
+            tables.append(table)
         
         return tables
 
 
+# --- Filas de tabla a partir de las palabras --------------------------------
+
+# Separación horizontal entre dos palabras de una fila, en alturas de la
+# fila, a partir de la cual están en columnas distintas.
+COLUMN_GAP = 1.0
+
+# Puntos de relleno entre el nombre y el valor ("GLUCOSA..........")
+_LEADER_RE = re.compile(r'\.{3,}|…+')
+_VALUE_TOKEN_RE = re.compile(r'^[0-9]+[.,]?[0-9]*[.,]?[0-9]*$')
+_UNIT_TOKEN_RE = re.compile(r'^(?=.*[a-zA-Z%µ°º])[a-zA-Z0-9/%µ²³°º.^]+$')
+
+
+def _row_cells(words: List[Word]) -> List[List[str]]:
+    """Celdas (listas de palabras) de una fila: se separan donde hay puntos
+    de relleno o un espacio de más de ``COLUMN_GAP`` alturas."""
+    height = max(y1 - y0 for _, y0, _, y1, _ in words)
+    cells: List[List[str]] = [[]]
+    prev_x1 = None
+    for x0, _, x1, _, text in words:
+        if prev_x1 is not None and x0 - prev_x1 > COLUMN_GAP * height and cells[-1]:
+            cells.append([])
+        for i, part in enumerate(_LEADER_RE.split(text)):
+            if i > 0 and cells[-1]:
+                cells.append([])
+            if part:
+                cells[-1].append(part)
+        prev_x1 = x1
+    return [cell for cell in cells if cell]
+
+
+def _layout_row(words: List[Word]) -> Optional[Dict]:
+    """Nombre, valor, unidad y referencia de una fila (palabras ordenadas
+    de izquierda a derecha). None si no empieza con un nombre.
+
+    El nombre es la primera celda hasta el primer número; el valor, lo que
+    sigue: un número (``es_numerico``) con la palabra siguiente como unidad
+    si lo parece, o el texto de la celda siguiente (valor cualitativo). El
+    resto es la referencia.
+    """
+    cells = _row_cells(words)
+    if not cells:
+        return None
+    first = cells[0]
+    n = next((i for i, token in enumerate(first) if _VALUE_TOKEN_RE.match(token)), len(first))
+    nombre = " ".join(first[:n]).strip(" :")
+    if not nombre:
+        return None
+    rest_cells = ([first[n:]] if n < len(first) else []) + cells[1:]
+    rest = [token for cell in rest_cells for token in cell]
+
+    row = {
+        "nombre": nombre,
+        "valor": None,
+        "es_numerico": False,
+        "unidad": "",
+        "referencia": "",
+        "texto": " ".join(text for *_, text in words),
+    }
+    if rest and _VALUE_TOKEN_RE.match(rest[0]):
+        row["valor"] = rest[0]
+        row["es_numerico"] = True
+        i = 1
+        if len(rest) > 1 and _UNIT_TOKEN_RE.match(rest[1]) and not _REFERENCE_LINE_RE.search(rest[1].upper()):
+            row["unidad"] = rest[1]
+            i = 2
+        row["referencia"] = " ".join(rest[i:])
+    elif rest_cells:
+        row["valor"] = " ".join(rest_cells[0])
+        row["referencia"] = " ".join(token for cell in rest_cells[1:] for token in cell)
+    return row
+
+
+def layout_rows(words: List[Word]) -> List[Dict]:
+    """
+    Filas de tabla de una página a partir de sus palabras (``page_words``).
+
+    Las palabras cuyo centro vertical cae dentro de la altura de la primera
+    palabra de una fila son de esa fila, aunque fitz las haya puesto en
+    bloques o líneas distintas (el valor y la unidad suelen quedar en otra
+    columna del PDF). Cada fila se separa en celdas (ver ``_layout_row``).
+
+    Returns:
+        Filas de arriba hacia abajo: ``{"nombre", "valor", "es_numerico",
+        "unidad", "referencia", "texto"}``
+    """
+    lines: List[Dict] = []
+    for word in sorted(words, key=lambda w: (w[1], w[0])):
+        center = (word[1] + word[3]) / 2
+        if lines and lines[-1]["y0"] <= center <= lines[-1]["y1"]:
+            lines[-1]["words"].append(word)
+        else:
+            lines.append({"y0": word[1], "y1": word[3], "words": [word]})
+    rows = []
+    for line in lines:
+        row = _layout_row(sorted(line["words"], key=lambda w: w[0]))
+        if row is not None:
+            rows.append(row)
+    return rows
+
+
 def extract_patient_info(text: str) -> Dict[str, Optional[str]]:
     """
     Extrae información del paciente del texto del PDF de laboratorio.
@@ -172,7 +304,482 @@ def extract_patient_info(text: str) -> Dict[str, Optional[str]]:
     return info
 
 
-def parse_laboratory_data(text: str, include_patient_info: bool = False, config_ranges: Optional[Dict] = None) -> List[Dict]:
+# Palabras clave que NO son parámetros (encabezados, metadata, etc.)
+# NOTA: COLOR, ASPECTO, DENSIDAD, PH, etc. SÍ son parámetros válidos, NO deben estar aquí
+EXCLUDE_KEYWORDS = [
+    'FECHA', 'PACIENTE', 'DNI', 'LABORATORIO', 'PAGINA', 'RESULTADO',
+    'PROTOCOLO', 'NRO', 'NUMERO', 'Nº', 'N°', 'PROTOCOLO NRO',
+    'VARELA', 'TEL', 'TELEFONO', 'CAPITAL', 'FEDERAL', 'CONSULTORIO',
+    'MEDICO', 'BOGOTA', 'INSTITUCION', 'AFILIADO',
+    'RUTINA NUMERO', 'RUTINA NRO', 'APELLIDO', 'NOMBRE',
+    'VALIDADO', 'FIRMADO', 'ELECTRONICAMENTE', 'BIOQ', 'DIRECTORA',
+    'TECNICA', 'PRECISION', 'ESTUDIOS', 'AVALADA', 'PROGRAMA',
+    'EVALUACION', 'EXTERNA', 'CALIDAD', 'FEDERACION', 'BIOQUIMICA',
+    'ARGENTINA', 'METODO', 'WESTERGREN', 'ENZIMATICO', 'CINETICO',
+    'TIRA', 'REACTIVA', 'HOMBRES:', 'MUJERES:', 'HASTA',
+    'MILL', 'CPO', 'CAMP', 'REGULAR', 'NORMAL', 'CONTROL'
+]
+
+# Alguna de EXCLUDE_KEYWORDS contenida en la línea (en mayúsculas)
+_EXCLUDE_RE = re.compile("|".join(re.escape(keyword) for keyword in EXCLUDE_KEYWORDS))
+_REFERENCE_LINE_RE = re.compile(r'\b(HOMBRES|MUJERES|HASTA|DESDE|METODO)\b')
+_VALUE_LINE_RE = re.compile(r'^([0-9]+[.,]?[0-9]*[.,]?[0-9]*)\s*$')
+_NUMERIC_LINE_RE = re.compile(r'^[\d\s\.\,\-]+$')
+_UNIT_LINE_RE = re.compile(r'^([a-zA-Z/%µ²³°º\s]+)$')
+
+
+def _variant_pattern(variante: str) -> str:
+    """Patrón flexible para el nombre de una variante: sus palabras unidas
+    por espacios/puntos y con el punto final de cada una opcional."""
+    # Dividir el nombre en palabras para manejar mejor puntos y espacios
+    patrones_palabras = []
+    for palabra in variante.split():
+        # Escapar la palabra pero permitir puntos opcionales al final
+        palabra_escaped = re.escape(palabra)
+        # Si la palabra termina con punto en el original, hacerlo opcional
+        if palabra.endswith('.'):
+            palabra_escaped = palabra_escaped[:-2] + r'\.?'  # Remover escape del punto y hacerlo opcional
+        patrones_palabras.append(palabra_escaped)
+
+    # Unir palabras con espacios/puntos flexibles
+    return r'[\s\.]+'.join(patrones_palabras)
+
+
+def _first_literal(variante: str) -> str:
+    """Texto con el que empieza toda coincidencia del patrón de la variante:
+    su primera palabra, sin el punto final opcional."""
+    palabras = variante.split()
+    if not palabras:
+        return ""
+    return palabras[0][:-1] if palabras[0].endswith('.') else palabras[0]
+
+
+def _literal_trie_pattern(literals: List[str]) -> str:
+    """Alternativa (para ``re.IGNORECASE``) de todas las ``literals``
+    factorizada como un árbol de prefijos: el motor de regex avanza de a un
+    carácter por rama en vez de probar cada palabra en cada posición. En
+    cada posición coincide la palabra más larga posible."""
+    # Caracteres equivalentes sin distinguir mayúsculas van a la misma rama
+    representatives: List[str] = []
+    canonical = {}
+    for char in sorted({char for literal in literals for char in literal}):
+        canonical[char] = next(
+            (rep for rep in representatives if re.fullmatch(re.escape(rep), char, re.IGNORECASE)), char)
+        if canonical[char] == char:
+            representatives.append(char)
+
+    trie: Dict = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(canonical[char], {})
+        node[""] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        # Greedy: primero la palabra más larga; la más corta si esa falla
+        return "(?:" + "|".join(branches) + ")" + ("?" if "" in node else "")
+
+    return build(trie)
+
+
+def _finditer_at(pattern: "re.Pattern", text: str, positions: Optional[List[int]]):
+    """Como ``pattern.finditer(text)``, probando solo en ``positions`` (las
+    posiciones, en orden, donde puede empezar una coincidencia). Con
+    ``positions`` None recorre todo el texto."""
+    if positions is None:
+        yield from pattern.finditer(text)
+        return
+    end = 0
+    for pos in positions:
+        if pos < end:
+            # finditer no devuelve coincidencias superpuestas
+            continue
+        match = pattern.match(text, pos)
+        if match:
+            yield match
+            end = match.end()
+
+
+def _line_info(raw_line: str) -> Dict:
+    """Una línea (sin espacios en los extremos) con las marcas que usa la
+    búsqueda del valor en las líneas siguientes al nombre: ``valor`` (el
+    número si la línea es un valor candidato) y ``unidad`` (si la línea
+    sirve como unidad del valor de una línea anterior)."""
+    line = raw_line.strip()
+    info = {"line": line, "valor": None, "unidad": None}
+    if not line:
+        return info
+    line_upper = line.upper()
+    # Líneas que son claramente metadata (no son ni valor ni unidad)
+    if _EXCLUDE_RE.search(line_upper):
+        return info
+    # Rangos de referencia (contienen "HOMBRES:", "MUJERES:", "a", etc.)
+    if not _REFERENCE_LINE_RE.search(line_upper):
+        valor_match = _VALUE_LINE_RE.search(line)
+        if valor_match:
+            info["valor"] = valor_match.group(1)
+    # Unidad: que no sea solo un número
+    if not _NUMERIC_LINE_RE.match(line):
+        unidad_match = _UNIT_LINE_RE.search(line)
+        if unidad_match:
+            info["unidad"] = unidad_match.group(1).strip()
+    return info
+
+
+class _LineTable:
+    """Líneas de un texto con su offset de inicio y sus marcas
+    (``_line_info``). Se arma una vez por texto; las marcas de cada línea
+    se calculan la primera vez que una ventana la incluye."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.raw_lines: Optional[List[str]] = None
+        self.starts: List[int] = []
+        self.lines: List[Optional[Dict]] = []
+
+    def _build(self):
+        self.raw_lines = self.text.split('\n')
+        offset = 0
+        for raw_line in self.raw_lines:
+            self.starts.append(offset)
+            offset += len(raw_line) + 1
+        self.lines = [None] * len(self.raw_lines)
+
+    def _info(self, i: int) -> Dict:
+        info = self.lines[i]
+        if info is None:
+            info = self.lines[i] = _line_info(self.raw_lines[i])
+        return info
+
+    def window(self, pos: int, size: int) -> List[Dict]:
+        """Las ``size`` líneas a partir de ``pos``, como
+        ``text[pos:].split('\\n')[:size]``: la primera es el resto de la
+        línea donde cae ``pos``."""
+        if self.raw_lines is None:
+            self._build()
+        i = bisect_right(self.starts, pos) - 1
+        if pos == self.starts[i]:
+            first = self._info(i)
+        else:
+            first = _line_info(self.text[pos:self.starts[i] + len(self.raw_lines[i])])
+        return [first] + [self._info(j) for j in range(i + 1, min(i + size, len(self.raw_lines)))]
+
+
+def _row_name_key(name: str) -> str:
+    """Nombre para buscar una fila en el diccionario de variantes: en
+    mayúsculas, con sus palabras separadas por un espacio (los puntos como
+    en ``_variant_pattern``: "V.S.G." y "V S G" son lo mismo)."""
+    return " ".join(part for part in re.split(r'[\s\.]+', name.upper()) if part)
+
+
+def _parse_valor(valor_str: str) -> float:
+    """Normaliza separadores de miles/decimales ("4.330.000", "1,5")."""
+    if valor_str.count('.') > 1:
+        valor_str = valor_str.replace('.', '')
+    elif ',' in valor_str:
+        valor_str = valor_str.replace(',', '.')
+    return float(valor_str)
+
+
+class LabParameterMatcher:
+    """
+    Patrones de búsqueda de todos los parámetros de una configuración de
+    rangos, compilados una sola vez.
+
+    Por cada nombre y sinónimo (en el orden del JSON, sin repetir) guarda:
+    ``pattern1`` (valor en la misma línea), ``pattern2`` (valor en las
+    líneas siguientes) y, para parámetros cualitativos, el patrón del valor
+    en texto. ``LaboratoryRanges.parameter_matcher`` lo reutiliza mientras
+    el JSON no cambie.
+
+    Toda coincidencia de una variante empieza con su primera palabra, así
+    que ``locate`` encuentra en una sola pasada (un árbol de prefijos con
+    todas las primeras palabras) dónde puede aparecer cada variante, y sus
+    patrones solo se prueban en esas posiciones. El resultado es el mismo
+    que recorrer el texto con ``finditer`` por cada variante.
+
+    Con las filas de tabla de ``layout_rows`` no hace falta buscar: el nombre
+    de cada fila se busca en un diccionario de variantes (``match_rows``).
+    """
+
+    def __init__(self, config_ranges: Dict):
+        """
+        Args:
+            config_ranges: Diccionario con configuración de parámetros del JSON
+        """
+        # Si la configuración tiene estructura nueva con "parametros", extraerla
+        if isinstance(config_ranges, dict) and "parametros" in config_ranges:
+            config_ranges = config_ranges["parametros"]
+
+        self.variants: List[Dict] = []
+        seen = set()
+        for key, config in config_ranges.items():
+            nombre = config.get("nombre", key)
+            sinonimos = config.get("sinonimos", [])
+
+            # Para cada variante del nombre, crear una entrada (la primera
+            # aparición de cada variante gana)
+            for variante in [nombre] + sinonimos:
+                variante_upper = variante.upper().strip()
+                if variante_upper in seen:
+                    continue
+                seen.add(variante_upper)
+                nombre_pattern = _variant_pattern(variante_upper)
+
+                # Puede aparecer como: "ERITROCITOS................................ 4.330.000 /mm3"
+                # O en líneas separadas: "ERITROCITOS................................\n4.330.000\n/mm3"
+                pattern_cualitativo = None
+                if config.get("tipo_valor", "") == "cualitativo":
+                    pattern_cualitativo = re.compile(
+                        rf'{nombre_pattern}[\.\s]{{3,}}'  # Nombre seguido de puntos/espacios
+                        r'([A-ZÁÉÍÓÚÑ\s]+)',              # Valor cualitativo (texto en mayúsculas)
+                        re.IGNORECASE | re.MULTILINE
+                    )
+                self.variants.append({
+                    "key": key,
+                    "nombre_original": nombre,
+                    "unidad": config.get("unidad", ""),
+                    "variante": variante_upper,
+                    # Patrón 1: Parámetro seguido de puntos/espacios y valor en la misma línea
+                    "pattern1": re.compile(
+                        rf'{nombre_pattern}[\.\s]{{3,}}'  # Nombre seguido de puntos/espacios (mínimo 3)
+                        r'([0-9]+[.,]?[0-9]*[.,]?[0-9]*)'  # Valor numérico
+                        r'\s*'                              # Espacios opcionales
+                        r'([a-zA-Z/%µ²³°\s]+)?',          # Unidad opcional (puede estar en misma línea)
+                        re.IGNORECASE | re.MULTILINE
+                    ),
+                    # Patrón 2: Parámetro en una línea, valor en la siguiente (más flexible)
+                    # Buscar el nombre seguido de muchos puntos (típico formato del PDF)
+                    # Reducido a mínimo 5 para capturar mejor casos como "Volumen Corpuscular Medio"
+                    "pattern2": re.compile(
+                        rf'{nombre_pattern}[\.\s]{{5,}}',  # Nombre seguido de puntos/espacios (mínimo 5)
+                        re.IGNORECASE | re.MULTILINE
+                    ),
+                    "pattern_cualitativo": pattern_cualitativo,
+                    "literal": _first_literal(variante_upper),
+                })
+
+        # Localizador: las primeras palabras de todas las variantes en un
+        # solo patrón (en cada posición coincide la más larga). Las más
+        # cortas que también coinciden en esa posición son prefijos suyos
+        # (``_prefixes``).
+        self._literals = sorted({v["literal"] for v in self.variants if v["literal"]}, key=lambda l: (-len(l), l))
+        self._locator = re.compile(
+            _literal_trie_pattern(self._literals), re.IGNORECASE
+        ) if self._literals else None
+        self._prefixes = {
+            literal: [shorter for shorter in self._literals
+                      if len(shorter) <= len(literal)
+                      and re.fullmatch(re.escape(shorter), literal[:len(shorter)], re.IGNORECASE)]
+            for literal in self._literals
+        }
+        self._literal_by_upper = {literal.upper(): literal for literal in self._literals}
+        # Nombre de fila (``_row_name_key``) -> (orden, variante); gana la primera
+        self._row_index: Dict[str, Tuple[int, Dict]] = {}
+        for order, variant in enumerate(self.variants):
+            self._row_index.setdefault(_row_name_key(variant["variante"]), (order, variant))
+
+    def _hit_literal(self, found: str) -> str:
+        """Primera palabra (de ``_literals``) que coincidió con ``found``."""
+        literal = self._literal_by_upper.get(found.upper())
+        if literal is None:
+            literal = next(l for l in self._literals
+                           if len(l) == len(found) and re.fullmatch(re.escape(l), found, re.IGNORECASE))
+        return literal
+
+    def locate(self, text: str) -> Dict[str, List[int]]:
+        """Posiciones de ``text`` donde aparece la primera palabra de cada
+        variante (sin distinguir mayúsculas), en una sola pasada."""
+        positions: Dict[str, List[int]] = {literal: [] for literal in self._literals}
+        if self._locator is None:
+            return positions
+        match_at = self._locator.match
+        for hit in self._locator.finditer(text):
+            start, end = hit.span()
+            for literal in self._prefixes[self._hit_literal(hit.group())]:
+                positions[literal].append(start)
+            # finditer no superpone coincidencias: las primeras palabras que
+            # empiezan dentro de esta se prueban una por una.
+            for pos in range(start + 1, end):
+                inner = match_at(text, pos)
+                if inner:
+                    for literal in self._prefixes[self._hit_literal(inner.group())]:
+                        positions[literal].append(pos)
+        return positions
+
+    def match(self, text: str, rows: Optional[List[Dict]] = None) -> List[Dict]:
+        """
+        Busca cada parámetro en el texto de un laboratorio.
+
+        Args:
+            text: Texto del laboratorio
+            rows: Filas de tabla del mismo laboratorio (``layout_rows``); los
+                parámetros que están en ellas no se buscan en el texto
+
+        Returns:
+            Lista de diccionarios con información de cada parámetro encontrado
+        """
+        results = []
+        processed_params = set()  # Para evitar duplicados
+        from_rows = self.match_rows(rows) if rows else {}
+        located = None  # Solo si algún parámetro no está en las filas
+        line_table = _LineTable(text)
+
+        for variant in self.variants:
+            key = variant["key"]
+            # Si ya procesamos este parámetro (por otra variante), saltar
+            if key in processed_params:
+                continue
+            result = from_rows.get(key)
+            if result is None:
+                if located is None:
+                    located = self.locate(text)
+                # Sin primera palabra (variante vacía) se recorre todo el texto
+                positions = located[variant["literal"]] if variant["literal"] else None
+                if positions == []:
+                    continue
+
+                result = self._match_numeric(text, variant, positions) \
+                    or self._match_numeric_next_lines(text, variant, positions, line_table)
+                # Para parámetros cualitativos (COLOR, ASPECTO, etc.), buscar valores cualitativos
+                if result is None and variant["pattern_cualitativo"] is not None:
+                    result = self._match_cualitativo(text, variant, positions)
+            if result is not None:
+                processed_params.add(key)
+                results.append(result)
+        return results
+
+    def match_rows(self, rows: List[Dict]) -> Dict[str, Dict]:
+        """
+        Parámetros de las filas de tabla de ``layout_rows``, buscando el
+        nombre de cada fila en el diccionario de variantes.
+
+        Returns:
+            Clave del parámetro -> resultado (como los de ``match``). Como en
+            el texto, gana la primera variante del JSON que aparece y, de
+            sus filas, la primera con un valor válido.
+        """
+        found: Dict[str, Tuple[int, Dict]] = {}
+        for row in rows:
+            order, variant = self._row_index.get(_row_name_key(row["nombre"]), (None, None))
+            if variant is None or row["valor"] is None:
+                continue
+            if variant["key"] in found and found[variant["key"]][0] <= order:
+                continue
+            if row["es_numerico"]:
+                try:
+                    valor = _parse_valor(row["valor"])
+                except (ValueError, TypeError):
+                    continue
+                found[variant["key"]] = order, {
+                    "parametro": variant["nombre_original"],
+                    "valor": valor,
+                    "unidad": _determinar_unidad_final(row["unidad"], variant["unidad"], variant["nombre_original"]),
+                    "rango_min": None,
+                    "rango_max": None,
+                    "linea_original": row["texto"]
+                }
+            elif variant["pattern_cualitativo"] is not None:
+                found[variant["key"]] = order, {
+                    "parametro": variant["nombre_original"],
+                    "valor": re.sub(r'\s+', ' ', row["valor"]).strip(),
+                    "unidad": variant["unidad"],
+                    "rango_min": None,
+                    "rango_max": None,
+                    "linea_original": row["texto"],
+                    "es_cualitativo": True
+                }
+        return {key: result for key, (_, result) in found.items()}
+
+    @staticmethod
+    def _match_numeric(text: str, variant: Dict, positions: Optional[List[int]] = None) -> Optional[Dict]:
+        """Valor numérico en la misma línea que el nombre (``pattern1``)."""
+        for match in _finditer_at(variant["pattern1"], text, positions):
+            valor_str = match.group(1).strip()
+            unidad_encontrada = match.group(2).strip() if match.group(2) else ""
+            try:
+                valor = _parse_valor(valor_str)
+            except (ValueError, TypeError):
+                continue
+            # Determinar unidad final: priorizar JSON si la encontrada es incompleta
+            unidad_final = _determinar_unidad_final(unidad_encontrada, variant["unidad"], variant["nombre_original"])
+            return {
+                "parametro": variant["nombre_original"],
+                "valor": valor,
+                "unidad": unidad_final,
+                "rango_min": None,
+                "rango_max": None,
+                "linea_original": match.group(0)
+            }
+        return None
+
+    @staticmethod
+    def _match_numeric_next_lines(text: str, variant: Dict, positions: Optional[List[int]] = None,
+                                  line_table: Optional[_LineTable] = None) -> Optional[Dict]:
+        """Valor numérico en las líneas que siguen al nombre (``pattern2``).
+        Las líneas y sus marcas salen de ``line_table`` (una por texto)."""
+        line_table = line_table or _LineTable(text)
+        for match in _finditer_at(variant["pattern2"], text, positions):
+            # Buscar las siguientes 8 líneas después del parámetro (aumentado para capturar mejor)
+            next_lines = line_table.window(match.end(), 8)
+
+            # Buscar valor numérico en las siguientes líneas (se saltan las
+            # vacías, la metadata y los rangos de referencia)
+            for i, info in enumerate(next_lines):
+                valor_str = info["valor"]
+                if valor_str is None:
+                    continue
+
+                # Buscar unidad en líneas siguientes (hasta 2 líneas después)
+                unidad_encontrada = ""
+                for siguiente in next_lines[i + 1:i + 3]:
+                    if siguiente["unidad"] is not None:
+                        unidad_encontrada = siguiente["unidad"]
+                        break
+
+                try:
+                    valor = _parse_valor(valor_str)
+                except (ValueError, TypeError):
+                    continue
+                # Determinar unidad final: priorizar JSON si la encontrada es incompleta
+                unidad_final = _determinar_unidad_final(unidad_encontrada, variant["unidad"], variant["nombre_original"])
+                return {
+                    "parametro": variant["nombre_original"],
+                    "valor": valor,
+                    "unidad": unidad_final,
+                    "rango_min": None,
+                    "rango_max": None,
+                    "linea_original": f"{match.group(0).strip()} | {info['line']}"
+                }
+        return None
+
+    @staticmethod
+    def _match_cualitativo(text: str, variant: Dict, positions: Optional[List[int]] = None) -> Optional[Dict]:
+        """Valor cualitativo (texto) a continuación del nombre."""
+        for match in _finditer_at(variant["pattern_cualitativo"], text, positions):
+            # Limpiar valor cualitativo
+            valor_cualitativo = re.sub(r'\s+', ' ', match.group(1).strip()).strip()
+            if len(valor_cualitativo) > 0:
+                return {
+                    "parametro": variant["nombre_original"],
+                    "valor": valor_cualitativo,  # Guardar como string para cualitativos
+                    "unidad": variant["unidad"],
+                    "rango_min": None,
+                    "rango_max": None,
+                    "linea_original": match.group(0),
+                    "es_cualitativo": True
+                }
+        return None
+
+
+def parse_laboratory_data(text: str, include_patient_info: bool = False, config_ranges: Optional[Dict] = None,
+                          matcher: Optional[LabParameterMatcher] = None,
+                          rows: Optional[List[Dict]] = None) -> List[Dict]:
     """
     Parsea el texto extraído del PDF para encontrar parámetros, valores y rangos.
     Ahora busca específicamente los parámetros definidos en el JSON de configuración.
@@ -181,267 +788,30 @@ def parse_laboratory_data(text: str, include_patient_info: bool = False, config_
         text: Texto extraído del PDF
         include_patient_info: Si es True, incluye información del paciente en el primer resultado
         config_ranges: Diccionario con configuración de parámetros del JSON (opcional)
+        matcher: Patrones ya compilados (``LaboratoryRanges.parameter_matcher``);
+            si se indica, ``config_ranges`` no se usa
+        rows: Filas de tabla del PDF (``LaboratoryPDFExtractor.extract_rows``);
+            los parámetros se buscan primero en ellas
         
     Returns:
         Lista de diccionarios con información de cada parámetro encontrado.
         Si include_patient_info es True, el primer elemento puede contener información del paciente.
     """
-    results = []
     patient_info = None
     
     if include_patient_info:
         patient_info = extract_patient_info(text)
     
-    # Cargar configuración de rangos si no se proporciona
-    if config_ranges is None:
-        from app.lab_ranges import LaboratoryRanges
-        ranges_obj = LaboratoryRanges()
-        config_ranges = ranges_obj.ranges
-    
-    # Si la configuración tiene estructura nueva con "parametros", extraerla
-    if isinstance(config_ranges, dict) and "parametros" in config_ranges:
-        config_ranges = config_ranges["parametros"]
+    if matcher is None:
+        if config_ranges is None:
+            # Configuración de rangos predeterminada (compilada una vez
+            # mientras config/lab_ranges.json no cambie)
+            from app.lab_ranges import default_laboratory_ranges
+            matcher = default_laboratory_ranges().parameter_matcher()
+        else:
+            matcher = LabParameterMatcher(config_ranges)
     
-    lines = text.split('\n')
-    
-    # Limpiar líneas vacías y muy cortas
-    lines = [line.strip() for line in lines if line.strip() and len(line.strip()) >= 3]
-    
-    # Palabras clave que NO son parámetros (encabezados, metadata, etc.)
-    # NOTA: COLOR, ASPECTO, DENSIDAD, PH, etc. SÍ son parámetros válidos, NO deben estar aquí
-    EXCLUDE_KEYWORDS = [
-        'FECHA', 'PACIENTE', 'DNI', 'LABORATORIO', 'PAGINA', 'RESULTADO',
-        'PROTOCOLO', 'NRO', 'NUMERO', 'Nº', 'N°', 'PROTOCOLO NRO',
-        'VARELA', 'TEL', 'TELEFONO', 'CAPITAL', 'FEDERAL', 'CONSULTORIO',
-        'MEDICO', 'BOGOTA', 'INSTITUCION', 'AFILIADO',
-        'RUTINA NUMERO', 'RUTINA NRO', 'APELLIDO', 'NOMBRE',
-        'VALIDADO', 'FIRMADO', 'ELECTRONICAMENTE', 'BIOQ', 'DIRECTORA',
-        'TECNICA', 'PRECISION', 'ESTUDIOS', 'AVALADA', 'PROGRAMA',
-        'EVALUACION', 'EXTERNA', 'CALIDAD', 'FEDERACION', 'BIOQUIMICA',
-        'ARGENTINA', 'METODO', 'WESTERGREN', 'ENZIMATICO', 'CINETICO',
-        'TIRA', 'REACTIVA', 'HOMBRES:', 'MUJERES:', 'HASTA',
-        'MILL', 'CPO', 'CAMP', 'REGULAR', 'NORMAL', 'CONTROL'
-    ]
-    
-    # Construir lista de parámetros a buscar desde la configuración
-    parametros_a_buscar = {}
-    for key, config in config_ranges.items():
-        nombre = config.get("nombre", key)
-        sinonimos = config.get("sinonimos", [])
-        unidad_esperada = config.get("unidad", "")
-        
-        # Crear lista de todas las variantes del nombre
-        todas_variantes = [nombre] + sinonimos
-        
-        # Para cada variante, crear entrada en el diccionario
-        # Usar la variante original (no normalizada) como clave para búsqueda flexible
-        for variante in todas_variantes:
-            # Usar la variante tal cual aparece (mayúsculas) para búsqueda
-            variante_upper = variante.upper().strip()
-            if variante_upper not in parametros_a_buscar:
-                parametros_a_buscar[variante_upper] = {
-                    "key": key,
-                    "nombre_original": nombre,
-                    "unidad": unidad_esperada,
-                    "config": config,
-                    "variante": variante_upper
-                }
-    
-    processed_params = set()  # Para evitar duplicados
-    
-    # Buscar cada parámetro específicamente en el texto
-    text_upper = text.upper()
-    
-    for variante_upper, param_info in parametros_a_buscar.items():
-        nombre_original = param_info["nombre_original"]
-        key = param_info["key"]
-        unidad_esperada = param_info["unidad"]
-        config = param_info["config"]
-        variante = param_info["variante"]
-        
-        # Si ya procesamos este parámetro (por otra variante), saltar
-        if key in processed_params:
-            continue
-        
-        # Crear patrón flexible para buscar el parámetro
-        # Puede aparecer como: "ERITROCITOS................................ 4.330.000 /mm3"
-        # O en líneas separadas: "ERITROCITOS................................\n4.330.000\n/mm3"
-        
-        # Crear patrón flexible para el nombre (permitir variaciones)
-        # Usar la variante específica para buscar
-        nombre_pattern = variante
-        
-        # Dividir el nombre en palabras para manejar mejor puntos y espacios
-        palabras = nombre_pattern.split()
-        patrones_palabras = []
-        
-        for palabra in palabras:
-            # Escapar la palabra pero permitir puntos opcionales al final
-            palabra_escaped = re.escape(palabra)
-            # Si la palabra termina con punto en el original, hacerlo opcional
-            if palabra.endswith('.'):
-                palabra_escaped = palabra_escaped[:-2] + r'\.?'  # Remover escape del punto y hacerlo opcional
-            patrones_palabras.append(palabra_escaped)
-        
-        # Unir palabras con espacios/puntos flexibles
-        nombre_pattern = r'[\s\.]+'.join(patrones_palabras)
-        
-        # Patrón 1: Parámetro seguido de puntos/espacios y valor en la misma línea
-        pattern1 = re.compile(
-            rf'{nombre_pattern}[\.\s]{{3,}}'  # Nombre seguido de puntos/espacios (mínimo 3)
-            r'([0-9]+[.,]?[0-9]*[.,]?[0-9]*)'  # Valor numérico
-            r'\s*'                              # Espacios opcionales
-            r'([a-zA-Z/%µ²³°\s]+)?',          # Unidad opcional (puede estar en misma línea)
-            re.IGNORECASE | re.MULTILINE
-        )
-        
-        # Patrón 2: Parámetro en una línea, valor en la siguiente (más flexible)
-        # Buscar el nombre seguido de muchos puntos (típico formato del PDF)
-        # Reducido a mínimo 5 para capturar mejor casos como "Volumen Corpuscular Medio"
-        pattern2 = re.compile(
-            rf'{nombre_pattern}[\.\s]{{5,}}',  # Nombre seguido de puntos/espacios (mínimo 5)
-            re.IGNORECASE | re.MULTILINE
-        )
-        
-        # Buscar con patrón 1 (misma línea)
-        for match in pattern1.finditer(text):
-            valor_str = match.group(1).strip()
-            unidad_encontrada = match.group(2).strip() if match.group(2) else ""
-            
-            # Normalizar valor
-            if valor_str.count('.') > 1:
-                valor_str_clean = valor_str.replace('.', '')
-            elif ',' in valor_str:
-                valor_str_clean = valor_str.replace(',', '.')
-            else:
-                valor_str_clean = valor_str
-            
-            try:
-                valor = float(valor_str_clean)
-                
-                # Determinar unidad final: priorizar JSON si la encontrada es incompleta
-                unidad_final = _determinar_unidad_final(unidad_encontrada, unidad_esperada, nombre_original)
-                
-                if key not in processed_params:
-                    processed_params.add(key)
-                    results.append({
-                        "parametro": nombre_original,
-                        "valor": valor,
-                        "unidad": unidad_final,
-                        "rango_min": None,
-                        "rango_max": None,
-                        "linea_original": match.group(0)
-                    })
-                    break
-            except (ValueError, TypeError):
-                continue
-        
-        # Si no se encontró con patrón 1, buscar con patrón 2 (líneas separadas)
-        if key not in processed_params:
-            for match in pattern2.finditer(text):
-                match_start = match.end()
-                # Buscar las siguientes 8 líneas después del parámetro (aumentado para capturar mejor)
-                remaining_text = text[match_start:]
-                next_lines = remaining_text.split('\n')[:8]
-                
-                # Buscar valor numérico en las siguientes líneas
-                valor_encontrado = False
-                for i, line in enumerate(next_lines):
-                    line = line.strip()
-                    
-                    # Saltar líneas vacías
-                    if not line:
-                        continue
-                    
-                    # Saltar líneas que son claramente metadata o rangos de referencia
-                    line_upper = line.upper()
-                    if any(exclude in line_upper for exclude in EXCLUDE_KEYWORDS):
-                        continue
-                    
-                    # Saltar líneas que son rangos de referencia (contienen "HOMBRES:", "MUJERES:", "a", etc.)
-                    if re.search(r'\b(HOMBRES|MUJERES|HASTA|DESDE|METODO)\b', line_upper):
-                        continue
-                    
-                    # Buscar número con posible unidad
-                    valor_match = re.search(r'^([0-9]+[.,]?[0-9]*[.,]?[0-9]*)\s*$', line)
-                    if valor_match:
-                        valor_str = valor_match.group(1)
-                        
-                        # Buscar unidad en líneas siguientes (hasta 2 líneas después)
-                        unidad_encontrada = ""
-                        for j in range(i + 1, min(i + 3, len(next_lines))):
-                            siguiente_linea = next_lines[j].strip()
-                            # Buscar unidad que no sea solo un número y no sea metadata
-                            if siguiente_linea and not re.match(r'^[\d\s\.\,\-]+$', siguiente_linea):
-                                if not any(exclude in siguiente_linea.upper() for exclude in EXCLUDE_KEYWORDS):
-                                    unidad_match = re.search(r'^([a-zA-Z/%µ²³°º\s]+)$', siguiente_linea)
-                                    if unidad_match:
-                                        unidad_encontrada = unidad_match.group(1).strip()
-                                        break
-                        
-                        # Normalizar valor
-                        if valor_str.count('.') > 1:
-                            valor_str_clean = valor_str.replace('.', '')
-                        elif ',' in valor_str:
-                            valor_str_clean = valor_str.replace(',', '.')
-                        else:
-                            valor_str_clean = valor_str
-                        
-                        try:
-                            valor = float(valor_str_clean)
-                            
-                            # Determinar unidad final: priorizar JSON si la encontrada es incompleta
-                            unidad_final = _determinar_unidad_final(unidad_encontrada, unidad_esperada, nombre_original)
-                            
-                            if key not in processed_params:
-                                processed_params.add(key)
-                                results.append({
-                                    "parametro": nombre_original,
-                                    "valor": valor,
-                                    "unidad": unidad_final,
-                                    "rango_min": None,
-                                    "rango_max": None,
-                                    "linea_original": f"{match.group(0).strip()} | {line}"
-                                })
-                                valor_encontrado = True
-                                break
-                        except (ValueError, TypeError):
-                            continue
-                    
-                    # Si encontramos el parámetro, salir del loop
-                    if valor_encontrado:
-                        break
-                
-                if key in processed_params:
-                    break
-        
-        # Para parámetros cualitativos (COLOR, ASPECTO, etc.), buscar valores cualitativos
-        tipo_valor = config.get("tipo_valor", "")
-        if tipo_valor == "cualitativo" and key not in processed_params:
-            # Buscar el parámetro seguido de un valor cualitativo
-            pattern_cualitativo = re.compile(
-                rf'{nombre_pattern}[\.\s]{{3,}}'  # Nombre seguido de puntos/espacios
-                r'([A-ZÁÉÍÓÚÑ\s]+)',              # Valor cualitativo (texto en mayúsculas)
-                re.IGNORECASE | re.MULTILINE
-            )
-            
-            for match in pattern_cualitativo.finditer(text):
-                valor_cualitativo = match.group(1).strip()
-                # Limpiar valor cualitativo
-                valor_cualitativo = re.sub(r'\s+', ' ', valor_cualitativo).strip()
-                
-                if len(valor_cualitativo) > 0 and key not in processed_params:
-                    processed_params.add(key)
-                    results.append({
-                        "parametro": nombre_original,
-                        "valor": valor_cualitativo,  # Guardar como string para cualitativos
-                        "unidad": unidad_esperada,
-                        "rango_min": None,
-                        "rango_max": None,
-                        "linea_original": match.group(0),
-                        "es_cualitativo": True
-                    })
-                    break
+    results = matcher.match(text, rows)
     
     # Si se solicitó información del paciente y se encontró, agregarla al primer resultado
     if include_patient_info and patient_info and results:
@@ -4,7 +4,85 @@ Sistema de configuración de rangos de referencia para parámetros de laboratori
 import json
 from pathlib import Path
 from typing import Dict, Optional, Tuple, List
-from app.lab_extractor import normalize_parametro_name
+from app.lab_extractor import LabParameterMatcher, normalize_parametro_name
+
+
+# Patrones compilados por archivo de configuración: ruta -> (tamaño y mtime
+# del JSON al compilarlos, matcher). Los comparten todas las instancias de
+# ``LaboratoryRanges`` del proceso.
+_compiled_matchers: Dict[str, Tuple[Tuple[int, int], LabParameterMatcher]] = {}
+
+# Sexos de las tablas de rangos precalculadas (None: sin indicar).
+_SEXOS = (None, "hombre", "mujer")
+
+
+def _normalize_sexo(sexo: Optional[str]) -> Optional[str]:
+    """Sexo como ``"hombre"``, ``"mujer"`` o None ("H", "MASCULINO", "F"...)."""
+    if sexo:
+        sexo_upper = sexo.upper()
+        if sexo_upper in ["HOMBRE", "H", "MASCULINO", "M"]:
+            return "hombre"
+        elif sexo_upper in ["MUJER", "F", "FEMENINO", "FEM"]:
+            return "mujer"
+    return None
+
+
+def _range_from_config(config: Dict, sexo_normalizado: Optional[str]) -> Optional[Tuple[float, float]]:
+    """Rango (min, max) de la configuración de un parámetro para un sexo."""
+    # Estructura nueva: con rangos diferenciados por sexo
+    if "rangos" in config:
+        rangos = config.get("rangos", {})
+        requiere_sexo = config.get("requiere_sexo", False)
+        
+        # Si requiere sexo y se proporcionó, usar ese rango
+        if requiere_sexo and sexo_normalizado:
+            rango_sexo = rangos.get(sexo_normalizado)
+            if rango_sexo:
+                min_val = rango_sexo.get("min")
+                max_val = rango_sexo.get("max")
+                # Permitir rangos con solo mínimo (ej: COLESTEROL_HDL "mayor a X")
+                if min_val is not None:
+                    return (min_val, max_val)  # max_val puede ser None
+        
+        # Si no requiere sexo o los rangos son iguales, usar cualquier rango disponible
+        if not requiere_sexo or not sexo_normalizado:
+            # Intentar con "hombre" primero, luego "mujer"
+            for sexo_key in ["hombre", "mujer"]:
+                rango_sexo = rangos.get(sexo_key)
+                if rango_sexo:
+                    min_val = rango_sexo.get("min")
+                    max_val = rango_sexo.get("max")
+                    # Permitir rangos con solo mínimo
+                    if min_val is not None:
+                        return (min_val, max_val)  # max_val puede ser None
+        
+        return None
+    
+    # Estructura antigua: min/max directos
+    if "min" in config and "max" in config:
+        return (config.get("min"), config.get("max"))
+    
+    return None
+
+
+def _validate_from_config(config: Dict) -> bool:
+    """Si el parámetro de ``config`` se valida contra rangos numéricos."""
+    # Si tiene validar_rango explícito, usar ese valor
+    if "validar_rango" in config:
+        return config.get("validar_rango", True)
+    # Si tiene tipo_valor "cualitativo", no validar
+    if config.get("tipo_valor") == "cualitativo":
+        return False
+    # Si no tiene rangos numéricos, no validar
+    if "rangos" in config:
+        rangos = config.get("rangos", {})
+        for sexo_key in ["hombre", "mujer"]:
+            rango_sexo = rangos.get(sexo_key, {})
+            if rango_sexo.get("min") is None or rango_sexo.get("max") is None:
+                continue
+            return True
+        return False
+    return True
 
 
 class LaboratoryRanges:
@@ -25,7 +103,24 @@ class LaboratoryRanges:
         self.config_path = config_path
         self.ranges: Dict[str, Dict] = {}
         self.metadata: Dict = {}
+        # Versión del JSON (tamaño, mtime) de la que se cargaron los rangos
+        # y patrones compilados de esos rangos (ver ``parameter_matcher``).
+        self._loaded_stamp: Optional[Tuple[int, int]] = None
+        self._matcher: Optional[LabParameterMatcher] = None
+        # Índices de búsqueda por nombre y tablas precalculadas (ver
+        # ``_build_index``)
+        self._name_index: Dict[str, str] = {}
+        self._synonym_index: Dict[str, str] = {}
+        self._range_table: Dict[str, Dict[Optional[str], Optional[Tuple[float, float]]]] = {}
+        self._validate_table: Dict[str, bool] = {}
         self.load_ranges()
+
+    def _config_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self.config_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
     
     def load_ranges(self):
         """Carga los rangos desde el archivo de configuración."""
@@ -56,6 +151,9 @@ class LaboratoryRanges:
             self.ranges = self._get_default_ranges()
             self.metadata = {}
             self.save_ranges()
+        self._loaded_stamp = self._config_stamp()
+        self._matcher = None
+        self._build_index()
     
     def save_ranges(self):
         """Guarda los rangos en el archivo de configuración."""
@@ -72,6 +170,64 @@ class LaboratoryRanges:
         
         with open(self.config_path, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=2, ensure_ascii=False)
+        self._loaded_stamp = self._config_stamp()
+        self._matcher = None
+        self._build_index()
+
+    def _build_index(self):
+        """
+        Índices de los rangos cargados, para que buscar un parámetro no
+        recorra toda la configuración normalizando cada sinónimo:
+
+        - ``_name_index``: nombre o sinónimo normalizado -> clave (``get_range``),
+        - ``_synonym_index``: sinónimo normalizado -> clave (``get_unidad`` y
+          ``should_validate_range``),
+        - ``_range_table``: clave -> rango por sexo, ``_validate_table``:
+          clave -> si se valida.
+
+        Si un nombre aparece en varios parámetros gana el primero, como al
+        recorrerlos en orden.
+        """
+        self._name_index = {}
+        self._synonym_index = {}
+        self._range_table = {}
+        self._validate_table = {}
+        for key, cfg in self.ranges.items():
+            self._name_index.setdefault(normalize_parametro_name(cfg.get("nombre", key)), key)
+            for sinonimo in cfg.get("sinonimos", []):
+                normalized = normalize_parametro_name(sinonimo)
+                self._name_index.setdefault(normalized, key)
+                self._synonym_index.setdefault(normalized, key)
+            self._range_table[key] = {sexo: _range_from_config(cfg, sexo) for sexo in _SEXOS}
+            self._validate_table[key] = _validate_from_config(cfg)
+
+    def _synonym_key(self, parametro: str) -> Optional[str]:
+        """Clave del parámetro por su nombre normalizado o un sinónimo."""
+        normalized = normalize_parametro_name(parametro)
+        if normalized in self.ranges:
+            return normalized
+        return self._synonym_index.get(normalized)
+
+    def parameter_matcher(self) -> LabParameterMatcher:
+        """
+        Patrones compilados de todos los parámetros para ``parse_laboratory_data``.
+
+        Se compilan una vez por versión del JSON: si el archivo cambió desde
+        que se cargó, se recargan los rangos y se vuelven a compilar.
+        """
+        stamp = self._config_stamp()
+        if stamp != self._loaded_stamp:
+            self.load_ranges()
+            stamp = self._loaded_stamp
+        if self._matcher is None:
+            cached = _compiled_matchers.get(str(self.config_path))
+            if cached is not None and stamp is not None and cached[0] == stamp:
+                self._matcher = cached[1]
+            else:
+                self._matcher = LabParameterMatcher(self.ranges)
+                if stamp is not None:
+                    _compiled_matchers[str(self.config_path)] = (stamp, self._matcher)
+        return self._matcher
     
     def _get_default_ranges(self) -> Dict:
         """Retorna rangos predeterminados (ejemplo inicial)."""
@@ -119,77 +275,16 @@ class LaboratoryRanges:
         Returns:
             Tupla (min, max) o None si no se encuentra
         """
-        normalized = normalize_parametro_name(parametro)
-        config = None
-        
-        # Buscar directamente por clave
+        # Buscar directamente por clave, luego por nombre o sinónimo
         if parametro.upper() in self.ranges:
-            config = self.ranges[parametro.upper()]
-        elif normalized in self.ranges:
-            config = self.ranges[normalized]
+            key = parametro.upper()
         else:
-            # Buscar en sinónimos y nombres
-            for key, cfg in self.ranges.items():
-                nombre_cfg = cfg.get("nombre", key)
-                sinonimos = cfg.get("sinonimos", [])
-                # Comparar con nombre normalizado
-                if normalize_parametro_name(nombre_cfg) == normalized:
-                    config = cfg
-                    break
-                # Comparar con sinónimos normalizados
-                for sinonimo in sinonimos:
-                    if normalize_parametro_name(sinonimo) == normalized:
-                        config = cfg
-                        break
-                if config:
-                    break
+            normalized = normalize_parametro_name(parametro)
+            key = normalized if normalized in self.ranges else self._name_index.get(normalized)
         
-        if config is None:
+        if key is None:
             return None
-        
-        # Normalizar sexo si se proporciona
-        sexo_normalizado = None
-        if sexo:
-            sexo_upper = sexo.upper()
-            if sexo_upper in ["HOMBRE", "H", "MASCULINO", "M"]:
-                sexo_normalizado = "hombre"
-            elif sexo_upper in ["MUJER", "F", "FEMENINO", "FEM"]:
-                sexo_normalizado = "mujer"
-        
-        # Estructura nueva: con rangos diferenciados por sexo
-        if "rangos" in config:
-            rangos = config.get("rangos", {})
-            requiere_sexo = config.get("requiere_sexo", False)
-            
-            # Si requiere sexo y se proporcionó, usar ese rango
-            if requiere_sexo and sexo_normalizado:
-                rango_sexo = rangos.get(sexo_normalizado)
-                if rango_sexo:
-                    min_val = rango_sexo.get("min")
-                    max_val = rango_sexo.get("max")
-                    # Permitir rangos con solo mínimo (ej: COLESTEROL_HDL "mayor a X")
-                    if min_val is not None:
-                        return (min_val, max_val)  # max_val puede ser None
-            
-            # Si no requiere sexo o los rangos son iguales, usar cualquier rango disponible
-            if not requiere_sexo or not sexo_normalizado:
-                # Intentar con "hombre" primero, luego "mujer"
-                for sexo_key in ["hombre", "mujer"]:
-                    rango_sexo = rangos.get(sexo_key)
-                    if rango_sexo:
-                        min_val = rango_sexo.get("min")
-                        max_val = rango_sexo.get("max")
-                        # Permitir rangos con solo mínimo
-                        if min_val is not None:
-                            return (min_val, max_val)  # max_val puede ser None
-            
-            return None
-        
-        # Estructura antigua: min/max directos
-        if "min" in config and "max" in config:
-            return (config.get("min"), config.get("max"))
-        
-        return None
+        return self._range_table[key][_normalize_sexo(sexo)]
     
     def get_unidad(self, parametro: str) -> Optional[str]:
         """
@@ -201,22 +296,10 @@ class LaboratoryRanges:
         Returns:
             Unidad o None si no se encuentra
         """
-        normalized = normalize_parametro_name(parametro)
-        config = None
-        
-        if normalized in self.ranges:
-            config = self.ranges[normalized]
-        else:
-            for key, cfg in self.ranges.items():
-                sinonimos = cfg.get("sinonimos", [])
-                if normalized in [normalize_parametro_name(s) for s in sinonimos]:
-                    config = cfg
-                    break
-        
-        if config:
-            return config.get("unidad")
-        
-        return None
+        key = self._synonym_key(parametro)
+        if key is None:
+            return None
+        return self.ranges[key].get("unidad")
     
     def should_validate_range(self, parametro: str) -> bool:
         """
@@ -229,36 +312,10 @@ class LaboratoryRanges:
         Returns:
             True si debe validarse, False si es cualitativo
         """
-        normalized = normalize_parametro_name(parametro)
-        config = None
-        
-        if normalized in self.ranges:
-            config = self.ranges[normalized]
-        else:
-            for key, cfg in self.ranges.items():
-                sinonimos = cfg.get("sinonimos", [])
-                if normalized in [normalize_parametro_name(s) for s in sinonimos]:
-                    config = cfg
-                    break
-        
-        if config:
-            # Si tiene validar_rango explícito, usar ese valor
-            if "validar_rango" in config:
-                return config.get("validar_rango", True)
-            # Si tiene tipo_valor "cualitativo", no validar
-            if config.get("tipo_valor") == "cualitativo":
-                return False
-            # Si no tiene rangos numéricos, no validar
-            if "rangos" in config:
-                rangos = config.get("rangos", {})
-                for sexo_key in ["hombre", "mujer"]:
-                    rango_sexo = rangos.get(sexo_key, {})
-                    if rango_sexo.get("min") is None or rango_sexo.get("max") is None:
-                        continue
-                    return True
-                return False
-        
-        return True  # Por defecto, validar
+        key = self._synonym_key(parametro)
+        if key is None:
+            return True  # Por defecto, validar
+        return self._validate_table[key]
     
     def add_range(self, parametro: str, min_val: float, max_val: float, 
                   unidad: str = "", sinonimos: List[str] = None):
@@ -281,3 +338,13 @@ class LaboratoryRanges:
         }
         self.save_ranges()
 
+
+_default_ranges: Optional[LaboratoryRanges] = None
+
+
+def default_laboratory_ranges() -> LaboratoryRanges:
+    """Rangos de ``config/lab_ranges.json`` compartidos por el proceso."""
+    global _default_ranges
+    if _default_ranges is None:
+        _default_ranges = LaboratoryRanges()
+    return _default_ranges
@@ -0,0 +1,98 @@
+"""
+Puente UNO entre el pool de LibreOffice y una instancia headless ya iniciada.
+
+Este script NO se importa desde la aplicación: ``LibreOfficePool`` lo lanza
+como proceso hijo con un intérprete que tenga el módulo ``uno`` (en el
+contenedor, el python del sistema con el paquete ``python3-uno``), por eso
+solo depende de la librería estándar.
+
+Protocolo (una línea JSON por mensaje):
+    - Al conectarse a LibreOffice escribe ``{"ready": true}`` en stdout.
+    - Por cada trabajo ``{"src": "...xlsx", "dst": "...pdf"}`` leído de stdin
+      responde ``{"ok": true}`` o ``{"ok": false, "error": "..."}``.
+
+Uso: python3 libreoffice_bridge.py <nombre_pipe> [timeout_conexion_segundos]
+"""
+import json
+import sys
+import time
+
+
+def _reply(message: dict):
+    sys.stdout.write(json.dumps(message) + "\n")
+    sys.stdout.flush()
+
+
+def _prop(name: str, value):
+    from com.sun.star.beans import PropertyValue
+
+    prop = PropertyValue()
+    prop.Name = name
+    prop.Value = value
+    return prop
+
+
+def _connect(pipe_name: str, timeout: float):
+    """Se conecta a la instancia de LibreOffice que escucha en ``pipe_name``.
+    Reintenta hasta ``timeout`` segundos porque soffice tarda en arrancar."""
+    import uno
+
+    local_ctx = uno.getComponentContext()
+    resolver = local_ctx.ServiceManager.createInstanceWithContext(
+        "com.sun.star.bridge.UnoUrlResolver", local_ctx
+    )
+    url = f"uno:pipe,name={pipe_name};urp;StarOffice.ComponentContext"
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            ctx = resolver.resolve(url)
+            return ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.25)
+
+
+def _convert(desktop, src: str, dst: str):
+    import uno
+
+    doc = desktop.loadComponentFromURL(
+        uno.systemPathToFileUrl(src), "_blank", 0, (_prop("Hidden", True),)
+    )
+    if doc is None:
+        raise RuntimeError(f"LibreOffice no pudo abrir {src}")
+    try:
+        doc.storeToURL(uno.systemPathToFileUrl(dst), (_prop("FilterName", "calc_pdf_Export"),))
+    finally:
+        doc.close(True)
+
+
+def main(argv) -> int:
+    if len(argv) < 2:
+        _reply({"ready": False, "error": "Falta el nombre del pipe de LibreOffice"})
+        return 2
+    pipe_name = argv[1]
+    timeout = float(argv[2]) if len(argv) > 2 else 60.0
+
+    try:
+        desktop = _connect(pipe_name, timeout)
+    except Exception as exc:
+        _reply({"ready": False, "error": f"{type(exc).__name__}: {exc}"})
+        return 1
+
+    _reply({"ready": True})
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+            _convert(desktop, job["src"], job["dst"])
+            _reply({"ok": True})
+        except Exception as exc:
+            _reply({"ok": False, "error": f"{type(exc).__name__}: {exc}"})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
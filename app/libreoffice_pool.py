@@ -0,0 +1,267 @@
+"""
+Pool de instancias de LibreOffice de larga vida para convertir carátulas.
+
+Arrancar ``soffice`` en frío cuesta varios segundos por carátula. El pool
+mantiene ``size`` instancias headless (cada una con su propio perfil de
+usuario, así pueden correr en paralelo) y les envía los trabajos a través de
+``libreoffice_bridge.py`` por un pipe local. Si un worker se cuelga o muere
+se reinicia, y si el pool no puede usarse (por ejemplo, falta ``python3-uno``)
+cada conversión cae a ``convert_xlsx_to_pdf`` de un solo disparo.
+"""
+import json
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+from app.converters import (
+    LIBREOFFICE_BIN,
+    convert_xlsx_to_pdf,
+    libreoffice_env,
+    prepare_libreoffice_profile,
+)
+
+
+DEFAULT_POOL_SIZE = 2
+
+_BRIDGE_SCRIPT = Path(__file__).resolve().parent / "libreoffice_bridge.py"
+
+# Reintentos de arranque antes de dar por perdido un worker.
+_MAX_START_FAILURES = 2
+
+
+def _bridge_python() -> str:
+    """Intérprete con el módulo ``uno`` para correr el puente.
+
+    Se puede forzar con la variable de entorno ``LIBREOFFICE_PYTHON``; por
+    defecto se usa el python del sistema, que es donde ``python3-uno``
+    instala el módulo.
+    """
+    configured = os.environ.get("LIBREOFFICE_PYTHON")
+    if configured:
+        return configured
+    if Path("/usr/bin/python3").exists():
+        return "/usr/bin/python3"
+    return sys.executable
+
+
+class LibreOfficeWorker:
+    """Una instancia headless de LibreOffice más su proceso puente UNO."""
+
+    def __init__(self, worker_id: int, profile_dir: Path, startup_timeout: float = 30.0):
+        self.worker_id = worker_id
+        self.profile_dir = profile_dir
+        self.startup_timeout = startup_timeout
+        self.start_failures = 0
+        self.jobs_done = 0
+        self._office: Optional[subprocess.Popen] = None
+        self._bridge: Optional[subprocess.Popen] = None
+        self._responses: "queue.Queue[dict]" = queue.Queue()
+
+    def is_alive(self) -> bool:
+        return (
+            self._office is not None and self._office.poll() is None
+            and self._bridge is not None and self._bridge.poll() is None
+        )
+
+    def start(self):
+        """Lanza soffice escuchando en un pipe propio y espera a que el puente conecte."""
+        pipe_name = f"reportassembler_{os.getpid()}_{self.worker_id}_{uuid.uuid4().hex[:8]}"
+        profile_arg = prepare_libreoffice_profile(self.profile_dir)
+        self._office = subprocess.Popen(
+            [
+                LIBREOFFICE_BIN, "--headless", "--invisible", "--nologo",
+                "--norestore", "--nodefault", "--nolockcheck", profile_arg,
+                f"--accept=pipe,name={pipe_name};urp;StarOffice.ComponentContext",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            env=libreoffice_env(),
+            # Grupo de procesos propio: el wrapper lanza oosplash/soffice.bin
+            # como hijos y hay que poder matarlos a todos juntos.
+            start_new_session=True,
+        )
+        try:
+            self._bridge = subprocess.Popen(
+                [_bridge_python(), str(_BRIDGE_SCRIPT), pipe_name, str(self.startup_timeout)],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                bufsize=1,
+            )
+        except OSError:
+            self.stop()
+            raise
+        self._responses = queue.Queue()
+        threading.Thread(
+            target=self._read_responses, args=(self._bridge, self._responses), daemon=True
+        ).start()
+
+        try:
+            message = self._responses.get(timeout=self.startup_timeout + 5)
+        except queue.Empty:
+            message = {"ready": False, "error": "timeout esperando a LibreOffice"}
+        if not message.get("ready"):
+            self.stop()
+            raise RuntimeError(f"No se pudo iniciar el worker LibreOffice {self.worker_id}: {message.get('error')}")
+        print(f"🟢 Worker LibreOffice {self.worker_id} listo")
+
+    @staticmethod
+    def _read_responses(bridge: subprocess.Popen, responses: "queue.Queue[dict]"):
+        for line in bridge.stdout:
+            try:
+                responses.put(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        responses.put({"ready": False, "ok": False, "error": "el puente UNO terminó"})
+
+    def convert(self, xlsx_path: Path, output_pdf_path: Path, timeout: float):
+        job = {"src": str(Path(xlsx_path).resolve()), "dst": str(Path(output_pdf_path).resolve())}
+        self._bridge.stdin.write(json.dumps(job) + "\n")
+        self._bridge.stdin.flush()
+        try:
+            message = self._responses.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"LibreOffice no respondió en {timeout:.0f}s")
+        if not message.get("ok"):
+            raise RuntimeError(message.get("error", "error desconocido"))
+        if not Path(output_pdf_path).exists():
+            raise FileNotFoundError(f"LibreOffice no generó {output_pdf_path}")
+        self.jobs_done += 1
+
+    def stop(self):
+        if self._bridge is not None:
+            try:
+                self._bridge.stdin.close()
+            except (OSError, ValueError):
+                pass
+            if self._bridge.poll() is None:
+                self._bridge.kill()
+            self._bridge.wait()
+            self._bridge = None
+        if self._office is not None:
+            if self._office.poll() is None:
+                try:
+                    os.killpg(self._office.pid, signal.SIGKILL)
+                except (ProcessLookupError, PermissionError):
+                    self._office.kill()
+            self._office.wait()
+            self._office = None
+
+
+class LibreOfficePool:
+    """Pool de workers de LibreOffice con fallback a la conversión directa.
+
+    Los workers arrancan de forma perezosa en el primer trabajo que les toca.
+    El worker libre que se toma es el último devuelto (LIFO): con trabajos
+    secuenciales se reutiliza siempre el mismo y los demás solo arrancan
+    cuando hay conversiones concurrentes de verdad.
+    Un ``size`` de 0 desactiva el pool y todas las conversiones usan
+    ``convert_xlsx_to_pdf``.
+
+    Uso:
+        with LibreOfficePool(size=2) as pool:
+            pool.convert(xlsx_path, pdf_path)
+    """
+
+    def __init__(self, size: int = DEFAULT_POOL_SIZE, job_timeout: float = 60.0,
+                 startup_timeout: float = 30.0):
+        self.size = max(0, int(size or 0))
+        self.job_timeout = job_timeout
+        self._profile_root = Path(tempfile.mkdtemp(prefix="lo_pool_")) if self.size else None
+        self._workers: List[LibreOfficeWorker] = [
+            LibreOfficeWorker(i, self._profile_root / f"worker_{i}", startup_timeout)
+            for i in range(self.size)
+        ]
+        # Pila de workers libres: el del final es el próximo en usarse
+        self._idle: List[LibreOfficeWorker] = list(reversed(self._workers))
+        self._idle_cond = threading.Condition()
+        self._disabled = self.size == 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def enabled(self) -> bool:
+        return not self._disabled
+
+    def convert(self, xlsx_path: Path, output_pdf_path: Path):
+        """Convierte ``xlsx_path`` a ``output_pdf_path``. Si el worker falla
+        se reinicia y la carátula se convierte con el método directo."""
+        if self._disabled:
+            convert_xlsx_to_pdf(xlsx_path, output_pdf_path)
+            return
+
+        xlsx_path = Path(xlsx_path)
+        output_pdf_path = Path(output_pdf_path)
+        if not xlsx_path.exists():
+            raise FileNotFoundError(f"XLSX de entrada no existe: {xlsx_path}")
+        output_pdf_path.parent.mkdir(parents=True, exist_ok=True)
+
+        worker = self._acquire()
+        try:
+            if self._ensure_started(worker):
+                try:
+                    worker.convert(xlsx_path, output_pdf_path, self.job_timeout)
+                    return
+                except Exception as e:
+                    print(f"⚠️ Worker LibreOffice {worker.worker_id} falló con {xlsx_path.name} ({e}). Se reinicia.")
+                    worker.stop()
+        finally:
+            self._release(worker)
+
+        print(f"↩️ Convirtiendo {xlsx_path.name} con LibreOffice de un solo disparo")
+        convert_xlsx_to_pdf(xlsx_path, output_pdf_path)
+
+    def _acquire(self) -> LibreOfficeWorker:
+        with self._idle_cond:
+            while not self._idle:
+                self._idle_cond.wait()
+            return self._idle.pop()
+
+    def _release(self, worker: LibreOfficeWorker):
+        """Devuelve el worker a la pila. Uno que ya agotó sus arranques va al
+        fondo para que no tape a los que todavía pueden arrancar."""
+        with self._idle_cond:
+            if worker.start_failures >= _MAX_START_FAILURES:
+                self._idle.insert(0, worker)
+            else:
+                self._idle.append(worker)
+            self._idle_cond.notify()
+
+    def _ensure_started(self, worker: LibreOfficeWorker) -> bool:
+        if worker.is_alive():
+            return True
+        if worker.start_failures >= _MAX_START_FAILURES:
+            return False
+        try:
+            worker.start()
+            worker.start_failures = 0
+            return True
+        except Exception as e:
+            worker.start_failures += 1
+            print(f"⚠️ {e}")
+            with self._lock:
+                if all(w.start_failures >= _MAX_START_FAILURES for w in self._workers):
+                    print("⚠️ Pool de LibreOffice deshabilitado: se usará la conversión directa")
+                    self._disabled = True
+            return False
+
+    def close(self):
+        for worker in self._workers:
+            worker.stop()
+        if self._profile_root is not None:
+            shutil.rmtree(self._profile_root, ignore_errors=True)
+            self._profile_root = None
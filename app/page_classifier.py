@@ -0,0 +1,286 @@
+"""
+Clasificador de páginas de los PDFs maestros de estudios.
+
+Cada forma de separar un maestro (``"dni"``, ``"name"``, ``"espiros"``) es un
+juego de reglas declarativas (``PageRules``): uno o más formatos de página
+(``PageFormat``), cada uno con la marca que identifica el layout del
+proveedor y las reglas que extraen el DNI o el nombre del paciente, que se
+prueban en orden:
+
+- ``RegexKey``: grupo 1 de una regex precompilada,
+- ``LinesAfterMarker``: las líneas que siguen a una línea con una marca,
+- ``LabeledFields``: el valor que sigue a cada etiqueta (``Apellido``,
+  ``Nombre``...).
+
+``classify_pages`` recorre el documento una sola vez, con un solo texto
+extraído por página (la zona del encabezado si se indica, con la página
+completa como respaldo; ver ``app.page_text_cache``), y devuelve
+``(clave, formato)`` por página. El formato del documento se decide con las
+primeras páginas, cuyo texto se reutiliza para clasificarlas. Un layout nuevo
+de un proveedor se agrega como un ``PageFormat`` más en ``PAGE_RULES``, no
+como otra función de separación.
+"""
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import fitz
+
+from app.fuzzy_match import normalize_name
+from app.page_text_cache import Region, page_text
+
+# Cambiarla cuando cambian las reglas de ``PAGE_RULES``: invalida las
+# separaciones guardadas (ver ``app.split_manifest``).
+CLASSIFIER_VERSION = 1
+
+
+class RegexKey:
+    """Grupo 1 de la primera coincidencia de ``pattern``, pasado por
+    ``clean``. None si no hay coincidencia."""
+
+    def __init__(self, pattern: str, flags: int = 0, clean: Callable[[str], Optional[str]] = lambda value: value):
+        self.regex = re.compile(pattern, flags)
+        self.clean = clean
+
+    def extract(self, text: str, lines: List[str]) -> Optional[str]:
+        match = self.regex.search(text)
+        return self.clean(match.group(1)) if match else None
+
+
+class LinesAfterMarker:
+    """Las ``count`` líneas que siguen a la primera línea que contiene
+    ``marker`` (sin distinguir mayúsculas), combinadas por ``clean``. None si
+    no está la marca o no le siguen suficientes líneas."""
+
+    def __init__(self, marker: str, count: int, clean: Callable[[List[str]], Optional[str]]):
+        self.marker = marker.lower()
+        self.count = count
+        self.clean = clean
+
+    def extract(self, text: str, lines: List[str]) -> Optional[str]:
+        for i, line in enumerate(lines):
+            if self.marker in line.lower():
+                following = lines[i + 1:i + 1 + self.count]
+                if len(following) < self.count:
+                    return None
+                return self.clean([value.strip() for value in following])
+        return None
+
+
+class LabeledFields:
+    """El valor de cada una de ``labels``: la primera línea no vacía dentro
+    de las ``window`` siguientes a una línea que es exactamente la etiqueta
+    (sin distinguir mayúsculas). None si falta alguna; si no, los valores
+    combinados por ``clean``."""
+
+    def __init__(self, labels: Sequence[str], clean: Callable[[List[str]], Optional[str]], window: int = 5):
+        self.labels = [label.strip().lower() for label in labels]
+        self.clean = clean
+        self.window = window
+
+    def _value_after(self, lines: List[str], label: str) -> Optional[str]:
+        for i, line in enumerate(lines):
+            if line.strip().lower() == label:
+                for candidate in lines[i + 1:i + 1 + self.window]:
+                    if candidate.strip():
+                        return candidate.strip()
+        return None
+
+    def extract(self, text: str, lines: List[str]) -> Optional[str]:
+        values = []
+        for label in self.labels:
+            value = self._value_after(lines, label)
+            if not value:
+                return None
+            values.append(value)
+        return self.clean(values)
+
+
+class PageFormat:
+    """Layout de página de un proveedor: ``marker`` lo identifica (None = el
+    formato por defecto) y de ``rules`` gana la primera que encuentra algo."""
+
+    def __init__(self, name: str, rules: Sequence, marker: Optional[str] = None):
+        self.name = name
+        self.rules = list(rules)
+        self.marker = marker.lower() if marker else None
+
+    def value(self, text: str) -> Optional[str]:
+        lines = text.splitlines()
+        for rule in self.rules:
+            value = rule.extract(text, lines)
+            if value is not None:
+                return value
+        return None
+
+
+class PageRules:
+    """Reglas de una forma de separar maestros.
+
+    ``formats`` van en orden de detección (uno sin marca es el de por
+    defecto), ``to_key`` convierte el valor extraído en la clave del
+    paciente (el nombre, sin ``.pdf``, de su PDF separado) y
+    ``detect_pages`` es cuántas páginas del principio deciden el formato.
+    """
+
+    def __init__(self, method: str, formats: Sequence[PageFormat],
+                 to_key: Callable[[str], str] = lambda value: value, detect_pages: int = 3):
+        self.method = method
+        self.formats = {page_format.name: page_format for page_format in formats}
+        self._marked = [page_format for page_format in formats if page_format.marker]
+        self.default_format = next(page_format.name for page_format in formats if page_format.marker is None)
+        self.to_key = to_key
+        self.detect_pages = detect_pages
+
+    def detect_format(self, text: str) -> Optional[str]:
+        """Formato cuya marca aparece en ``text`` (None si ninguna)."""
+        lowered = text.lower()
+        for page_format in self._marked:
+            if page_format.marker in lowered:
+                return page_format.name
+        return None
+
+    def document_format(self, doc: "fitz.Document", texts: Optional[Dict[int, str]] = None) -> str:
+        """Formato de ``doc`` según sus primeras páginas. El texto completo de
+        las páginas leídas queda en ``texts`` para reutilizarlo."""
+        texts = {} if texts is None else texts
+        if self._marked:
+            for i in range(min(self.detect_pages, doc.page_count)):
+                texts[i] = page_text(doc[i])
+                detected = self.detect_format(texts[i])
+                if detected:
+                    return detected
+        return self.default_format
+
+    def value(self, text: str, format_name: Optional[str] = None) -> Optional[str]:
+        """DNI o nombre extraído de ``text`` con las reglas del formato."""
+        return self.formats[format_name or self.default_format].value(text)
+
+    def key(self, text: str, format_name: Optional[str] = None) -> Optional[str]:
+        """Clave del paciente en ``text`` (None si no se detectó)."""
+        value = self.value(text, format_name)
+        return self.to_key(value) if value else None
+
+
+def classify_pages(doc: "fitz.Document", method: str, start: int = 0, stop: Optional[int] = None,
+                   region: Optional[Region] = None,
+                   format_name: Optional[str] = None) -> List[Tuple[Optional[str], str]]:
+    """``(clave, formato)`` de cada página ``start:stop`` de ``doc`` con las
+    reglas ``PAGE_RULES[method]``, en una pasada.
+
+    Sin ``format_name`` el formato se detecta con las primeras páginas del
+    documento. Con ``region`` se lee solo esa zona de cada página y la
+    página completa únicamente si ahí no aparece la clave.
+    """
+    rules = PAGE_RULES.get(method)
+    if rules is None:
+        raise ValueError(f"Método de separación desconocido: {method}")
+    stop = doc.page_count if stop is None else min(stop, doc.page_count)
+    texts: Dict[int, str] = {}
+    if format_name is None:
+        format_name = rules.document_format(doc, texts)
+
+    classes = []
+    for i in range(start, stop):
+        if i in texts:
+            key = rules.key(texts[i], format_name)
+        else:
+            page = doc[i]
+            key = rules.key(page_text(page, region), format_name) if region is not None else None
+            if key is None:
+                key = rules.key(page_text(page), format_name)
+        classes.append((key, format_name))
+    return classes
+
+
+# --- Reglas ---------------------------------------------------------------
+
+def _without_dots(value: str) -> str:
+    return value.replace('.', '')
+
+
+def _name_cleaner(stop_words: str) -> Callable[[str], str]:
+    """Corta el nombre capturado donde aparece ``stop_words`` y normaliza
+    sus espacios."""
+    stop = re.compile(stop_words, re.IGNORECASE)
+
+    def clean(name: str) -> str:
+        name = stop.split(name)[0]
+        name = name.replace('\n', ' ').replace('\r', '').replace('\t', ' ')
+        name = re.sub(r'\s+', ' ', name)
+        return normalize_name(name)
+    return clean
+
+
+def _name_key(name: str) -> str:
+    #safe_name = name.replace(" ", "_")
+    return re.sub(r'[\n\r\t]', '', name).replace(" ", "_")
+
+
+def _old_espiro_name(lines: List[str]) -> str:
+    apellido, nombre = lines
+    raw_name = f"{apellido}_{nombre}".upper().replace(" ", "_")
+    return normalize_name(raw_name).replace(" ", "_")
+
+
+# Etiquetas vecinas del layout de espirometría nuevo. Cuando fitz extrae
+# texto, a veces concatena una etiqueta adyacente al valor (p. ej.
+# "Alan Gabriel Sexo") y hay que limpiarla del valor capturado.
+_NEW_ESPIRO_ADJACENT_LABELS = (
+    "sexo",
+    "edad",
+    "bmi",
+    "altura",
+    "peso",
+    "fecha de nacimiento",
+    "origen",
+)
+
+
+def _clean_new_espiro_value(value: str) -> str:
+    """Limpia etiquetas adyacentes que a veces quedan pegadas al valor."""
+    cleaned = value.strip()
+    lowered = cleaned.lower()
+    for label in _NEW_ESPIRO_ADJACENT_LABELS:
+        suffix = " " + label
+        if lowered.endswith(suffix):
+            cleaned = cleaned[: -len(suffix)].strip()
+            lowered = cleaned.lower()
+    return cleaned
+
+
+def _new_espiro_name(values: List[str]) -> Optional[str]:
+    apellido, nombre = (_clean_new_espiro_value(value) for value in values)
+    if not apellido or not nombre:
+        return None
+    combined = f"{apellido}_{nombre}".upper()
+    combined = re.sub(r"\s+", "_", combined).strip("_")
+    return combined or None
+
+
+PAGE_RULES: Dict[str, PageRules] = {
+    # LABORATORIO, AUDIOMETRIA, ERGOMETRIA
+    "dni": PageRules("dni", [
+        PageFormat("general", [
+            # "(DNI ...)", "( V 8289918 )"
+            RegexKey(r"\(\s*[A-Z]?\s*([0-9.]{6,15})\s*\)", clean=_without_dots),
+            # "DNI 36602956" o "DNI 29.432.074"
+            RegexKey(r"DNI[\s:]*([0-9.]{6,15})", clean=_without_dots),
+        ]),
+    ]),
+    # EEG y PSICOS
+    "name": PageRules("name", [
+        PageFormat("general", [
+            RegexKey(r"Nombre[s]?:\s*([A-ZÁÉÍÓÚÑ\s]+)", re.IGNORECASE, clean=_name_cleaner(r"\bFECHA\b")),
+            # PSICOTECNICO: "SR/A" seguido del nombre
+            RegexKey(r"SR/A\s+([A-ZÁÉÍÓÚÑ\s]+)", re.IGNORECASE,
+                     clean=_name_cleaner(r"\b(?:FECHA|TEST|EVALUADOS?)\b")),
+        ]),
+    ], to_key=_name_key),
+    # ESPIROMETRIA: el proveedor nuevo se reconoce por su título; el viejo
+    # tiene la leyenda "Grupo pacientes" seguida del apellido y el nombre.
+    "espiros": PageRules("espiros", [
+        PageFormat("new", [LabeledFields(["apellido", "nombre"], _new_espiro_name)],
+                   marker="resultados de espirometr"),
+        PageFormat("old", [LinesAfterMarker("grupo pacientes", 2, _old_espiro_name)]),
+    ], to_key=lambda name: name.replace(" ", "_")),
+}
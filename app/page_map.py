@@ -0,0 +1,148 @@
+"""
+Separación virtual de los PDFs maestros de estudios.
+
+Separar un maestro escribe un PDF por paciente (``split_pdf_by_dni``,
+``split_pdf_by_name``, ``split_espiros_by_name``) que después se vuelve a
+abrir al unir cada reporte. La separación virtual solo arma el mapa de
+páginas del maestro, ``{clave: [índices de página]}``, donde la clave es el
+nombre (sin ``.pdf``) que tendría el PDF separado. El mapa se guarda en
+``<fecha>/.page_maps/<ESTUDIO>.json`` junto con el tamaño y el mtime del
+maestro, la versión de las reglas de ``app.page_classifier`` y la zona del
+encabezado leída (la configurada en ``config/split_regions.json`` o la
+calibrada): mientras nada de eso cambie, las corridas siguientes y los
+procesos de ``build_all_reports(jobs=N)`` no vuelven a leer sus páginas.
+
+``ReportAssembler`` registra las claves como archivos virtuales de su
+``FolderIndex`` (la búsqueda de estudios no cambia) y al unir cada reporte
+inserta esas páginas directo desde el maestro abierto.
+"""
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import fitz
+
+from app.converters import Region, group_pages_by_dni, group_pages_by_name, group_espiro_pages_by_name
+from app.page_classifier import CLASSIFIER_VERSION
+from app.split_regions import load_split_regions, region_json
+
+
+PAGE_MAPS_DIRNAME = ".page_maps"
+
+# Cambiarla invalida todos los mapas guardados.
+PAGE_MAP_VERSION = 2
+
+# Cómo se agrupan las páginas de cada tipo de maestro.
+SPLIT_METHODS = {
+    "dni": group_pages_by_dni,
+    "name": group_pages_by_name,
+    "espiros": group_espiro_pages_by_name,
+}
+
+# REPORT_VIRTUAL_SPLIT=1 activa la separación virtual por defecto.
+VIRTUAL_SPLIT = os.environ.get("REPORT_VIRTUAL_SPLIT") == "1"
+
+
+def compute_page_map(master_pdf: Path, method: str, region: Optional[Region] = None) -> Dict[str, List[int]]:
+    """Mapa de páginas de ``master_pdf`` con el agrupamiento ``method``
+    (``"dni"``, ``"name"`` o ``"espiros"``), leyendo ``region`` de cada
+    página (ver ``app.split_regions``)."""
+    with fitz.open(master_pdf) as doc:
+        return SPLIT_METHODS[method](doc, region)
+
+
+def page_ranges(pages: List[int]) -> List[Tuple[int, int]]:
+    """Agrupa índices de página consecutivos en rangos ``(desde, hasta)``
+    para insertar cada rango con un solo ``insert_pdf``."""
+    ranges: List[Tuple[int, int]] = []
+    for page in pages:
+        if ranges and page == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], page)
+        else:
+            ranges.append((page, page))
+    return ranges
+
+
+class PageMapStore:
+    """Mapas de páginas de los maestros de una fecha, uno por estudio."""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+
+    def _path_for(self, study: str) -> Path:
+        return self.directory / f"{study}.json"
+
+    @staticmethod
+    def _master_stat(master_pdf: Path) -> Optional[Tuple[int, int]]:
+        try:
+            stat = Path(master_pdf).stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _is_current(self, entry: Dict, regions: Dict[str, Optional[Region]]) -> bool:
+        """True si el maestro de ``entry``, las reglas de clasificación y la
+        zona configurada del estudio (de ``regions``) siguen igual que
+        cuando se mapeó."""
+        return entry.get("version") == PAGE_MAP_VERSION \
+            and entry.get("classifier_version") == CLASSIFIER_VERSION \
+            and entry.get("region_config") == region_json(regions.get(entry["study"].upper())) \
+            and self._master_stat(Path(entry["master"])) == (entry["size"], entry["mtime_ns"])
+
+    def _read(self, path: Path) -> Optional[Dict]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def get(self, study: str, master_pdf: Path, method: str,
+            regions: Optional[Dict[str, Optional[Region]]] = None) -> Optional[Dict]:
+        """Mapa guardado de ``study`` si corresponde a ``master_pdf`` sin
+        cambios, al mismo ``method`` y a las mismas reglas y zona configurada
+        (``regions``, por defecto ``load_split_regions()``); si no, None."""
+        entry = self._read(self._path_for(study))
+        if entry is None or entry.get("master") != str(master_pdf) or entry.get("method") != method:
+            return None
+        return entry if self._is_current(entry, load_split_regions() if regions is None else regions) else None
+
+    def save(self, study: str, master_pdf: Path, method: str, study_dir: Path,
+             pages: Dict[str, List[int]], region: Optional[Region] = None,
+             regions: Optional[Dict[str, Optional[Region]]] = None) -> Dict:
+        """Guarda el mapa de ``study``, armado leyendo ``region`` de cada
+        página, (escritura atómica) y lo retorna."""
+        size, mtime_ns = self._master_stat(master_pdf)
+        regions = load_split_regions() if regions is None else regions
+        entry = {
+            "version": PAGE_MAP_VERSION,
+            "classifier_version": CLASSIFIER_VERSION,
+            "region_config": region_json(regions.get(study.upper())),
+            "region": region_json(region),
+            "study": study,
+            "master": str(master_pdf),
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "method": method,
+            "study_dir": str(study_dir),
+            "pages": pages,
+        }
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_name, self._path_for(study))
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        return entry
+
+    def load_all(self, regions: Optional[Dict[str, Optional[Region]]] = None) -> List[Dict]:
+        """Mapas guardados vigentes (ver ``get``), por estudio."""
+        if not self.directory.is_dir():
+            return []
+        regions = load_split_regions() if regions is None else regions
+        entries = [self._read(path) for path in sorted(self.directory.glob("*.json"))]
+        return [entry for entry in entries if entry is not None and self._is_current(entry, regions)]
@@ -0,0 +1,206 @@
+"""
+Caché persistente del texto extraído de cada página de los PDFs.
+
+La misma página se lee al separar el maestro (``app.page_classifier``), al
+analizar el laboratorio del paciente (``LaboratoryPDFExtractor``) y de nuevo
+en cada análisis por lote. El texto se guarda en una base SQLite
+(``OUTPUT/.cache/page_text.sqlite``) con clave SHA-256 del PDF + índice de
+página + modo de extracción (la página completa o una zona, ver
+``app.split_regions``), así volver a analizar los laboratorios después de
+cambiar los rangos no vuelve a extraer texto con fitz. Las palabras con sus
+coordenadas (``page_words``, para reconstruir las filas de las tablas de
+laboratorio) se guardan igual, en el modo ``"words"``.
+
+Al separar un maestro, el texto de sus páginas se copia a los PDFs por
+paciente que genera (``seed_pages``): ``insert_pdf`` copia las páginas tal
+cual y su texto es el mismo.
+
+El tamaño total está acotado: al superar ``max_bytes`` se borran las páginas
+usadas hace más tiempo. ``REPORT_PAGE_TEXT_CACHE=0`` desactiva el caché y
+``REPORT_PAGE_TEXT_CACHE_PATH`` cambia la ruta de la base.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import fitz
+
+from app.build_manifest import file_sha256
+
+
+PAGE_TEXT_CACHE_PATH = Path(__file__).resolve().parent.parent / "OUTPUT" / ".cache" / "page_text.sqlite"
+
+DEFAULT_CACHE_MAX_BYTES = 100 * 1024 * 1024
+
+# Cada cuántas escrituras se revisa el tamaño total.
+EVICTION_CHECK_EVERY = 100
+
+# Zona de la página como fracciones de su ancho y alto: (x0, y0, x1, y1).
+Region = Tuple[float, float, float, float]
+
+# Palabra de una página: (x0, y0, x1, y1, texto), en puntos.
+Word = Tuple[float, float, float, float, str]
+
+# (ruta, tamaño, mtime) -> SHA-256 de los PDFs ya hasheados en este proceso.
+_document_keys: Dict[Tuple[str, int, int], str] = {}
+
+
+def document_key(pdf_path: Path) -> str:
+    """SHA-256 de ``pdf_path``, calculado una vez por versión del archivo."""
+    stat = os.stat(pdf_path)
+    cache_key = (str(pdf_path), stat.st_size, stat.st_mtime_ns)
+    key = _document_keys.get(cache_key)
+    if key is None:
+        key = _document_keys[cache_key] = file_sha256(Path(pdf_path))
+    return key
+
+
+def text_mode(region: Optional[Region] = None) -> str:
+    """Modo de extracción: ``"text"`` (página completa) o la zona."""
+    if region is None:
+        return "text"
+    return "text@" + ",".join(f"{value:g}" for value in region)
+
+
+class PageTextCache:
+    """Texto de páginas de PDF por (SHA-256 del PDF, página, modo)."""
+
+    def __init__(self, path: Path = PAGE_TEXT_CACHE_PATH, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Una conexión por hilo: sqlite3 no las comparte entre hilos.
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " doc TEXT NOT NULL, page INTEGER NOT NULL, mode TEXT NOT NULL,"
+                " text TEXT NOT NULL, size INTEGER NOT NULL, used_at REAL NOT NULL,"
+                " PRIMARY KEY (doc, page, mode))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS pages_used_at ON pages (used_at)")
+            self._local.connection = connection
+        return connection
+
+    def get(self, doc_key: str, page: int, mode: str = "text") -> Optional[str]:
+        """Texto cacheado (y lo marca como recién usado) o None."""
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT text FROM pages WHERE doc = ? AND page = ? AND mode = ?", (doc_key, page, mode)
+        ).fetchone()
+        if row is None:
+            return None
+        with connection:
+            connection.execute(
+                "UPDATE pages SET used_at = ? WHERE doc = ? AND page = ? AND mode = ?",
+                (time.time(), doc_key, page, mode),
+            )
+        return row[0]
+
+    def put(self, doc_key: str, page: int, mode: str, text: str):
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                (doc_key, page, mode, text, len(text.encode("utf-8")), time.time()),
+            )
+        self._writes += 1
+        if self._writes % EVICTION_CHECK_EVERY == 0:
+            self.evict()
+
+    def seed_pages(self, source_key: str, pages: List[int], target_key: str):
+        """Copia el texto completo de ``pages`` del PDF ``source_key`` a las
+        páginas 0, 1, ... del PDF ``target_key`` (un PDF separado de él)."""
+        with self._connection() as connection:
+            for target_page, source_page in enumerate(pages):
+                connection.execute(
+                    "INSERT OR REPLACE INTO pages"
+                    " SELECT ?, ?, mode, text, size, ? FROM pages"
+                    " WHERE doc = ? AND page = ? AND mode = 'text'",
+                    (target_key, target_page, time.time(), source_key, source_page),
+                )
+
+    def evict(self):
+        """Borra las páginas usadas hace más tiempo hasta quedar por debajo
+        de ``max_bytes``."""
+        with self._connection() as connection:
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            stale = []
+            for rowid, size in connection.execute("SELECT rowid, size FROM pages ORDER BY used_at"):
+                if total <= self.max_bytes:
+                    break
+                stale.append((rowid,))
+                total -= size
+            connection.executemany("DELETE FROM pages WHERE rowid = ?", stale)
+
+
+_default_cache: Optional[PageTextCache] = None
+
+
+def default_page_text_cache() -> Optional[PageTextCache]:
+    """Caché compartido del proceso (None si ``REPORT_PAGE_TEXT_CACHE=0``),
+    en ``REPORT_PAGE_TEXT_CACHE_PATH`` o, si no está definida, en
+    ``PAGE_TEXT_CACHE_PATH``."""
+    global _default_cache
+    if os.environ.get("REPORT_PAGE_TEXT_CACHE") == "0":
+        return None
+    if _default_cache is None:
+        _default_cache = PageTextCache(Path(os.environ.get("REPORT_PAGE_TEXT_CACHE_PATH") or PAGE_TEXT_CACHE_PATH))
+    return _default_cache
+
+
+def _extract(page: "fitz.Page", region: Optional[Region]) -> str:
+    if region is None:
+        return page.get_text()
+    rect = page.rect
+    x0, y0, x1, y1 = region
+    clip = fitz.Rect(
+        rect.x0 + x0 * rect.width, rect.y0 + y0 * rect.height,
+        rect.x0 + x1 * rect.width, rect.y0 + y1 * rect.height,
+    )
+    return page.get_text(clip=clip)
+
+
+def _cached(page: "fitz.Page", mode: str, extract: Callable[[], str],
+            cache: Optional[PageTextCache]) -> str:
+    """``extract()`` de ``page`` a través de ``cache`` (por defecto,
+    ``default_page_text_cache()``), solo para PDFs abiertos desde un archivo
+    y sin modificar."""
+    cache = cache or default_page_text_cache()
+    doc = page.parent
+    if cache is None or not doc.name or doc.is_dirty or not os.path.isfile(doc.name):
+        return extract()
+    doc_key = document_key(Path(doc.name))
+    text = cache.get(doc_key, page.number, mode)
+    if text is None:
+        text = extract()
+        cache.put(doc_key, page.number, mode, text)
+    return text
+
+
+def page_text(page: "fitz.Page", region: Optional[Region] = None,
+              cache: Optional[PageTextCache] = None) -> str:
+    """Texto de ``page``, solo el de ``region`` si se indica (cacheado, ver
+    ``_cached``)."""
+    return _cached(page, text_mode(region), lambda: _extract(page, region), cache)
+
+
+def page_words(page: "fitz.Page", cache: Optional[PageTextCache] = None) -> List[Word]:
+    """Palabras de ``page`` con su rectángulo (``get_text("words")``), en el
+    orden de fitz (cacheadas, ver ``_cached``)."""
+    def extract() -> str:
+        words = [[x0, y0, x1, y1, text] for x0, y0, x1, y1, text, *_ in page.get_text("words")]
+        return json.dumps(words, ensure_ascii=False)
+    return [tuple(word) for word in json.loads(_cached(page, "words", extract, cache))]
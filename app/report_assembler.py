@@ -1,12 +1,40 @@
 import pandas as pd
 import fitz
+import contextlib
+import io
+import multiprocessing
+import os
 import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from PIL import Image
 from PIL import ImageOps
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
-from app.converters import convert_xlsx_to_pdf, split_pdf_by_dni
+from typing import List, Dict, Optional, Set, Tuple
+from app.converters import (
+    convert_xlsx_to_pdf,
+    convert_xlsx_batch_to_pdf,
+    group_page_keys,
+    page_keys,
+)
+from app.libreoffice_pool import LibreOfficePool, DEFAULT_POOL_SIZE
+from app.caratula_renderer import CaratulaRenderError, render_caratula_to_pdf
+from app.caratula_cache import CaratulaCache
+from app.folder_index import FolderIndex
+from app.build_manifest import BuildManifest, row_fingerprint
+from app.run_journal import RunJournal, JOURNAL_NAME, RUN_MODES, DONE, FAILED
+from app.report_pipeline import StagePipeline, DEFAULT_QUEUE_SIZE
+from app.study_planner import plan_studies
+from app.page_map import PageMapStore, PAGE_MAPS_DIRNAME, VIRTUAL_SPLIT, compute_page_map, page_ranges
+from app.split_regions import split_region
+from app.split_manifest import SplitManifestStore, SPLIT_MANIFESTS_DIRNAME, missing_outputs, write_split
 from app.fuzzy_match import (
+    FuzzyCandidateIndex,
+    assign_best_matches,
     normalize_name,
     fuzzy_find_best_match,
     _extract_name_from_ecg_stem,
@@ -19,6 +47,37 @@ from app.fuzzy_match import (
 # no generar paths raros en Windows / mounts de red).
 _INVALID_FILENAME_CHARS_RE = re.compile(r'[\\/:*?"<>|\r\n\t]+')
 
+# Cantidad de carátulas por invocación de LibreOffice en la conversión por lotes.
+CARATULA_BATCH_SIZE = 20
+
+# Estudios cuyo PDF maestro se separa por paciente la primera vez que se
+# buscan (ver ``_ensure_study_split``).
+_LAZY_SPLIT_STUDIES = ("EEG", "PSICOS", "ESPIROMETRIA", "ERGOMETRIA")
+
+# Estudios cuyos archivos se buscan por nombre del paciente y que
+# ``prepare_name_assignments`` asigna de una sola pasada para toda la tanda.
+_NAME_MATCHED_STUDIES = ("ECG", "EEG", "PSICOS", "ESPIROMETRIA", "ERGOMETRIA")
+
+# Estudios que separa "Discriminar estudios por paciente" y cómo se agrupan
+# las páginas de su PDF maestro (ver ``preprocess_all_studies``).
+PREPROCESS_STUDIES = (
+    ("LABORATORIO", "dni"),
+    ("AUDIOMETRIA", "dni"),
+    ("ERGOMETRIA", "dni"),
+    ("EEG", "name"),
+    ("PSICOS", "name"),
+    ("ESPIROMETRIA", "espiros"),
+)
+
+# Tramo de páginas de un PDF maestro que extrae cada tarea de
+# ``preprocess_all_studies``: los maestros más grandes se reparten entre
+# varios procesos.
+SPLIT_SHARD_PAGES = 200
+
+# PyMuPDF no admite usar documentos desde varios hilos a la vez: todo uso de
+# fitz que pueda correr dentro del pipeline de build_all_reports lo toma.
+FITZ_LOCK = threading.RLock()
+
 
 def _sanitize_filename_component(value: str) -> str:
     """Normaliza un componente de nombre de archivo quitando separadores
@@ -49,7 +108,297 @@ class ReportAssembler:
         self.shared_pdfs = self._index_shared_pdfs()
         self.per_patient_dirs = ['ECG', 'RX']
         self.study_map = self._define_study_map()
-        
+        # Estadísticas por etapa del último build_all_reports en pipeline.
+        self.last_pipeline_stats: List[Dict] = []
+        # Reportes generados y omitidos (sin cambios) desde el último reset.
+        self.report_counts: Dict[str, int] = {"generados": 0, "omitidos": 0, "fallidos": 0}
+        # Pool de LibreOffice activo durante build_all_reports (None fuera de una corrida)
+        self._libreoffice_pool: Optional[LibreOfficePool] = None
+        # Carátulas convertidas por lotes en la corrida actual: xlsx -> futuro
+        # con el dict {xlsx: pdf} del lote al que pertenece.
+        self._prepared_caratulas: Dict[Path, Future] = {}
+        # Caché persistente de carátulas convertidas (None = desactivado,
+        # cada corrida vuelve a convertir todas las carátulas).
+        self.caratula_cache: Optional[CaratulaCache] = CaratulaCache()
+        # Perfil de LibreOffice para las conversiones directas (None = el
+        # perfil del usuario). Los procesos de build_all_reports(jobs=N)
+        # usan uno propio cada uno para poder convertir a la vez.
+        self._libreoffice_profile: Optional[Path] = None
+        # Índice en memoria de ``base_path`` para buscar los estudios sin
+        # volver a listar el disco por cada paciente. Se arma la primera vez
+        # que se usa y se rehace al inicio de cada build_all_reports.
+        self._folder_index: Optional[FolderIndex] = None
+        # Candidatos de fuzzy matching ya normalizados, por conjunto de
+        # archivos (ver ``_fuzzy_candidates``).
+        self._fuzzy_indexes: Dict[Tuple, FuzzyCandidateIndex] = {}
+        # True = comparar siempre contra todos los candidatos (sin
+        # preselección por n-gramas); None = según REPORT_FUZZY_EXACT.
+        self.fuzzy_exact: Optional[bool] = None
+        # Asignación archivo -> paciente de la tanda por estudio:
+        # {estudio: {(dni, apellido, nombre): Path}} (ver
+        # ``prepare_name_assignments``). Sin entrada para un estudio, cada
+        # paciente hace su propio fuzzy matching.
+        self._name_assignments: Dict[str, Dict[Tuple[str, str, str], Path]] = {}
+        # Plan vectorizado de estudios de la corrida: {índice de paciente:
+        # filas del plan} (ver ``plan_all_studies``). None = cada paciente
+        # resuelve sus estudios con ``resolve_required_studies``.
+        self._study_plan: Optional[Dict[int, List[Dict]]] = None
+        # True = separar los PDFs maestros solo como mapas de páginas, sin
+        # escribir un PDF por paciente (ver ``app.page_map``).
+        self.virtual_split: bool = VIRTUAL_SPLIT
+        # PDFs por paciente de la separación virtual: ruta virtual ->
+        # (PDF maestro, índices de página).
+        self._virtual_pages: Dict[Path, Tuple[Path, List[int]]] = {}
+        # PDFs maestros abiertos para insertar sus páginas en los reportes.
+        self._master_docs: Dict[Path, fitz.Document] = {}
+        # Estudios de ``_LAZY_SPLIT_STUDIES`` cuya separación ya se verificó
+        # contra su manifiesto en esta corrida.
+        self._checked_splits: Set[str] = set()
+
+    def folder_index(self) -> FolderIndex:
+        """Índice de archivos de ``base_path`` (ver ``FolderIndex``). Con
+        ``virtual_split`` incluye los PDFs virtuales de los mapas de páginas
+        guardados de la fecha."""
+        if self._folder_index is None:
+            self._folder_index = FolderIndex(self.base_path)
+            if self.virtual_split:
+                for entry in PageMapStore(self.fecha_folder / PAGE_MAPS_DIRNAME).load_all():
+                    self._register_page_map(entry)
+        return self._folder_index
+
+    def refresh_folder_index(self):
+        """Vuelve a escanear ``base_path``; llamarlo si cambiaron archivos
+        de la fecha fuera de este ``ReportAssembler``."""
+        self.close_master_documents()
+        self._virtual_pages = {}
+        self._checked_splits = set()
+        self._folder_index = None
+        self._fuzzy_indexes = {}
+        self.folder_index()
+
+    def _register_page_map(self, entry: Dict):
+        """Registra un mapa de páginas de ``PageMapStore``: cada clave pasa a
+        ser un PDF virtual de la carpeta del estudio."""
+        study_dir = Path(entry["study_dir"])
+        master = Path(entry["master"])
+        self._virtual_pages = {path: pages for path, pages in self._virtual_pages.items()
+                               if path.parent != study_dir}
+        for key, pages in entry["pages"].items():
+            self._virtual_pages[study_dir / f"{key}.pdf"] = (master, pages)
+        self.folder_index().set_virtual_files(study_dir, [f"{key}.pdf" for key in entry["pages"]])
+
+    def _master_document(self, master: Path) -> fitz.Document:
+        """PDF maestro abierto, reutilizado entre reportes hasta
+        ``close_master_documents``. Llamar con ``FITZ_LOCK`` tomado."""
+        doc = self._master_docs.get(master)
+        if doc is None:
+            doc = fitz.open(master)
+            self._master_docs[master] = doc
+        return doc
+
+    def close_master_documents(self):
+        with FITZ_LOCK:
+            for doc in self._master_docs.values():
+                doc.close()
+            self._master_docs = {}
+
+    def _fuzzy_candidates(self, paths: List[Path],
+                          extract_name=None) -> FuzzyCandidateIndex:
+        """``FuzzyCandidateIndex`` de ``paths``, reutilizado entre pacientes
+        mientras el conjunto de archivos no cambie."""
+        key = (extract_name, self.fuzzy_exact, tuple(paths))
+        candidates = self._fuzzy_indexes.get(key)
+        if candidates is None:
+            candidates = FuzzyCandidateIndex(paths, extract_name, exact=self.fuzzy_exact)
+            self._fuzzy_indexes[key] = candidates
+        return candidates
+
+    def _name_match_spec(self, study: str, apellido: str,
+                         nombre: str) -> Optional[Tuple[FuzzyCandidateIndex, str, float, bool]]:
+        """Candidatos, nombre objetivo, umbral y si el umbral es estricto del
+        fuzzy matching de ``study`` para un paciente, los mismos que usan los
+        fallbacks de ``resolve_required_studies``. None si el estudio no
+        tiene carpeta de archivos por nombre."""
+        index = self.folder_index()
+        primer_apellido = apellido.replace("_", " ").strip().split()[0].upper()
+        primer_nombre = nombre.strip().split()[0]
+        full_name = f"{apellido.replace('_', ' ').strip()} {nombre.strip()}"
+
+        if study == "ECG":
+            ecg_dirs = index.glob(self.fecha_folder.parent, "ECG*")
+            if not ecg_dirs:
+                return None
+            candidates = self._fuzzy_candidates(index.glob(ecg_dirs[0], "*.pdf"), _extract_name_from_ecg_stem)
+            return candidates, f"{primer_apellido} {primer_nombre.upper()}", 0.75, False
+        if study == "EEG":
+            paths = index.glob(self.fecha_folder / "EEG", "*.pdf") \
+                + index.glob(self.base_path / f"EEG {self.base_path.name}", "*.pdf")
+            return self._fuzzy_candidates(paths), full_name, 0.75, False
+        if study == "PSICOS":
+            paths = index.glob(self.fecha_folder / "PSICOS", "*.pdf")
+            return self._fuzzy_candidates(paths), full_name.upper(), 0.80, False
+        if study == "ESPIROMETRIA":
+            paths = index.glob(self.fecha_folder / "ESPIROMETRIA", "*.pdf")
+            return self._fuzzy_candidates(paths), f"{apellido.strip().split('_')[0]} {primer_nombre}", 0.75, False
+        if study == "ERGOMETRIA":
+            root = self._find_master_dir("ERGOS", "ERGO", "ERGOMETRIAS", "ERGOMETRIA")
+            if root is None:
+                return None
+            paths = sorted(index.glob(root, "*.pdf") + index.glob(root, "*.PDF"))
+            candidates = self._fuzzy_candidates(paths, _extract_name_from_ergo_stem)
+            return candidates, normalize_name(f"{apellido} {nombre}"), 0.75, True
+        return None
+
+    def prepare_name_assignments(self) -> List[str]:
+        """Asigna de una sola pasada los archivos por nombre (ECG, EEG,
+        PSICOS, ESPIROMETRIA y la carpeta de ERGOS) a los pacientes de la
+        fecha con ``assign_best_matches``: cada archivo queda para un solo
+        paciente, el de mejor score. Los fallbacks de fuzzy matching de
+        ``resolve_required_studies`` usan después esa asignación en vez de
+        buscar cada paciente por su cuenta.
+
+        Retorna los warnings de la asignación (empates ambiguos y archivos
+        que no quedaron asignados a nadie)."""
+        # Mismos dni/apellido/nombre con los que plan_patient_report llama a
+        # resolve_required_studies: son la clave de la asignación.
+        patients = []
+        for _, row in self.df_master.iterrows():
+            apellido = str(row['APELLIDOS']).strip().replace(" ", "_")
+            nombre = row['NOMBRES']
+            if not apellido or not isinstance(nombre, str) or not nombre.strip():
+                continue
+            dni = str(row['DNI']).strip().replace(".", "")
+            tokens = [t.strip() for t in row["DETALLE"].upper().replace(",", "").split("+")]
+            studies = {study.upper() for token in tokens for study in self.study_map.get(token, [])}
+            patients.append(((dni, apellido, nombre), studies))
+
+        warnings: List[str] = []
+        self._name_assignments = {}
+        for study in _NAME_MATCHED_STUDIES:
+            targets: Dict[Tuple[str, str, str], str] = {}
+            spec = None
+            for key, studies in patients:
+                if study not in studies:
+                    continue
+                spec = self._name_match_spec(study, key[1], key[2])
+                if spec is None:
+                    break
+                targets[key] = spec[1]
+            if spec is None or not targets:
+                continue
+
+            candidates, _, threshold, strict = spec
+            assignment, study_warnings = assign_best_matches(targets, candidates, threshold, strict)
+            self._name_assignments[study] = {key: path for key, (path, _) in assignment.items()}
+            print(f"🧩 {study}: {len(assignment)} de {len(targets)} pacientes con archivo asignado por nombre")
+            warnings.extend(f"{study}: {warning}" for warning in study_warnings)
+        return warnings
+
+    def plan_all_studies(self) -> pd.DataFrame:
+        """Arma en una pasada el plan de estudios de todos los pacientes (ver
+        ``app.study_planner.plan_studies``) y lo deja en uso para
+        ``plan_patient_report``. Retorna la tabla larga paciente × estudio."""
+        plan = plan_studies(self.df_master, self.study_map, self.folder_index(),
+                            self.base_path, self.fecha_folder)
+        self._study_plan = {idx: rows.to_dict("records") for idx, rows in plan.groupby("idx", sort=False)}
+        print(
+            f"🗺️ Plan de estudios: {len(plan)} estudios de {plan['idx'].nunique()} pacientes, "
+            f"{int(plan['resolved'].sum())} resueltos por cruce directo"
+        )
+        return plan
+
+    def _sources_from_study_plan(self, index: int, work_dir: Path) -> List[Dict]:
+        """Estudios del paciente ``index`` a partir del plan de la corrida, en
+        el formato de ``resolve_required_studies``. Las filas que el plan no
+        resolvió se buscan con ``_resolve_study``."""
+        sources = []
+        for row in self._study_plan.get(index, []):
+            sources.extend(self._sources_for_plan_row(row, work_dir))
+        return sources
+
+    def _sources_for_plan_row(self, row: Dict, work_dir: Path) -> List[Dict]:
+        if not row["resolved"]:
+            return self._resolve_study(row["study"], row["dni"], row["apellido"], row["nombre"], work_dir)
+        output_name = row["output_name"]
+        source = {"kind": row["kind"],
+                  "path": work_dir / output_name if isinstance(output_name, str) else row["path"]}
+        if isinstance(row["inputs"], list):
+            source["inputs"] = list(row["inputs"])
+        print(f"✅ {row['study']} (plan): {(source.get('inputs') or [source['path']])[0].name}")
+        return [source]
+
+    def plan_reports(self, indices: Optional[List[int]] = None) -> pd.DataFrame:
+        """Modo solo plan: resuelve los estudios de los pacientes sin
+        convertir carátulas, reescalar audiometrías, convertir imágenes ni
+        unir PDFs, para saber antes de compilar a quién le faltan estudios.
+
+        Hace lo mismo que la etapa de descubrimiento de ``build_all_reports``
+        (asignación por nombre y plan de estudios), pero los PDFs maestros no
+        se separan: se mapean sus páginas como con ``virtual_split`` (ver
+        ``app.page_map``), así que no se escribe ningún PDF, solo el mapa de
+        páginas de cada maestro. Retorna una fila por paciente con los
+        estudios esperados, encontrados y faltantes, y si tiene carátula.
+        ``faltantes`` es la misma cuenta que genera el warning de estudios
+        faltantes al compilar.
+        """
+        virtual_split, self.virtual_split = self.virtual_split, True
+        # Los PDFs a generar solo llevan un path de destino.
+        work_dir = Path(tempfile.gettempdir())
+        try:
+            self.refresh_folder_index()
+            self.prepare_study_splits()
+            self.prepare_name_assignments()
+            study_plan = self.plan_all_studies()
+            rows = []
+            for index in (range(len(self.df_master)) if indices is None else indices):
+                patient = self.df_master.iloc[index]
+                found, missing = 0, []
+                for row in self._study_plan.get(index, []):
+                    sources = self._sources_for_plan_row(row, work_dir)
+                    found += len(sources)
+                    if not sources:
+                        missing.append(row["study"])
+                try:
+                    self.get_patient_cover(patient)
+                    caratula = True
+                except (FileNotFoundError, ValueError):
+                    caratula = False
+                expected = int((study_plan["idx"] == index).sum())
+                rows.append({
+                    "indice": index,
+                    "paciente": f"{str(patient['APELLIDOS']).strip()} {str(patient['NOMBRES']).strip()}",
+                    "dni": str(patient["DNI"]).strip().replace(".", ""),
+                    "detalle": patient["DETALLE"],
+                    "esperados": expected,
+                    "encontrados": found,
+                    "faltantes": max(0, expected - found),
+                    "estudios_faltantes": ", ".join(missing),
+                    "caratula": caratula,
+                })
+        finally:
+            self._name_assignments = {}
+            self._study_plan = None
+            self.virtual_split = virtual_split
+            if not virtual_split:
+                # Sin los PDFs virtuales del plan: la compilación separa los
+                # maestros como siempre.
+                self.refresh_folder_index()
+        report = pd.DataFrame(rows)
+        if not report.empty:
+            print(
+                f"🗺️ Plan: {int((report['faltantes'] > 0).sum())} de {len(report)} pacientes con estudios "
+                f"faltantes, {int((~report['caratula']).sum())} sin carátula"
+            )
+        return report
+
+    def _assigned_name_match(self, study: str, dni: Optional[str], apellido: str,
+                             nombre: str) -> Tuple[bool, Optional[Path]]:
+        """Retorna si hay asignación de la tanda para ``study`` y el archivo
+        asignado al paciente (None si no le tocó ninguno)."""
+        assignments = self._name_assignments.get(study)
+        if assignments is None:
+            return False, None
+        return True, assignments.get((dni, apellido, nombre))
 
     def _find_fecha_folder(self) -> Path:
         subdirs = [d for d in self.base_path.iterdir() if d.is_dir()]
@@ -90,7 +439,7 @@ class ReportAssembler:
         (``ERGOMETRIA 30-03-2026.pdf``) y nuevas (``ERGOMETRIAS 30-03-26.pdf``).
         """
         prefixes_upper = [p.upper() for p in prefixes]
-        for f in sorted(self.base_path.glob("*.pdf")):
+        for f in self.folder_index().glob(self.base_path, "*.pdf"):
             stem_upper = f.stem.upper()
             for prefix in prefixes_upper:
                 if stem_upper == prefix or stem_upper.startswith(prefix + " ") \
@@ -106,9 +455,7 @@ class ReportAssembler:
         independiente de la variante exacta del prefijo o separador.
         """
         prefixes_upper = [p.upper() for p in prefixes]
-        for f in sorted(self.base_path.iterdir()):
-            if not f.is_dir():
-                continue
+        for f in self.folder_index().dirs(self.base_path):
             name_upper = f.name.upper()
             for prefix in prefixes_upper:
                 if name_upper == prefix or name_upper.startswith(prefix + " ") \
@@ -133,585 +480,960 @@ class ReportAssembler:
         else:
             raise FileNotFoundError(f"Missing carátula file: {path}")
 
+    def _convert_caratula(self, caratula_xlsx: Path, caratula_pdf: Path,
+                          renderer: str = "libreoffice"):
+        """Convierte la carátula a PDF. Con ``renderer="native"`` se dibuja
+        en proceso y solo se recurre a LibreOffice si la hoja usa algo que el
+        renderer nativo no soporta. LibreOffice se usa a través del pool si
+        hay uno activo, o con una invocación directa en caso contrario."""
+        if renderer == "native":
+            try:
+                with FITZ_LOCK:
+                    render_caratula_to_pdf(caratula_xlsx, caratula_pdf)
+                return
+            except CaratulaRenderError as e:
+                print(f"↩️ Carátula {caratula_xlsx.name} no soportada por el renderer nativo ({e}); se usa LibreOffice")
+
+        if self._libreoffice_pool is not None:
+            self._libreoffice_pool.convert(caratula_xlsx, caratula_pdf)
+        else:
+            convert_xlsx_to_pdf(caratula_xlsx, caratula_pdf, profile_dir=self._libreoffice_profile)
+
+    def _caratula_pdf_for(self, index: int, caratula_xlsx: Path, work_dir: Path,
+                          renderer: str = "libreoffice") -> Path:
+        """Retorna el PDF de la carátula del paciente. Primero se busca en el
+        caché de carátulas; si no está, se usa la conversión de
+        ``prepare_caratulas`` o se convierte en ``work_dir``, y el resultado
+        se guarda en el caché.
+
+        Nunca se retorna la ruta dentro del caché: otra corrida podría
+        desalojarla antes del merge del paciente. Un acierto se saca a
+        ``work_dir`` y, si hubo que convertir, se usa el PDF convertido."""
+        cache_key = None
+        if self.caratula_cache is not None:
+            cache_key = self.caratula_cache.key_for(caratula_xlsx, renderer)
+            cached = self.caratula_cache.checkout(cache_key, work_dir / f"caratula_{index}.pdf")
+            if cached is not None:
+                print(f"♻️ Carátula reutilizada del caché: {caratula_xlsx.name}")
+                return cached
+
+        prepared = self._prepared_caratulas.get(caratula_xlsx)
+        if prepared is not None:
+            try:
+                pdf = prepared.result().get(caratula_xlsx)
+            except Exception as e:
+                print(f"⚠️ Falló la conversión por lotes de carátulas: {e}")
+                pdf = None
+            if pdf is not None and pdf.exists():
+                print(f"📄 Carátula convertida por lotes: {pdf.name}")
+                # El directorio del lote vive hasta el final de la corrida.
+                if cache_key is not None:
+                    self.caratula_cache.put(cache_key, pdf)
+                return pdf
+            print(f"⚠️ {caratula_xlsx.name} no se convirtió en el lote; se convierte individualmente")
+
+        caratula_pdf = work_dir / f"caratula_tmp_{index}.pdf"
+        self._convert_caratula(caratula_xlsx, caratula_pdf, renderer)
+        if cache_key is not None:
+            self.caratula_cache.put(cache_key, caratula_pdf)
+        return caratula_pdf
+
+    def prepare_caratulas(self, executor: ThreadPoolExecutor, cache_dir: Path,
+                          batch_size: int = CARATULA_BATCH_SIZE,
+                          indices: Optional[List[int]] = None) -> int:
+        """Encola la conversión por lotes de las carátulas de la fecha (o solo
+        las de los pacientes en ``indices``).
+
+        Los lotes corren en ``executor`` (en segundo plano, en orden de
+        paciente) mientras el loop principal avanza con la búsqueda de
+        estudios; ``build_report_for_patient`` espera solo el lote de su
+        carátula. Las carátulas que ya están en el caché no se encolan.
+        Retorna la cantidad de carátulas encoladas.
+        """
+        caratulas: List[Path] = []
+        rows = self.df_master if indices is None else self.df_master.iloc[indices]
+        for _, row in rows.iterrows():
+            try:
+                xlsx = self.get_patient_cover(row)
+            except (FileNotFoundError, ValueError, KeyError):
+                # Se reporta al construir el paciente, como hasta ahora.
+                continue
+            if xlsx in caratulas:
+                continue
+            if self.caratula_cache is not None and \
+                    self.caratula_cache.get(self.caratula_cache.key_for(xlsx, "libreoffice")) is not None:
+                continue
+            caratulas.append(xlsx)
+
+        # Perfil aislado: el lote puede correr a la vez que conversiones
+        # individuales (pool o fallback) que usan otros perfiles.
+        profile_dir = cache_dir / "lo_profile"
+        for start in range(0, len(caratulas), batch_size):
+            batch = caratulas[start:start + batch_size]
+            future = executor.submit(convert_xlsx_batch_to_pdf, batch, cache_dir, profile_dir)
+            for xlsx in batch:
+                self._prepared_caratulas[xlsx] = future
+        print(f"📚 {len(caratulas)} carátulas encoladas para conversión por lotes")
+        return len(caratulas)
+
     def get_patient_records(self) -> pd.DataFrame:
         df = self.df_master.copy()
         df["DETALLE_TOKENS"] = df["DETALLE"].astype(str).str.upper().str.replace(",", "").str.split(r" \+ ")
         return df
 
+    def _ensure_study_split(self, study: str) -> Tuple[Path, Optional[Path]]:
+        """Separa por paciente el PDF maestro de ``study`` (uno de
+        ``_LAZY_SPLIT_STUDIES``) la primera vez que se busca en la corrida,
+        si cambió desde la última separación (ver ``app.split_manifest``).
+        Retorna la carpeta con los PDFs individuales y el PDF maestro
+        encontrado (o None)."""
+        with FITZ_LOCK:
+            return self._split_study_master(study.upper())
+
+    def _split_study_master(self, study: str) -> Tuple[Path, Optional[Path]]:
+        study_dir = self.fecha_folder / study
+        index = self.folder_index()
+        if not index.is_dir(study_dir) and not self.virtual_split:
+            # Con separación virtual la carpeta solo existe en el índice
+            study_dir.mkdir(exist_ok=True)
+            index.refresh(study_dir)
+        already_split = bool(index.glob(study_dir, "*.pdf"))
+        # Se verifica una vez por corrida; el manifiesto decide si el
+        # maestro cambió desde la última separación.
+        check = study not in self._checked_splits
+        self._checked_splits.add(study)
+
+        if study in ("EEG", "PSICOS"):
+            master_pdf = self.base_path / f"{study} {self.base_path.name}.pdf"
+            if check and index.exists(master_pdf):
+                label = "EEG" if study == "EEG" else "PSICOTECNICOS"
+                print(f"✂️✂️✂️ Separando {label} por paciente ✂️✂️✂️")
+                self._split_master_pdf(study, master_pdf, study_dir, "name")
+            return study_dir, master_pdf if index.exists(master_pdf) else None
+
+        if study == "ESPIROMETRIA":
+            # Buscar el PDF maestro consolidado aceptando variaciones
+            # de nombre (ej. "ESPIROMETRIA 30-03-2026.pdf" o
+            # "ESPIROMETRIA 30-03-26.pdf" del nuevo proveedor).
+            master_pdf = self._find_master_pdf("ESPIROMETRIA", "ESPIROMETRIAS")
+            if check and master_pdf:
+                print(f"✂️✂️✂️ Separando ESPIROMETRÍAS por paciente desde {master_pdf.name} ✂️✂️✂️")
+                self._split_master_pdf(study, master_pdf, study_dir, "espiros")
+            elif not master_pdf and not already_split:
+                print(f"❌ No se encontró PDF maestro de ESPIROMETRIA en {self.base_path}")
+            return study_dir, master_pdf
+
+        if study == "ERGOMETRIA":
+            # Aceptar variaciones del nombre del PDF maestro: el
+            # proveedor viejo lo nombra "ERGOMETRIA {fecha}.pdf" y el
+            # nuevo "ERGOMETRIAS {fecha}.pdf".
+            master_pdf = self._find_master_pdf("ERGOMETRIA", "ERGOMETRIAS")
+            if master_pdf and check:
+                print(f"✂️✂️✂️ Separando ERGOMETRÍAS por DNI desde {master_pdf.name} ✂️✂️✂️")
+                self._split_master_pdf(study, master_pdf, study_dir, "dni")
+            return study_dir, master_pdf
+
+        raise ValueError(f"Estudio sin separación automática: {study}")
+
+    def _split_master_pdf(self, study: str, master_pdf: Path, study_dir: Path, method: str):
+        """Separa ``master_pdf`` por paciente en ``study_dir``, agrupando sus
+        páginas por ``method`` (``"dni"``, ``"name"`` o ``"espiros"``).
+
+        Si el maestro no cambió desde la última separación (ver
+        ``app.split_manifest``) no hace nada, salvo reescribir los PDFs que
+        falten; si cambió, reescribe solo los PDFs cuyas páginas cambiaron.
+
+        Con ``virtual_split`` no escribe ningún PDF: toma el mapa de páginas
+        guardado del maestro (o lo arma si el maestro cambió) y registra sus
+        PDFs virtuales en el índice.
+        """
+        if not self.virtual_split:
+            manifests = SplitManifestStore(self.fecha_folder / SPLIT_MANIFESTS_DIRNAME)
+            entry = manifests.get(study, master_pdf, method)
+            if entry is not None and not missing_outputs(entry):
+                print(f"♻️ {master_pdf.name} sin cambios: {len(entry['outputs'])} PDFs ya separados")
+                return
+            if entry is not None:
+                grouped_pages = {key: output["pages"] for key, output in entry["outputs"].items()}
+                region = tuple(entry["region"]) if entry.get("region") else None
+            else:
+                region = self._split_region(study, master_pdf, method)
+                with FITZ_LOCK:
+                    grouped_pages = compute_page_map(master_pdf, method, region)
+            with FITZ_LOCK:
+                page_count, outputs = write_split(master_pdf, grouped_pages, study_dir, manifests.read(study))
+            manifests.save(study, master_pdf, method, study_dir, page_count, outputs, region)
+            self.folder_index().refresh(study_dir)
+            return
+
+        store = PageMapStore(self.fecha_folder / PAGE_MAPS_DIRNAME)
+        entry = store.get(study, master_pdf, method)
+        if entry is None:
+            region = self._split_region(study, master_pdf, method)
+            with FITZ_LOCK:
+                pages = compute_page_map(master_pdf, method, region)
+            entry = store.save(study, master_pdf, method, study_dir, pages, region)
+            print(f"🗺️ Mapa de páginas de {master_pdf.name}: {len(pages)} pacientes (separación virtual)")
+        else:
+            print(f"🗺️ Mapa de páginas de {master_pdf.name} sin cambios: {len(entry['pages'])} pacientes")
+        self._register_page_map(entry)
+
+    def _split_region(self, study: str, master_pdf: Path, method: str):
+        """Zona del encabezado de las páginas de ``master_pdf`` donde se busca
+        la clave del paciente (ver ``app.split_regions``)."""
+        with FITZ_LOCK, fitz.open(master_pdf) as doc:
+            return split_region(study, doc, method)
+
+    def prepare_study_splits(self):
+        """Hace por adelantado las separaciones que ``get_required_studies``
+        haría al buscar el primer paciente de cada estudio, para que varios
+        procesos no separen el mismo PDF maestro a la vez."""
+        needed = set()
+        for tokens in self.get_patient_records()["DETALLE_TOKENS"]:
+            for token in tokens:
+                needed.update(s.upper() for s in self.study_map.get(token.strip(), []))
+        for study in _LAZY_SPLIT_STUDIES:
+            if study in needed:
+                self._ensure_study_split(study)
+
     def get_required_studies(self, tokens: List[str], dni: Optional[str] = None,
-                        apellido: Optional[str] = None, nombre: Optional[str] = None) -> List[Path]:
+                        apellido: Optional[str] = None, nombre: Optional[str] = None,
+                        *, work_dir: Path) -> List[Path]:
+        """Retorna los PDFs de los estudios del paciente en el orden de
+        ``tokens``. Los PDFs que hay que generar (RX, audiometría reescalada,
+        imágenes de EEG) se escriben en ``work_dir``, que queda a cargo del
+        llamador (por ejemplo, un ``tempfile.TemporaryDirectory``)."""
+        sources = self.resolve_required_studies(tokens, dni=dni, apellido=apellido, nombre=nombre,
+                                                work_dir=work_dir)
+        pdfs = []
+        for source in sources:
+            pdf = self.materialize_study(source)
+            if pdf is not None:
+                pdfs.append(pdf)
+        return pdfs
+
+    def resolve_required_studies(self, tokens: List[str], dni: Optional[str] = None,
+                                 apellido: Optional[str] = None, nombre: Optional[str] = None,
+                                 *, work_dir: Path) -> List[Dict]:
+        """Busca los estudios del paciente sin generar ningún PDF.
+
+        Retorna una lista de dicts ``{"kind", "path", "inputs"}``: ``kind``
+        es ``"pdf"`` para un PDF existente o el tipo de PDF a generar
+        (``"rx"``, ``"audiometria"``, ``"eeg_images"``) por
+        ``materialize_study`` en ``path`` (dentro de ``work_dir``) a partir
+        de ``inputs``.
+        """
         print(f"📥 get_required_studies llamado con tokens={tokens}, dni={dni}, apellido={apellido}, nombre={nombre}")
-        # TODO: Modularizar funciones por estudio
         pdfs = []
         for token in tokens:
             studies = self.study_map.get(token, [])
             for study in studies:
-                if study.upper() == "LABORATORIO" and dni:
-                    dni_clean = dni.replace(".", "") 
-                    lab_path = self.fecha_folder / "LABORATORIO" / f"{dni_clean}.pdf"
-                    print(f"🔍 Buscando LAB individual: {lab_path}")
-                    if lab_path.exists():
-                        print("✅ Encontrado")
-                        pdfs.append(lab_path)
-                    else:
-                        print("❌ No encontrado. No se agregará PDF general.")
-
-                elif study.upper() == "ECG" and apellido and nombre:
-                    ecg_dirs = list(self.fecha_folder.parent.glob("ECG*"))
-                    if ecg_dirs:
-                        ecg_dir = ecg_dirs[0]
-                        primer_nombre = nombre.strip().split()[0].upper()
-                        #print(f"PRIMER NOMBRE:{primer_nombre}")
-                        
-                        # Usar primer palabra del apellido
-                        apellido_orig = apellido.replace("_", " ")
-                        primer_apellido = apellido_orig.strip().split()[0].upper()
-                        #print(f"PRIMER APELLIDO:{primer_apellido}")
-                        apellido_clean = primer_apellido.replace(" ", "_")
-                        nombre_clean = primer_nombre.replace(" ", "_")
-                        ecg_pattern_1 = f"{apellido_clean}_{nombre_clean}*.pdf"
-                        matches = list(ecg_dir.glob(ecg_pattern_1))
-
-                        # Si no se encuentra, intentar con apellido completo
-                        if not matches:
-                            apellido_clean_full = apellido.strip().upper()  # usar todo el apellido
-                            ecg_pattern_2 = f"{apellido_clean_full}_{nombre_clean}*.pdf"
-                            matches = list(ecg_dir.glob(ecg_pattern_2))
-                            if matches:
-                                print(f"📄 ECG encontrado usando apellido completo: {matches[0].name}")
-                        else:
-                            print(f"📄 ECG encontrado: {matches[0].name}")
-
-                        if len(matches) == 1:
-                            pdfs.append(matches[0])
-                        elif len(matches) > 1:
-                            print(f"⚠️ Múltiples ECG encontrados. Se ignorará: {matches}")
-                        else:
-                            # Fallback: fuzzy matching contra todos los PDFs del directorio ECG
-                            # ECG filenames include timestamps (e.g. NUNEZ_LUCAS_09_01_2026_09_29_17_a.m..pdf)
-                            # so we strip the date/time suffix before comparing
-                            all_ecg_pdfs = list(ecg_dir.glob("*.pdf"))
-                            fuzzy_target = f"{primer_apellido} {primer_nombre}"
-                            normalized_target = normalize_name(fuzzy_target)
-                            best_ecg_path = None
-                            best_ecg_score = 0.0
-                            for ecg_pdf in all_ecg_pdfs:
-                                name_part = _extract_name_from_ecg_stem(ecg_pdf.stem)
-                                normalized_candidate = normalize_name(name_part)
-                                from difflib import SequenceMatcher
-                                score = SequenceMatcher(None, normalized_target, normalized_candidate).ratio()
-                                if score > best_ecg_score:
-                                    best_ecg_score = score
-                                    best_ecg_path = ecg_pdf
-                            if best_ecg_score >= 0.75 and best_ecg_path is not None:
-                                print(f"🔍 Fuzzy match ECG: '{fuzzy_target}' -> '{best_ecg_path.name}' (score={best_ecg_score:.2f})")
-                                print(f"📄 ECG encontrado por fuzzy matching: {best_ecg_path.name}")
-                                pdfs.append(best_ecg_path)
-                            else:
-                                if best_ecg_path is not None:
-                                    print(f"🔍 Fuzzy match ECG debajo del umbral: '{fuzzy_target}' mejor candidato '{best_ecg_path.name}' (score={best_ecg_score:.2f}, umbral=0.75)")
-                                print(f"⚠️ ECG no encontrado para patrones {ecg_pattern_1} ni {ecg_pattern_2} ni por fuzzy matching")
-                    else:
-                        print(f"⚠️ No se encontró directorio ECG: {ecg_dirs}")
-
-                elif study.upper() == "RX" and dni:
-                    dni_clean = dni.replace(".", "")
-                    rx_root = self.base_path / f"RX {self.base_path.name}"
+                pdfs.extend(self._resolve_study(study, dni, apellido, nombre, work_dir))
 
-                    if not rx_root.exists():
-                        print(f"⚠️ Carpeta RX no encontrada: {rx_root}")
-                        continue
-
-                    matching_folders = [f for f in rx_root.iterdir() if f.is_dir() and dni_clean in f.name]
-                    
-                    if not matching_folders:
-                        print(f"⚠️ No se encontró subcarpeta RX con DNI {dni_clean} en {rx_root}")
-                        continue
+        return pdfs
 
-                    rx_folder = matching_folders[0]
-                    jpgs = sorted(rx_folder.glob("*.jpg"))
-
-                    if jpgs:
-                        rx_pdf_path = Path("tmp") / f"rx_{dni_clean}.pdf"
-                        rx_pdf_path.parent.mkdir(exist_ok=True)
-
-                        resized_images = []
-                        for j in jpgs:
-                            img = Image.open(j).convert("RGB")
-                            img = ImageOps.exif_transpose(img)  # Corrige orientación si viene mal del scanner
-
-                            # Redimensionar preservando aspecto, ancho máximo 1000px
-                            max_width = 700
-                            if img.width > max_width:
-                                ratio = max_width / float(img.width)
-                                new_size = (max_width, int(img.height * ratio))
-                                img = img.resize(new_size, Image.LANCZOS)
-                            resized_images.append(img)
-
-                        resized_images[0].save(rx_pdf_path, save_all=True, append_images=resized_images[1:])
-                        print(f"🩻 RX convertido a PDF (escalado): {rx_pdf_path}")
-                        pdfs.append(rx_pdf_path)
-                    else:
-                        print(f"⚠️ No se encontraron JPGs en carpeta RX: {rx_folder}")
-                
-                elif study.upper() == "AUDIOMETRIA" and dni:
-                    from app.converters import rescale_pdf
-
-                    dni_clean = dni.replace(".", "")
-                    audiom_input = self.fecha_folder / "AUDIOMETRIA" / f"{dni_clean}.pdf"
-                    audiom_output = Path("tmp") / f"audiometria_{dni_clean}.pdf"
-                    audiom_output.parent.mkdir(exist_ok=True)
-
-                    print(f"🎧 Buscando audiometría individual: {audiom_input}")
-                    if audiom_input.exists():
-                        print("✅ Audiometría encontrada")
-                        rescale_pdf(audiom_input, audiom_output, dpi=100, max_width=1100)
-                        print(f"🎧 Audiometría reescalada y convertida: {audiom_output}")
-                        pdfs.append(audiom_output)
-                    else:
-                        print("❌ Audiometría no encontrada")
-
-                elif study.upper() == "EEG" and apellido and nombre:
-                    eeg_dir = self.fecha_folder / "EEG"
-                    eeg_dir.mkdir(exist_ok=True)
-                    eeg_pdf = self.base_path / f"EEG {self.base_path.name}.pdf"
-
-                    if not list(eeg_dir.glob("*.pdf")) and eeg_pdf.exists():
-                        from app.converters import split_pdf_by_name
-                        print("✂️✂️✂️ Separando EEG por paciente ✂️✂️✂️")
-                        split_pdf_by_name(eeg_pdf, eeg_dir)
-
-                    # Normalizar nombres para búsqueda (similar a ECG)
-                    apellido_orig = apellido.replace("_", " ")
-                    primer_apellido = apellido_orig.strip().split()[0].upper()
-                    primer_nombre = nombre.strip().split()[0].upper()
-                    full_name = f"{apellido.replace('_', ' ').strip()} {nombre.strip()}".upper()
-                    
-                    apellido_clean = primer_apellido.replace(" ", "_")
-                    nombre_clean = primer_nombre.replace(" ", "_")
-                    
-                    # Buscar PDF individual en eeg_dir primero
-                    filename = f"{full_name.replace(' ', '_')}.pdf"
-                    eeg_individual = eeg_dir / filename
-                    eeg_found = False
-
-                    if eeg_individual.exists():
-                        print(f"🧠 EEG encontrado: {eeg_individual.name}")
-                        pdfs.append(eeg_individual)
-                        eeg_found = True
+    def _resolve_study(self, study: str, dni: Optional[str], apellido: Optional[str],
+                       nombre: Optional[str], work_dir: Path) -> List[Dict]:
+        """Busca un estudio (``study`` de ``study_map``) del paciente. Retorna
+        los dicts de ``resolve_required_studies`` que le corresponden."""
+        # TODO: Modularizar funciones por estudio
+        index = self.folder_index()
+        pdfs = []
+        if study.upper() == "LABORATORIO" and dni:
+            dni_clean = dni.replace(".", "") 
+            lab_path = self.fecha_folder / "LABORATORIO" / f"{dni_clean}.pdf"
+            print(f"🔍 Buscando LAB individual: {lab_path}")
+            if index.exists(lab_path):
+                print("✅ Encontrado")
+                pdfs.append({"kind": "pdf", "path": lab_path})
+            else:
+                print("❌ No encontrado. No se agregará PDF general.")
+
+        elif study.upper() == "ECG" and apellido and nombre:
+            ecg_dirs = index.glob(self.fecha_folder.parent, "ECG*")
+            if ecg_dirs:
+                ecg_dir = ecg_dirs[0]
+                primer_nombre = nombre.strip().split()[0].upper()
+                #print(f"PRIMER NOMBRE:{primer_nombre}")
+
+                # Usar primer palabra del apellido
+                apellido_orig = apellido.replace("_", " ")
+                primer_apellido = apellido_orig.strip().split()[0].upper()
+                #print(f"PRIMER APELLIDO:{primer_apellido}")
+                apellido_clean = primer_apellido.replace(" ", "_")
+                nombre_clean = primer_nombre.replace(" ", "_")
+                ecg_pattern_1 = f"{apellido_clean}_{nombre_clean}*.pdf"
+                matches = index.glob(ecg_dir, ecg_pattern_1)
+
+                # Si no se encuentra, intentar con apellido completo
+                if not matches:
+                    apellido_clean_full = apellido.strip().upper()  # usar todo el apellido
+                    ecg_pattern_2 = f"{apellido_clean_full}_{nombre_clean}*.pdf"
+                    matches = index.glob(ecg_dir, ecg_pattern_2)
+                    if matches:
+                        print(f"📄 ECG encontrado usando apellido completo: {matches[0].name}")
+                else:
+                    print(f"📄 ECG encontrado: {matches[0].name}")
 
-                    # Buscar PDFs e imágenes de EEG en carpeta "EEG DD-MM-YYYY"
-                    eeg_images_root = self.base_path / f"EEG {self.base_path.name}"
-                    matching_images = []
-                    matching_pdfs = []
-                    
-                    if eeg_images_root.exists() and eeg_images_root.is_dir():
-                        # Patrones de búsqueda para PDFs e imágenes
-                        # Construir variaciones del nombre con espacios y guiones bajos
-                        apellido_space = primer_apellido.replace("_", " ")
-                        nombre_space = primer_nombre.replace("_", " ")
-                        
-                        search_patterns = [
-                            f"{apellido_clean}_{nombre_clean}*",  # VIVAS_CESAR*
-                            f"{apellido_space} {nombre_space}*",  # VIVAS CESAR* (con espacio)
-                            f"{primer_apellido} {primer_nombre}*",  # VIVAS CESAR* (directo)
-                            f"{apellido.strip().upper().replace(' ', '_')}_{nombre_clean}*",
-                            f"{full_name.replace(' ', '_')}*",  # VIVAS_CESAR_ALEJANDRO*
-                            f"{full_name.replace('_', ' ')}*"  # VIVAS CESAR ALEJANDRO* (con espacios)
-                        ]
-                        
-                        # Buscar PDFs primero - buscar con diferentes variaciones
-                        for pattern in search_patterns:
-                            pdf_matches = list(eeg_images_root.glob(f"{pattern}.pdf"))
-                            if pdf_matches:
-                                matching_pdfs.extend(pdf_matches)
-                                break
-                        
-                        # Si no se encontró con patrones, buscar directamente por nombre parcial
-                        if not matching_pdfs:
-                            # Buscar archivos que empiecen con el apellido y primer nombre
-                            all_pdfs = list(eeg_images_root.glob("*.pdf"))
-                            for pdf_file in all_pdfs:
-                                pdf_name_upper = pdf_file.stem.upper()
-                                # Verificar si el nombre del archivo contiene el apellido y primer nombre
-                                if primer_apellido in pdf_name_upper and primer_nombre in pdf_name_upper:
-                                    matching_pdfs.append(pdf_file)
-                                    break
-                        
-                        # Si no se encontraron PDFs, buscar imágenes
-                        if not matching_pdfs:
-                            for pattern in search_patterns:
-                                # Buscar JPG y PNG (case insensitive)
-                                for ext in ['jpg', 'jpeg', 'png']:
-                                    matches = list(eeg_images_root.glob(f"{pattern}.{ext}"))
-                                    matches.extend(list(eeg_images_root.glob(f"{pattern}.{ext.upper()}")))
-                                    if matches:
-                                        matching_images.extend(matches)
-                                        break
-                                if matching_images:
-                                    break
-                        
-                        # Procesar PDFs encontrados
-                        if matching_pdfs:
-                            matching_pdfs = sorted(set(matching_pdfs))
-                            eeg_pdf_found = matching_pdfs[0]  # Tomar el primero si hay múltiples
-                            print(f"🧠 EEG PDF encontrado en carpeta de imágenes: {eeg_pdf_found.name}")
-                            pdfs.append(eeg_pdf_found)
-                            eeg_found = True
-                        
-                        # Procesar imágenes encontradas (solo si no se encontró PDF)
-                        elif matching_images:
-                            # Ordenar imágenes encontradas y eliminar duplicados
-                            matching_images = sorted(set(matching_images))
-                            
-                            # Convertir imágenes a PDF (similar a RX)
-                            dni_clean = dni.replace(".", "") if dni else "unknown"
-                            eeg_images_pdf_path = Path("tmp") / f"eeg_images_{apellido_clean}_{nombre_clean}_{dni_clean}.pdf"
-                            eeg_images_pdf_path.parent.mkdir(exist_ok=True)
-                            
-                            resized_images = []
-                            for img_path in matching_images:
-                                try:
-                                    img = Image.open(img_path).convert("RGB")
-                                    img = ImageOps.exif_transpose(img)  # Corrige orientación
-                                    
-                                    # Redimensionar preservando aspecto, ancho máximo 1100px (similar a audiometría)
-                                    max_width = 1100
-                                    if img.width > max_width:
-                                        ratio = max_width / float(img.width)
-                                        new_size = (max_width, int(img.height * ratio))
-                                        img = img.resize(new_size, Image.LANCZOS)
-                                    resized_images.append(img)
-                                except Exception as e:
-                                    print(f"⚠️ Error procesando imagen {img_path.name}: {e}")
-                                    continue
-                            
-                            if resized_images:
-                                resized_images[0].save(
-                                    eeg_images_pdf_path,
-                                    save_all=True,
-                                    append_images=resized_images[1:],
-                                    resolution=200,
-                                    quality=95
-                                )
-                                print(f"🧠 Imágenes EEG convertidas a PDF (escalado): {eeg_images_pdf_path} ({len(resized_images)} imágenes)")
-                                pdfs.append(eeg_images_pdf_path)
-                                eeg_found = True
-                            else:
-                                print(f"⚠️ No se pudieron procesar las imágenes EEG encontradas")
+                if len(matches) == 1:
+                    pdfs.append({"kind": "pdf", "path": matches[0]})
+                elif len(matches) > 1:
+                    print(f"⚠️ Múltiples ECG encontrados. Se ignorará: {matches}")
+                else:
+                    batched, assigned = self._assigned_name_match("ECG", dni, apellido, nombre)
+                    if batched:
+                        if assigned is not None:
+                            print(f"📄 ECG encontrado por asignación por nombre: {assigned.name}")
+                            pdfs.append({"kind": "pdf", "path": assigned})
                         else:
-                            print(f"⚠️ No se encontraron PDFs ni imágenes EEG en {eeg_images_root} para patrones: {search_patterns}")
-                    else:
-                        print(f"ℹ️ Carpeta de imágenes EEG no encontrada: {eeg_images_root} (esto es normal si no hay imágenes)")
-
-                    # Fallback final: fuzzy matching si no se encontro EEG por ningun metodo
-                    if not eeg_found:
-                        all_fuzzy_candidates = []
-                        if eeg_dir.exists():
-                            all_fuzzy_candidates.extend(list(eeg_dir.glob("*.pdf")))
-                        if eeg_images_root.exists() and eeg_images_root.is_dir():
-                            all_fuzzy_candidates.extend(list(eeg_images_root.glob("*.pdf")))
-                        if all_fuzzy_candidates:
-                            fuzzy_target_eeg = f"{apellido.replace('_', ' ').strip()} {nombre.strip()}"
-                            fuzzy_match_eeg = fuzzy_find_best_match(fuzzy_target_eeg, all_fuzzy_candidates, threshold=0.75)
-                            if fuzzy_match_eeg:
-                                print(f"🧠 EEG encontrado por fuzzy matching: {fuzzy_match_eeg.name}")
-                                pdfs.append(fuzzy_match_eeg)
-                                eeg_found = True
-
-                    if not eeg_found:
-                        print(f"❌ EEG no encontrado (ni PDF ni imágenes ni fuzzy) para {apellido} {nombre}")
-
-                elif study.upper() == "PSICOS" and apellido and nombre:
-                    psicos_dir = self.fecha_folder / "PSICOS"
-                    psicos_dir.mkdir(exist_ok=True)
-                    psicos_pdf = self.base_path / f"PSICOS {self.base_path.name}.pdf"
-
-                    if not list(psicos_dir.glob("*.pdf")) and psicos_pdf.exists():
-                        from app.converters import split_pdf_by_name
-                        print("✂️✂️✂️ Separando PSICOTECNICOS por paciente ✂️✂️✂️")
-                        split_pdf_by_name(psicos_pdf, psicos_dir)
-
-                    # Buscar PDF individual
-                    full_name = f"{apellido.replace('_', ' ').strip()} {nombre.strip()}".upper()
-                    filename = f"{full_name.replace(' ', '_')}.pdf"
-                    psicos_individual = psicos_dir / filename
-
-                    if psicos_individual.exists():
-                        print(f"👓 PSICOTECNICO encontrado: {psicos_individual.name}")
-                        pdfs.append(psicos_individual)
+                            print(f"⚠️ ECG no encontrado para patrones {ecg_pattern_1} ni {ecg_pattern_2} ni en la asignación por nombre")
                     else:
-                        # Fallback: fuzzy matching contra todos los PDFs del directorio PSICOS
-                        all_psicos_pdfs = list(psicos_dir.glob("*.pdf"))
-                        fuzzy_target_psicos = full_name
-                        fuzzy_match_psicos = fuzzy_find_best_match(fuzzy_target_psicos, all_psicos_pdfs, threshold=0.80)
-                        if fuzzy_match_psicos:
-                            print(f"⚠️ PSICOTECNICO encontrado por fuzzy matching: {fuzzy_match_psicos.name}")
-                            pdfs.append(fuzzy_match_psicos)
+                        # Fallback: fuzzy matching contra todos los PDFs del directorio ECG
+                        # ECG filenames include timestamps (e.g. NUNEZ_LUCAS_09_01_2026_09_29_17_a.m..pdf)
+                        # so we strip the date/time suffix before comparing
+                        all_ecg_pdfs = self._fuzzy_candidates(
+                            index.glob(ecg_dir, "*.pdf"), _extract_name_from_ecg_stem
+                        )
+                        fuzzy_target = f"{primer_apellido} {primer_nombre}"
+                        best_ecg_path, best_ecg_score = all_ecg_pdfs.best_match(fuzzy_target)
+                        if best_ecg_score >= 0.75 and best_ecg_path is not None:
+                            print(f"🔍 Fuzzy match ECG: '{fuzzy_target}' -> '{best_ecg_path.name}' (score={best_ecg_score:.2f})")
+                            print(f"📄 ECG encontrado por fuzzy matching: {best_ecg_path.name}")
+                            pdfs.append({"kind": "pdf", "path": best_ecg_path})
                         else:
-                            print(f"❌ PSICOTECNICO no encontrado: {psicos_individual}")
-
-                elif study.upper() == "ESPIROMETRIA" and apellido and nombre:
-                    espiros_dir = self.fecha_folder / "ESPIROMETRIA"
-                    espiros_dir.mkdir(exist_ok=True)
-                    # Buscar el PDF maestro consolidado aceptando variaciones
-                    # de nombre (ej. "ESPIROMETRIA 30-03-2026.pdf" o
-                    # "ESPIROMETRIA 30-03-26.pdf" del nuevo proveedor).
-                    espiros_pdf = self._find_master_pdf("ESPIROMETRIA", "ESPIROMETRIAS")
-
-                    if not list(espiros_dir.glob("*.pdf")) and espiros_pdf and espiros_pdf.exists():
-                        from app.converters import split_espiros_by_name
-                        print(f"✂️✂️✂️ Separando ESPIROMETRÍAS por paciente desde {espiros_pdf.name} ✂️✂️✂️")
-                        split_espiros_by_name(espiros_pdf, espiros_dir)
-                    elif not espiros_pdf and not list(espiros_dir.glob("*.pdf")):
-                        print(f"❌ No se encontró PDF maestro de ESPIROMETRIA en {self.base_path}")
-
-                    # Buscar PDF individual
-                    apellido_base = apellido.strip().split("_")[0]
-                    nombre_parts = nombre.strip().split()
-
-                    # Intentar con primer nombre
-                    primer_nombre = nombre_parts[0]
-                    ultimo_nombre = nombre_parts[-1]
-
-                    patrones = [
-                        f"{apellido_base}_{primer_nombre}".upper(),
-                        f"{apellido_base}_{ultimo_nombre}".upper()
-                    ]
+                            if best_ecg_path is not None:
+                                print(f"🔍 Fuzzy match ECG debajo del umbral: '{fuzzy_target}' mejor candidato '{best_ecg_path.name}' (score={best_ecg_score:.2f}, umbral=0.75)")
+                            print(f"⚠️ ECG no encontrado para patrones {ecg_pattern_1} ni {ecg_pattern_2} ni por fuzzy matching")
+            else:
+                print(f"⚠️ No se encontró directorio ECG: {ecg_dirs}")
+
+        elif study.upper() == "RX" and dni:
+            dni_clean = dni.replace(".", "")
+            rx_root = self.base_path / f"RX {self.base_path.name}"
+
+            if not index.exists(rx_root):
+                print(f"⚠️ Carpeta RX no encontrada: {rx_root}")
+                return pdfs
+
+            matching_folders = [f for f in index.find_by_dni(rx_root, dni_clean) if index.is_dir(f)]
+
+            if not matching_folders:
+                print(f"⚠️ No se encontró subcarpeta RX con DNI {dni_clean} en {rx_root}")
+                return pdfs
+
+            rx_folder = matching_folders[0]
+            jpgs = index.glob(rx_folder, "*.jpg")
+
+            if jpgs:
+                rx_pdf_path = work_dir / f"rx_{dni_clean}.pdf"
+                pdfs.append({"kind": "rx", "path": rx_pdf_path, "inputs": jpgs})
+            else:
+                print(f"⚠️ No se encontraron JPGs en carpeta RX: {rx_folder}")
+
+        elif study.upper() == "AUDIOMETRIA" and dni:
+            dni_clean = dni.replace(".", "")
+            audiom_input = self.fecha_folder / "AUDIOMETRIA" / f"{dni_clean}.pdf"
+            audiom_output = work_dir / f"audiometria_{dni_clean}.pdf"
+
+            print(f"🎧 Buscando audiometría individual: {audiom_input}")
+            if index.exists(audiom_input):
+                print("✅ Audiometría encontrada")
+                pdfs.append({"kind": "audiometria", "path": audiom_output, "inputs": [audiom_input]})
+            else:
+                print("❌ Audiometría no encontrada")
+
+        elif study.upper() == "EEG" and apellido and nombre:
+            eeg_dir, _ = self._ensure_study_split("EEG")
+
+            # Normalizar nombres para búsqueda (similar a ECG)
+            apellido_orig = apellido.replace("_", " ")
+            primer_apellido = apellido_orig.strip().split()[0].upper()
+            primer_nombre = nombre.strip().split()[0].upper()
+            full_name = f"{apellido.replace('_', ' ').strip()} {nombre.strip()}".upper()
+
+            apellido_clean = primer_apellido.replace(" ", "_")
+            nombre_clean = primer_nombre.replace(" ", "_")
+
+            # Buscar PDF individual en eeg_dir primero
+            filename = f"{full_name.replace(' ', '_')}.pdf"
+            eeg_individual = eeg_dir / filename
+            eeg_found = False
+
+            if index.exists(eeg_individual):
+                print(f"🧠 EEG encontrado: {eeg_individual.name}")
+                pdfs.append({"kind": "pdf", "path": eeg_individual})
+                eeg_found = True
+
+            # Buscar PDFs e imágenes de EEG en carpeta "EEG DD-MM-YYYY"
+            eeg_images_root = self.base_path / f"EEG {self.base_path.name}"
+            matching_images = []
+            matching_pdfs = []
+
+            if index.is_dir(eeg_images_root):
+                # Patrones de búsqueda para PDFs e imágenes
+                # Construir variaciones del nombre con espacios y guiones bajos
+                apellido_space = primer_apellido.replace("_", " ")
+                nombre_space = primer_nombre.replace("_", " ")
+
+                search_patterns = [
+                    f"{apellido_clean}_{nombre_clean}*",  # VIVAS_CESAR*
+                    f"{apellido_space} {nombre_space}*",  # VIVAS CESAR* (con espacio)
+                    f"{primer_apellido} {primer_nombre}*",  # VIVAS CESAR* (directo)
+                    f"{apellido.strip().upper().replace(' ', '_')}_{nombre_clean}*",
+                    f"{full_name.replace(' ', '_')}*",  # VIVAS_CESAR_ALEJANDRO*
+                    f"{full_name.replace('_', ' ')}*"  # VIVAS CESAR ALEJANDRO* (con espacios)
+                ]
+
+                # Buscar PDFs primero - buscar con diferentes variaciones
+                for pattern in search_patterns:
+                    pdf_matches = index.glob(eeg_images_root, f"{pattern}.pdf")
+                    if pdf_matches:
+                        matching_pdfs.extend(pdf_matches)
+                        break
+
+                # Si no se encontró con patrones, buscar directamente por nombre parcial
+                if not matching_pdfs:
+                    # Buscar archivos que empiecen con el apellido y primer nombre
+                    all_pdfs = index.glob(eeg_images_root, "*.pdf")
+                    for pdf_file in all_pdfs:
+                        pdf_name_upper = pdf_file.stem.upper()
+                        # Verificar si el nombre del archivo contiene el apellido y primer nombre
+                        if primer_apellido in pdf_name_upper and primer_nombre in pdf_name_upper:
+                            matching_pdfs.append(pdf_file)
+                            break
 
-                    match = None
-                    for patron in patrones:
-                        posibles = list(espiros_dir.glob(f"{patron}*.pdf"))
-                        if posibles:
-                            match = posibles[0]
+                # Si no se encontraron PDFs, buscar imágenes
+                if not matching_pdfs:
+                    for pattern in search_patterns:
+                        # Buscar JPG y PNG (case insensitive)
+                        for ext in ['jpg', 'jpeg', 'png']:
+                            matches = index.glob(eeg_images_root, f"{pattern}.{ext}")
+                            matches.extend(index.glob(eeg_images_root, f"{pattern}.{ext.upper()}"))
+                            if matches:
+                                matching_images.extend(matches)
+                                break
+                        if matching_images:
                             break
 
-                    if match:
-                        print(f"🫁 ESPIROMETRÍA encontrada: {match.name}")
-                        pdfs.append(match)
+                # Procesar PDFs encontrados
+                if matching_pdfs:
+                    matching_pdfs = sorted(set(matching_pdfs))
+                    eeg_pdf_found = matching_pdfs[0]  # Tomar el primero si hay múltiples
+                    print(f"🧠 EEG PDF encontrado en carpeta de imágenes: {eeg_pdf_found.name}")
+                    pdfs.append({"kind": "pdf", "path": eeg_pdf_found})
+                    eeg_found = True
+
+                # Procesar imágenes encontradas (solo si no se encontró PDF)
+                elif matching_images:
+                    # Ordenar imágenes encontradas y eliminar duplicados
+                    matching_images = sorted(set(matching_images))
+
+                    # Convertir imágenes a PDF (similar a RX)
+                    dni_clean = dni.replace(".", "") if dni else "unknown"
+                    eeg_images_pdf_path = work_dir / f"eeg_images_{apellido_clean}_{nombre_clean}_{dni_clean}.pdf"
+                    pdfs.append({"kind": "eeg_images", "path": eeg_images_pdf_path, "inputs": matching_images})
+                    eeg_found = True
+                else:
+                    print(f"⚠️ No se encontraron PDFs ni imágenes EEG en {eeg_images_root} para patrones: {search_patterns}")
+            else:
+                print(f"ℹ️ Carpeta de imágenes EEG no encontrada: {eeg_images_root} (esto es normal si no hay imágenes)")
+
+            # Fallback final: fuzzy matching si no se encontro EEG por ningun metodo
+            batched, assigned = self._assigned_name_match("EEG", dni, apellido, nombre)
+            if not eeg_found and batched:
+                if assigned is not None:
+                    print(f"🧠 EEG encontrado por asignación por nombre: {assigned.name}")
+                    pdfs.append({"kind": "pdf", "path": assigned})
+                    eeg_found = True
+            elif not eeg_found:
+                all_fuzzy_candidates = []
+                all_fuzzy_candidates.extend(index.glob(eeg_dir, "*.pdf"))
+                all_fuzzy_candidates.extend(index.glob(eeg_images_root, "*.pdf"))
+                if all_fuzzy_candidates:
+                    fuzzy_target_eeg = f"{apellido.replace('_', ' ').strip()} {nombre.strip()}"
+                    fuzzy_match_eeg = fuzzy_find_best_match(
+                        fuzzy_target_eeg, self._fuzzy_candidates(all_fuzzy_candidates), threshold=0.75
+                    )
+                    if fuzzy_match_eeg:
+                        print(f"🧠 EEG encontrado por fuzzy matching: {fuzzy_match_eeg.name}")
+                        pdfs.append({"kind": "pdf", "path": fuzzy_match_eeg})
+                        eeg_found = True
+
+            if not eeg_found:
+                print(f"❌ EEG no encontrado (ni PDF ni imágenes ni fuzzy) para {apellido} {nombre}")
+
+        elif study.upper() == "PSICOS" and apellido and nombre:
+            psicos_dir, _ = self._ensure_study_split("PSICOS")
+
+            # Buscar PDF individual
+            full_name = f"{apellido.replace('_', ' ').strip()} {nombre.strip()}".upper()
+            filename = f"{full_name.replace(' ', '_')}.pdf"
+            psicos_individual = psicos_dir / filename
+
+            if index.exists(psicos_individual):
+                print(f"👓 PSICOTECNICO encontrado: {psicos_individual.name}")
+                pdfs.append({"kind": "pdf", "path": psicos_individual})
+            else:
+                # Fallback: fuzzy matching contra todos los PDFs del directorio PSICOS
+                batched, fuzzy_match_psicos = self._assigned_name_match("PSICOS", dni, apellido, nombre)
+                if not batched:
+                    all_psicos_pdfs = self._fuzzy_candidates(index.glob(psicos_dir, "*.pdf"))
+                    fuzzy_target_psicos = full_name
+                    fuzzy_match_psicos = fuzzy_find_best_match(fuzzy_target_psicos, all_psicos_pdfs, threshold=0.80)
+                if fuzzy_match_psicos:
+                    print(f"⚠️ PSICOTECNICO encontrado por fuzzy matching: {fuzzy_match_psicos.name}")
+                    pdfs.append({"kind": "pdf", "path": fuzzy_match_psicos})
+                else:
+                    print(f"❌ PSICOTECNICO no encontrado: {psicos_individual}")
+
+        elif study.upper() == "ESPIROMETRIA" and apellido and nombre:
+            espiros_dir, _ = self._ensure_study_split("ESPIROMETRIA")
+
+            # Buscar PDF individual
+            apellido_base = apellido.strip().split("_")[0]
+            nombre_parts = nombre.strip().split()
+
+            # Intentar con primer nombre
+            primer_nombre = nombre_parts[0]
+            ultimo_nombre = nombre_parts[-1]
+
+            patrones = [
+                f"{apellido_base}_{primer_nombre}".upper(),
+                f"{apellido_base}_{ultimo_nombre}".upper()
+            ]
+
+            match = None
+            for patron in patrones:
+                posibles = index.glob(espiros_dir, f"{patron}*.pdf")
+                if posibles:
+                    match = posibles[0]
+                    break
+
+            if match:
+                print(f"🫁 ESPIROMETRÍA encontrada: {match.name}")
+                pdfs.append({"kind": "pdf", "path": match})
+            else:
+                # Fallback: fuzzy matching contra todos los PDFs del directorio ESPIROMETRIA
+                batched, fuzzy_match_espiro = self._assigned_name_match("ESPIROMETRIA", dni, apellido, nombre)
+                if not batched:
+                    all_espiro_pdfs = self._fuzzy_candidates(index.glob(espiros_dir, "*.pdf"))
+                    fuzzy_target_espiro = f"{apellido_base} {primer_nombre}"
+                    fuzzy_match_espiro = fuzzy_find_best_match(fuzzy_target_espiro, all_espiro_pdfs, threshold=0.75)
+                if fuzzy_match_espiro:
+                    print(f"🫁 ESPIROMETRÍA encontrada por fuzzy matching: {fuzzy_match_espiro.name}")
+                    pdfs.append({"kind": "pdf", "path": fuzzy_match_espiro})
+                else:
+                    print(f"❌ ESPIROMETRÍA no encontrada con patrones: {patrones} ni por fuzzy matching")
+
+        elif study.upper() == "ERGOMETRIA" and (dni or (apellido and nombre)):
+            ergos_dir, ergos_pdf = self._ensure_study_split("ERGOMETRIA")
+
+            # Diagnostico: listar contenido de base_path que contenga "ERGO".
+            ergo_entries = []
+            for entry in index.entries(self.base_path):
+                if "ERGO" in entry.name.upper():
+                    kind = "DIR" if index.is_dir(entry) else "FILE"
+                    ergo_entries.append(f"{kind}:{entry.name}")
+            print(
+                f"🔎 ERGOMETRIA diagnostico base_path={self.base_path} "
+                f"entradas_ERGO={ergo_entries} master_pdf={ergos_pdf}"
+            )
+
+
+            # Se buscan AMBAS fuentes y se concatenan cuando ambas
+            # existen. La carátula ergométrica viene del consolidado
+            # viejo splitteado por DNI; el detalle (curvas, grafica)
+            # viene del directorio del proveedor nuevo indexado por
+            # APELLIDO_NOMBRE.
+            # 1) Flujo viejo: PDF individual por DNI (resultado del split).
+            ergos_found_by_dni = False
+            if dni:
+                dni_clean = dni.replace(".", "")
+                ergos_individual = ergos_dir / f"{dni_clean}.pdf"
+                if index.exists(ergos_individual):
+                    print(f"🚴 ERGOMETRÍA encontrada por DNI: {ergos_individual.name}")
+                    pdfs.append({"kind": "pdf", "path": ergos_individual})
+                    ergos_found_by_dni = True
+
+            # 2) Nuevo proveedor: PDFs individuales por APELLIDO_NOMBRE
+            # en una carpeta tipo ``ERGOS {fecha}/`` o, en su defecto,
+            # sueltos directamente en ``base_path``. Siempre se
+            # intenta en adición al flujo por DNI.
+            ergos_found_by_name = False
+            if apellido and nombre:
+                ergos_name_root = self._find_master_dir(
+                    "ERGOS", "ERGO", "ERGOMETRIAS", "ERGOMETRIA"
+                )
+                search_roots: List[Path] = []
+                if ergos_name_root is not None:
+                    search_roots.append(ergos_name_root)
+                # Fallback adicional: PDFs sueltos en base_path cuyo
+                # stem contenga "_ERGO" (p. ej. el proveedor los deja
+                # sin carpeta contenedora).
+                search_roots.append(self.base_path)
+
+                apellido_orig = apellido.replace("_", " ")
+                primer_apellido = apellido_orig.strip().split()[0].upper()
+                primer_nombre = nombre.strip().split()[0].upper()
+                apellido_full = apellido.strip().upper().replace(" ", "_")
+                nombre_full = nombre.strip().upper().replace(" ", "_")
+
+                search_patterns = [
+                    f"{apellido_full}_{nombre_full}_*",
+                    f"{apellido_full}_{primer_nombre}_*",
+                    f"{primer_apellido}_{primer_nombre}_*",
+                    f"{primer_apellido} {primer_nombre}_*",
+                    f"{apellido_full}_{nombre_full}*",
+                    f"{primer_apellido}_{primer_nombre}*",
+                ]
+                search_patterns = list(dict.fromkeys(search_patterns))
+
+                candidate_ergo: Optional[Path] = None
+                for root in search_roots:
+                    # En base_path sin subcarpeta, restringir a PDFs
+                    # que parezcan ergos por stem (contienen _ERGO).
+                    if root == self.base_path:
+                        all_in_root = [
+                            p for p in (
+                                index.glob(root, "*.pdf")
+                                + index.glob(root, "*.PDF")
+                            )
+                            if "_ERGO" in p.stem.upper()
+                        ]
                     else:
-                        # Fallback: fuzzy matching contra todos los PDFs del directorio ESPIROMETRIA
-                        all_espiro_pdfs = list(espiros_dir.glob("*.pdf"))
-                        fuzzy_target_espiro = f"{apellido_base} {primer_nombre}"
-                        fuzzy_match_espiro = fuzzy_find_best_match(fuzzy_target_espiro, all_espiro_pdfs, threshold=0.75)
-                        if fuzzy_match_espiro:
-                            print(f"🫁 ESPIROMETRÍA encontrada por fuzzy matching: {fuzzy_match_espiro.name}")
-                            pdfs.append(fuzzy_match_espiro)
-                        else:
-                            print(f"❌ ESPIROMETRÍA no encontrada con patrones: {patrones} ni por fuzzy matching")
-
-                elif study.upper() == "ERGOMETRIA" and (dni or (apellido and nombre)):
-                    ergos_dir = self.fecha_folder / "ERGOMETRIA"
-                    ergos_dir.mkdir(exist_ok=True)
-                    # Aceptar variaciones del nombre del PDF maestro: el
-                    # proveedor viejo lo nombra "ERGOMETRIA {fecha}.pdf" y el
-                    # nuevo "ERGOMETRIAS {fecha}.pdf".
-                    ergos_pdf = self._find_master_pdf("ERGOMETRIA", "ERGOMETRIAS")
-
-                    # Diagnostico: listar contenido de base_path que contenga "ERGO".
-                    ergo_entries = []
-                    try:
-                        for entry in sorted(self.base_path.iterdir()):
-                            if "ERGO" in entry.name.upper():
-                                kind = "DIR" if entry.is_dir() else "FILE"
-                                ergo_entries.append(f"{kind}:{entry.name}")
-                    except Exception as exc:
-                        ergo_entries.append(f"ERROR:{exc}")
+                        all_in_root = sorted(
+                            index.glob(root, "*.pdf")
+                            + index.glob(root, "*.PDF")
+                        )
                     print(
-                        f"🔎 ERGOMETRIA diagnostico base_path={self.base_path} "
-                        f"entradas_ERGO={ergo_entries} master_pdf={ergos_pdf}"
+                        f"🔎 ERGOMETRIA buscando en {root} "
+                        f"(archivos={[p.name for p in all_in_root]})"
                     )
+                    if not all_in_root:
+                        continue
 
-                    if ergos_pdf and ergos_pdf.exists() and not list(ergos_dir.glob("*.pdf")):
-                        from app.converters import split_pdf_by_dni
-                        print(f"✂️✂️✂️ Separando ERGOMETRÍAS por DNI desde {ergos_pdf.name} ✂️✂️✂️")
-                        split_pdf_by_dni(ergos_pdf, ergos_dir)
-
-                    # Se buscan AMBAS fuentes y se concatenan cuando ambas
-                    # existen. La carátula ergométrica viene del consolidado
-                    # viejo splitteado por DNI; el detalle (curvas, grafica)
-                    # viene del directorio del proveedor nuevo indexado por
-                    # APELLIDO_NOMBRE.
-                    # 1) Flujo viejo: PDF individual por DNI (resultado del split).
-                    ergos_found_by_dni = False
-                    if dni:
-                        dni_clean = dni.replace(".", "")
-                        ergos_individual = ergos_dir / f"{dni_clean}.pdf"
-                        if ergos_individual.exists():
-                            print(f"🚴 ERGOMETRÍA encontrada por DNI: {ergos_individual.name}")
-                            pdfs.append(ergos_individual)
-                            ergos_found_by_dni = True
-
-                    # 2) Nuevo proveedor: PDFs individuales por APELLIDO_NOMBRE
-                    # en una carpeta tipo ``ERGOS {fecha}/`` o, en su defecto,
-                    # sueltos directamente en ``base_path``. Siempre se
-                    # intenta en adición al flujo por DNI.
-                    ergos_found_by_name = False
-                    if apellido and nombre:
-                        ergos_name_root = self._find_master_dir(
-                            "ERGOS", "ERGO", "ERGOMETRIAS", "ERGOMETRIA"
-                        )
-                        search_roots: List[Path] = []
-                        if ergos_name_root is not None:
-                            search_roots.append(ergos_name_root)
-                        # Fallback adicional: PDFs sueltos en base_path cuyo
-                        # stem contenga "_ERGO" (p. ej. el proveedor los deja
-                        # sin carpeta contenedora).
-                        search_roots.append(self.base_path)
-
-                        apellido_orig = apellido.replace("_", " ")
-                        primer_apellido = apellido_orig.strip().split()[0].upper()
-                        primer_nombre = nombre.strip().split()[0].upper()
-                        apellido_full = apellido.strip().upper().replace(" ", "_")
-                        nombre_full = nombre.strip().upper().replace(" ", "_")
-
-                        search_patterns = [
-                            f"{apellido_full}_{nombre_full}_*",
-                            f"{apellido_full}_{primer_nombre}_*",
-                            f"{primer_apellido}_{primer_nombre}_*",
-                            f"{primer_apellido} {primer_nombre}_*",
-                            f"{apellido_full}_{nombre_full}*",
-                            f"{primer_apellido}_{primer_nombre}*",
+                    for pattern in search_patterns:
+                        pdf_matches = [
+                            p for p in all_in_root
+                            if p.name.lower().startswith(
+                                pattern.rstrip("*").lower()
+                            ) or p.match(f"{pattern}.pdf")
+                            or p.match(f"{pattern}.PDF")
                         ]
-                        search_patterns = list(dict.fromkeys(search_patterns))
-
-                        candidate_ergo: Optional[Path] = None
-                        for root in search_roots:
-                            # En base_path sin subcarpeta, restringir a PDFs
-                            # que parezcan ergos por stem (contienen _ERGO).
-                            if root == self.base_path:
-                                all_in_root = [
-                                    p for p in (
-                                        list(root.glob("*.pdf"))
-                                        + list(root.glob("*.PDF"))
-                                    )
-                                    if "_ERGO" in p.stem.upper()
-                                ]
-                            else:
-                                all_in_root = sorted(
-                                    list(root.glob("*.pdf"))
-                                    + list(root.glob("*.PDF"))
-                                )
-                            print(
-                                f"🔎 ERGOMETRIA buscando en {root} "
-                                f"(archivos={[p.name for p in all_in_root]})"
-                            )
-                            if not all_in_root:
-                                continue
-
-                            for pattern in search_patterns:
-                                pdf_matches = [
-                                    p for p in all_in_root
-                                    if p.name.lower().startswith(
-                                        pattern.rstrip("*").lower()
-                                    ) or p.match(f"{pattern}.pdf")
-                                    or p.match(f"{pattern}.PDF")
-                                ]
-                                if pdf_matches:
-                                    candidate_ergo = sorted(pdf_matches)[0]
-                                    print(
-                                        f"🚴 ERGOMETRIA glob match patron="
-                                        f"'{pattern}' -> {candidate_ergo.name}"
-                                    )
-                                    break
-                            if candidate_ergo is not None:
-                                break
-
-                            # Fuzzy fallback sobre la parte de nombre
-                            # (APELLIDO_NOMBRE) extraida del stem, ignorando
-                            # el sufijo "_ERGO_View_DD_MM_YYYY".
-                            from difflib import SequenceMatcher
-                            fuzzy_target = normalize_name(
-                                f"{apellido} {nombre}"
-                            )
-                            best_score = 0.75
-                            best_pdf: Optional[Path] = None
-                            fuzzy_scores = []
-                            for pdf_file in all_in_root:
-                                name_part = _extract_name_from_ergo_stem(pdf_file.stem)
-                                normalized = normalize_name(name_part)
-                                score = SequenceMatcher(
-                                    None, fuzzy_target, normalized
-                                ).ratio()
-                                fuzzy_scores.append((pdf_file.name, round(score, 2)))
-                                if score > best_score:
-                                    best_score = score
-                                    best_pdf = pdf_file
+                        if pdf_matches:
+                            candidate_ergo = sorted(pdf_matches)[0]
                             print(
-                                f"🔎 ERGOMETRIA fuzzy target='{fuzzy_target}' "
-                                f"scores={fuzzy_scores}"
+                                f"🚴 ERGOMETRIA glob match patron="
+                                f"'{pattern}' -> {candidate_ergo.name}"
                             )
-                            if best_pdf is not None:
-                                print(
-                                    f"🔍 ERGOMETRÍA fuzzy match: "
-                                    f"'{apellido} {nombre}' -> "
-                                    f"'{best_pdf.name}' (score={best_score:.2f})"
-                                )
-                                candidate_ergo = best_pdf
+                            break
+                    if candidate_ergo is not None:
+                        break
+
+                    if root != self.base_path:
+                        batched, assigned = self._assigned_name_match("ERGOMETRIA", dni, apellido, nombre)
+                        if batched:
+                            if assigned is not None:
+                                print(f"🚴 ERGOMETRÍA asignada por nombre: {assigned.name}")
+                                candidate_ergo = assigned
                                 break
+                            continue
 
-                        if candidate_ergo is not None:
-                            print(f"🚴 ERGOMETRÍA encontrada por nombre: {candidate_ergo.name}")
-                            pdfs.append(candidate_ergo)
-                            ergos_found_by_name = True
-                        else:
-                            print(
-                                f"ℹ️ ERGOMETRÍA por nombre no encontrada "
-                                f"(roots={search_roots}) para {apellido}, {nombre}"
-                            )
+                    # Fuzzy fallback sobre la parte de nombre
+                    # (APELLIDO_NOMBRE) extraida del stem, ignorando
+                    # el sufijo "_ERGO_View_DD_MM_YYYY".
+                    fuzzy_target = normalize_name(
+                        f"{apellido} {nombre}"
+                    )
+                    ergo_candidates = self._fuzzy_candidates(
+                        all_in_root, _extract_name_from_ergo_stem
+                    )
+                    fuzzy_scores = [
+                        (pdf_file.name, round(score, 2))
+                        for pdf_file, score in ergo_candidates.scores(fuzzy_target)
+                    ]
+                    best_pdf, best_score = ergo_candidates.best_match(fuzzy_target)
+                    if best_score <= 0.75:
+                        best_pdf = None
+                    print(
+                        f"🔎 ERGOMETRIA fuzzy target='{fuzzy_target}' "
+                        f"scores={fuzzy_scores}"
+                    )
+                    if best_pdf is not None:
+                        print(
+                            f"🔍 ERGOMETRÍA fuzzy match: "
+                            f"'{apellido} {nombre}' -> "
+                            f"'{best_pdf.name}' (score={best_score:.2f})"
+                        )
+                        candidate_ergo = best_pdf
+                        break
 
-                    ergos_found = ergos_found_by_dni or ergos_found_by_name
-                    if not ergos_found:
-                        if not ergos_pdf and not list(ergos_dir.glob("*.pdf")) \
-                                and self._find_master_dir("ERGOS", "ERGO", "ERGOMETRIAS", "ERGOMETRIA") is None:
-                            print(f"❌ No se encontró PDF maestro ni carpeta de ERGOMETRIA en {self.base_path}")
-                        elif dni:
-                            print(
-                                f"❌ ERGOMETRÍA no encontrada para DNI {dni} "
-                                f"ni por nombre {apellido}, {nombre}"
-                            )
-                        else:
-                            print(f"❌ ERGOMETRÍA no encontrada para {apellido}, {nombre}")
+                if candidate_ergo is not None:
+                    print(f"🚴 ERGOMETRÍA encontrada por nombre: {candidate_ergo.name}")
+                    pdfs.append({"kind": "pdf", "path": candidate_ergo})
+                    ergos_found_by_name = True
+                else:
+                    print(
+                        f"ℹ️ ERGOMETRÍA por nombre no encontrada "
+                        f"(roots={search_roots}) para {apellido}, {nombre}"
+                    )
 
+            ergos_found = ergos_found_by_dni or ergos_found_by_name
+            if not ergos_found:
+                if not ergos_pdf and not index.glob(ergos_dir, "*.pdf") \
+                        and self._find_master_dir("ERGOS", "ERGO", "ERGOMETRIAS", "ERGOMETRIA") is None:
+                    print(f"❌ No se encontró PDF maestro ni carpeta de ERGOMETRIA en {self.base_path}")
+                elif dni:
+                    print(
+                        f"❌ ERGOMETRÍA no encontrada para DNI {dni} "
+                        f"ni por nombre {apellido}, {nombre}"
+                    )
                 else:
-                    print(f"ℹ️ Estudio {study} no reconocido o faltan datos requeridos (DNI, nombre o apellido)")
+                    print(f"❌ ERGOMETRÍA no encontrada para {apellido}, {nombre}")
+
+        else:
+            print(f"ℹ️ Estudio {study} no reconocido o faltan datos requeridos (DNI, nombre o apellido)")
 
         return pdfs
 
-    def preprocess_study_results_by_dni(self, study_name: str):
+    def materialize_study(self, source: Dict) -> Optional[Path]:
+        """Retorna el PDF de un estudio resuelto por ``resolve_required_studies``,
+        generándolo si hace falta. Retorna None si no se pudo generar."""
+        kind = source["kind"]
+        if kind == "pdf":
+            return source["path"]
+
+        if kind == "rx":
+            rx_pdf_path = source["path"]
+            resized_images = []
+            for j in source["inputs"]:
+                img = Image.open(j).convert("RGB")
+                img = ImageOps.exif_transpose(img)  # Corrige orientación si viene mal del scanner
+
+                # Redimensionar preservando aspecto, ancho máximo 1000px
+                max_width = 700
+                if img.width > max_width:
+                    ratio = max_width / float(img.width)
+                    new_size = (max_width, int(img.height * ratio))
+                    img = img.resize(new_size, Image.LANCZOS)
+                resized_images.append(img)
+
+            resized_images[0].save(rx_pdf_path, save_all=True, append_images=resized_images[1:])
+            print(f"🩻 RX convertido a PDF (escalado): {rx_pdf_path}")
+            return rx_pdf_path
+
+        if kind == "audiometria":
+            from app.converters import rescale_pdf
+
+            audiom_output = source["path"]
+            audiom_input, pages = source["inputs"][0], None
+            if audiom_input in self._virtual_pages:
+                audiom_input, pages = self._virtual_pages[audiom_input]
+            with FITZ_LOCK:
+                rescale_pdf(audiom_input, audiom_output, dpi=100, max_width=1100, pages=pages)
+            print(f"🎧 Audiometría reescalada y convertida: {audiom_output}")
+            return audiom_output
+
+        if kind == "eeg_images":
+            eeg_images_pdf_path = source["path"]
+            resized_images = []
+            for img_path in source["inputs"]:
+                try:
+                    img = Image.open(img_path).convert("RGB")
+                    img = ImageOps.exif_transpose(img)  # Corrige orientación
+
+                    # Redimensionar preservando aspecto, ancho máximo 1100px (similar a audiometría)
+                    max_width = 1100
+                    if img.width > max_width:
+                        ratio = max_width / float(img.width)
+                        new_size = (max_width, int(img.height * ratio))
+                        img = img.resize(new_size, Image.LANCZOS)
+                    resized_images.append(img)
+                except Exception as e:
+                    print(f"⚠️ Error procesando imagen {img_path.name}: {e}")
+                    continue
+
+            if not resized_images:
+                print(f"⚠️ No se pudieron procesar las imágenes EEG encontradas")
+                return None
+            resized_images[0].save(
+                eeg_images_pdf_path,
+                save_all=True,
+                append_images=resized_images[1:],
+                resolution=200,
+                quality=95
+            )
+            print(f"🧠 Imágenes EEG convertidas a PDF (escalado): {eeg_images_pdf_path} ({len(resized_images)} imágenes)")
+            return eeg_images_pdf_path
+
+        raise ValueError(f"Tipo de estudio desconocido: {kind}")
+
+    def _preprocess_master(self, study_name: str) -> Optional[Path]:
+        """PDF maestro de ``study_name`` en ``base_path`` (o None)."""
         pattern = f"{study_name.upper()}*.pdf"
         study_path = next(self.base_path.glob(pattern), None)
+        if not study_path:
+            print(f"⚠️ No se encontró el archivo {pattern}.")
+        return study_path
+
+    def preprocess_study_results_by_dni(self, study_name: str):
+        study_path = self._preprocess_master(study_name)
         output_dir = self.fecha_folder / study_name.upper()
 
         if not study_path:
-            print(f"⚠️ No se encontró el archivo {pattern}.")
             return
 
-        split_pdf_by_dni(study_path, output_dir)
+        self._split_master_pdf(study_name.upper(), study_path, output_dir, "dni")
 
     def preprocess_study_results_by_name(self, study_name: str):
-        pattern = f"{study_name.upper()}*.pdf"
-        study_path = next(self.base_path.glob(pattern), None)
+        study_path = self._preprocess_master(study_name)
         output_dir = self.fecha_folder / study_name.upper()
 
         if not study_path:
-            print(f"⚠️ No se encontró el archivo {pattern}.")
             return
 
         if study_name.upper() == "ESPIROMETRIA":
             print(f"✂️✂️✂️ Separando espirometrias por paciente ✂️✂️✂️")
-            from app.converters import split_espiros_by_name
-            split_espiros_by_name(study_path, output_dir)
+            self._split_master_pdf(study_name.upper(), study_path, output_dir, "espiros")
         else:
             print(f"✂️✂️✂️ Separando {study_name.upper()} por paciente ✂️✂️✂️")
-            from app.converters import split_pdf_by_name
-            split_pdf_by_name(study_path, output_dir)
+            self._split_master_pdf(study_name.upper(), study_path, output_dir, "name")
+
+    def preprocess_all_studies(self, jobs: Optional[int] = None):
+        """Separa por paciente los PDFs maestros de ``PREPROCESS_STUDIES``
+        (el botón "Discriminar estudios por paciente") con ``jobs`` procesos
+        a la vez (por defecto, uno por estudio hasta la cantidad de CPUs).
+
+        El texto de cada maestro se extrae en tramos de ``SPLIT_SHARD_PAGES``
+        páginas, todos en paralelo. Con las claves de todas sus páginas se
+        agrupan las de cada paciente y se escriben sus PDFs, también en el
+        pool (con ``virtual_split`` solo se guarda su mapa de páginas). El
+        log de cada estudio se imprime completo, en el orden de
+        ``PREPROCESS_STUDIES``. Con ``jobs`` = 1 separa uno tras otro en este
+        proceso, como ``preprocess_study_results_by_dni`` / ``_by_name``.
+
+        Igual que ``_split_master_pdf``, un maestro sin cambios al que le
+        faltan PDFs no se vuelve a leer: se reescriben esos PDFs con las
+        páginas guardadas en su manifiesto.
+        """
+        jobs = jobs or min(len(PREPROCESS_STUDIES), os.cpu_count() or 1)
+        if jobs <= 1:
+            for study, method in PREPROCESS_STUDIES:
+                print(f"\n{'✂️'*3} Separando {study.lower()} por paciente {'✂️'*3}\n")
+                if method == "dni":
+                    self.preprocess_study_results_by_dni(study)
+                else:
+                    self.preprocess_study_results_by_name(study)
+            return
 
+        store = PageMapStore(self.fecha_folder / PAGE_MAPS_DIRNAME)
+        manifests = SplitManifestStore(self.fecha_folder / SPLIT_MANIFESTS_DIRNAME)
+        pending = []
+        for study, method in PREPROCESS_STUDIES:
+            master_pdf = self._preprocess_master(study)
+            if master_pdf is None:
+                continue
+            entry = None
+            if self.virtual_split:
+                entry = store.get(study, master_pdf, method)
+                if entry is not None:
+                    print(f"🗺️ Mapa de páginas de {master_pdf.name} sin cambios: {len(entry['pages'])} pacientes")
+                    self._register_page_map(entry)
+                    continue
+            else:
+                entry = manifests.get(study, master_pdf, method)
+                if entry is not None and not missing_outputs(entry):
+                    print(f"♻️ {master_pdf.name} sin cambios: {len(entry['outputs'])} PDFs ya separados")
+                    continue
+            # entry: manifiesto vigente al que le faltan PDFs (o None)
+            pending.append((study, method, master_pdf, self.fecha_folder / study, entry))
+        if not pending:
+            return
 
-    def build_report_for_patient(self, index: int) -> List[str]:
-        """Genera el reporte para un paciente. Retorna lista de warnings."""
+        # "spawn" como en _build_all_reports_parallel: fitz no es seguro en
+        # un hijo forkeado de un proceso con hilos.
+        mp_context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=mp_context) as executor:
+            shards, regions = {}, {}
+            for study, method, master_pdf, _, entry in pending:
+                if entry is not None:
+                    regions[study] = tuple(entry["region"]) if entry.get("region") else None
+                    continue
+                with FITZ_LOCK, fitz.open(master_pdf) as doc:
+                    page_count = doc.page_count
+                    region = regions[study] = split_region(study, doc, method)
+                shards[study] = [
+                    executor.submit(page_keys, master_pdf, method, start, start + SPLIT_SHARD_PAGES, region)
+                    for start in range(0, page_count, SPLIT_SHARD_PAGES)
+                ]
+            print(f"🧵 Separando {len(pending)} estudios en {sum(map(len, shards.values()))} tramos con {jobs} procesos")
+
+            logs, writes = {}, {}
+            for study, method, master_pdf, output_dir, entry in pending:
+                buffer = io.StringIO()
+                with contextlib.redirect_stdout(buffer):
+                    print(f"\n{'✂️'*3} Separando {study.lower()} por paciente {'✂️'*3}\n")
+                    if entry is not None:
+                        grouped_pages = {key: output["pages"] for key, output in entry["outputs"].items()}
+                        print(f"♻️ {master_pdf.name} sin cambios: se reescriben "
+                              f"{len(missing_outputs(entry))} PDFs que faltan")
+                    else:
+                        keys = [key for shard in shards[study] for key in shard.result()]
+                        grouped_pages = group_page_keys(keys, method)
+                    if self.virtual_split:
+                        self._register_page_map(store.save(study, master_pdf, method, output_dir, grouped_pages,
+                                                           regions[study]))
+                        print(f"🗺️ Mapa de páginas de {master_pdf.name}: {len(grouped_pages)} pacientes (separación virtual)")
+                    else:
+                        writes[study] = executor.submit(_write_split_in_worker, master_pdf, grouped_pages,
+                                                        output_dir, manifests.read(study))
+                logs[study] = buffer.getvalue()
+
+            for study, method, master_pdf, output_dir, _ in pending:
+                print(logs[study], end="")
+                if study in writes:
+                    log, page_count, outputs = writes[study].result()
+                    print(log, end="")
+                    manifests.save(study, master_pdf, method, output_dir, page_count, outputs, regions[study])
+                    self.folder_index().refresh(output_dir)
+
+
+    def build_report_for_patient(self, index: int, caratula_renderer: str = "libreoffice",
+                                 incremental: bool = False) -> List[str]:
+        """Genera el reporte para un paciente. Retorna lista de warnings.
+
+        ``caratula_renderer`` elige cómo se convierte la carátula:
+        ``"libreoffice"`` o ``"native"`` (en proceso, con LibreOffice como
+        fallback). Con ``incremental`` el reporte no se regenera si sus
+        entradas no cambiaron desde la última vez (ver ``BuildManifest``).
+
+        Corre en secuencia las mismas etapas que ``build_all_reports``
+        ejecuta en pipeline: ``plan_patient_report``,
+        ``convert_patient_caratula``, ``materialize_patient_studies``,
+        ``merge_patient_report`` y ``write_patient_report``.
+        """
+        plan = self.plan_patient_report(index, caratula_renderer, incremental=incremental)
+        try:
+            self.convert_patient_caratula(plan)
+            self.materialize_patient_studies(plan)
+            self.merge_patient_report(plan)
+            return self.write_patient_report(plan)
+        finally:
+            self.discard_patient_plan(plan)
+
+    def plan_patient_report(self, index: int, caratula_renderer: str = "libreoffice",
+                            work_root: Optional[Path] = None, incremental: bool = False) -> Dict:
+        """Etapa de descubrimiento: arma el plan del reporte del paciente
+        (datos, carátula, estudios a unir y PDF final) sin convertir ni
+        generar nada. El plan incluye un directorio de trabajo propio, bajo
+        ``work_root`` si se indica, para los PDFs intermedios: dos corridas o
+        procesos a la vez nunca pisan los archivos del otro.
+
+        El plan lleva también el manifiesto de sus entradas; con
+        ``incremental``, si el reporte ya existe y el manifiesto coincide con
+        el de la corrida que lo generó, el plan queda marcado como
+        ``skipped`` y las demás etapas no hacen nada."""
         row = self.df_master.iloc[index]
-        warnings: List[str] = []
 
         apellido = str(row['APELLIDOS']).strip().replace(" ", "_")
         nombre = str(row['NOMBRES']).strip().replace(" ", "_").upper()
@@ -734,67 +1456,469 @@ class ReportAssembler:
         caratula_xlsx = self.get_patient_cover(row)
         output_dir = (Path(__file__).resolve().parent.parent / "OUTPUT" / self.base_path.name).resolve()
         output_dir.mkdir(parents=True, exist_ok=True)
-        caratula_pdf = output_dir / f"caratula_tmp_{index}.pdf"
-        convert_xlsx_to_pdf(caratula_xlsx, caratula_pdf)
-
-        study_pdfs = self.get_required_studies(tokens, dni=dni, apellido=apellido, nombre=row['NOMBRES'])
-        pdf_paths = [caratula_pdf] + study_pdfs
+        final_name = f"{apellido_safe}_{nombre_safe}_{dni_safe}_{empresa_safe}.pdf"
 
-        # Validacion post-ensamblado: contar estudios esperados vs encontrados
         expected_studies = []
         for token in tokens:
             expected_studies.extend(self.study_map.get(token, []))
+
+        manifest = BuildManifest(output_dir)
+        plan = {
+            "index": index,
+            "apellido": apellido,
+            "nombre": nombre,
+            "dni": dni,
+            "tokens": tokens,
+            "caratula_xlsx": caratula_xlsx,
+            "caratula_renderer": caratula_renderer,
+            "caratula_pdf": None,
+            "work_dir": Path(tempfile.mkdtemp(prefix=f"reporte_{dni_safe}_", dir=work_root)),
+            "sources": [],
+            "study_pdfs": [],
+            "expected_count": len(expected_studies),
+            "final_pdf_path": output_dir / final_name,
+            "merged": None,
+            "warnings": [],
+            "manifest": manifest,
+            "manifest_entry": None,
+            "skipped": False,
+        }
+        try:
+            if self._study_plan is not None:
+                print(f"📥 Estudios del plan de la corrida para tokens={tokens}, dni={dni}")
+                plan["sources"] = self._sources_from_study_plan(index, plan["work_dir"])
+            else:
+                plan["sources"] = self.resolve_required_studies(
+                    tokens, dni=dni, apellido=apellido, nombre=row['NOMBRES'], work_dir=plan["work_dir"]
+                )
+
+            input_paths = [caratula_xlsx]
+            for source in plan["sources"]:
+                for path in source.get("inputs") or [source["path"]]:
+                    if path in self._virtual_pages:
+                        # Un PDF virtual cambia cuando cambia su maestro.
+                        input_paths.append(self._virtual_pages[path][0])
+                    input_paths.append(path)
+            previous = manifest.get(final_name)
+            plan["manifest_entry"] = {
+                "tokens": tokens,
+                "row_hash": row_fingerprint(row),
+                "caratula_renderer": caratula_renderer,
+                "inputs": manifest.describe_inputs(input_paths, previous),
+            }
+        except Exception:
+            self.discard_patient_plan(plan)
+            raise
+
+        if incremental and plan["final_pdf_path"].exists() \
+                and BuildManifest.matches(previous, plan["manifest_entry"]):
+            plan["skipped"] = True
+            plan["warnings"] = list(previous.get("warnings", []))
+            print(f"⏭️ Sin cambios desde la última corrida, se omite: {final_name}")
+        return plan
+
+    def convert_patient_caratula(self, plan: Dict) -> Dict:
+        """Etapa de conversión: obtiene el PDF de la carátula del plan."""
+        if plan["skipped"]:
+            return plan
+        plan["caratula_pdf"] = self._caratula_pdf_for(
+            plan["index"], plan["caratula_xlsx"], plan["work_dir"], plan["caratula_renderer"]
+        )
+        return plan
+
+    def materialize_patient_studies(self, plan: Dict) -> Dict:
+        """Etapa de rasterización: genera los PDFs de estudios que lo
+        necesitan (RX, audiometría, imágenes de EEG) y valida la cantidad de
+        estudios encontrados contra los esperados."""
+        if plan["skipped"]:
+            return plan
+        study_pdfs = []
+        for source in plan["sources"]:
+            pdf = self.materialize_study(source)
+            if pdf is not None:
+                study_pdfs.append(pdf)
+        plan["study_pdfs"] = study_pdfs
+
+        # Validacion post-ensamblado: contar estudios esperados vs encontrados
         found_count = len(study_pdfs)
-        expected_count = len(expected_studies)
+        expected_count = plan["expected_count"]
         if found_count < expected_count:
             missing_count = expected_count - found_count
-            msg = f"Paciente {apellido} {nombre} ({dni}): se esperaban {expected_count} estudios pero se encontraron {found_count} ({missing_count} faltantes)"
-            warnings.append(msg)
+            msg = f"Paciente {plan['apellido']} {plan['nombre']} ({plan['dni']}): se esperaban {expected_count} estudios pero se encontraron {found_count} ({missing_count} faltantes)"
+            plan["warnings"].append(msg)
             print(f"⚠️ {msg}")
-
-        print(f"📎 Archivos a unir para {apellido}_{dni}:")
+        return plan
+
+    def merge_patient_report(self, plan: Dict) -> Dict:
+        """Etapa de unión: junta carátula y estudios en un documento fitz en
+        memoria (``plan["merged"]``). Las páginas de los PDFs virtuales se
+        insertan directo desde su PDF maestro abierto."""
+        if plan["skipped"]:
+            return plan
+        warnings = plan["warnings"]
+        pdf_paths = [plan["caratula_pdf"]] + plan["study_pdfs"]
+
+        print(f"📎 Archivos a unir para {plan['apellido']}_{plan['dni']}:")
         for p in pdf_paths:
             print(f" - {p}")
 
-        final_name = f"{apellido_safe}_{nombre_safe}_{dni_safe}_{empresa_safe}.pdf"
-        final_pdf_path = output_dir / final_name
-
-        merged = fitz.open()
-        inserted_count = 0
+        with FITZ_LOCK:
+            merged = fitz.open()
+            plan["merged"] = merged
+            inserted_count = 0
 
-        for pdf in pdf_paths:
-            print(f"📥 Abriendo: {pdf}")
-            if not pdf.exists():
-                print(f"⚠️ Archivo no encontrado: {pdf}")
-                warnings.append(f"Archivo no encontrado al ensamblar: {pdf.name}")
-                continue
-            try:
-                with fitz.open(pdf) as doc:
-                    print(f"📄 {pdf.name} tiene {doc.page_count} páginas")
-                    if doc.page_count > 0:
-                        merged.insert_pdf(doc, from_page=0, to_page=doc.page_count - 1)
+            for pdf in pdf_paths:
+                if pdf in self._virtual_pages:
+                    master, pages = self._virtual_pages[pdf]
+                    print(f"📥 Páginas {[p + 1 for p in pages]} de {master.name} ({pdf.name})")
+                    try:
+                        doc = self._master_document(master)
+                        for from_page, to_page in page_ranges(pages):
+                            merged.insert_pdf(doc, from_page=from_page, to_page=to_page)
                         inserted_count += 1
                         print(f"📌 Insertadas páginas de {pdf.name}. Total actual: {len(merged)}")
-                    else:
-                        print(f"⚠️ {pdf.name} no tiene páginas. No se insertará.")
-                        warnings.append(f"Archivo sin paginas: {pdf.name}")
-            except Exception as e:
-                print(f"❌ Error al insertar {pdf.name}: {e}")
-                warnings.append(f"Error al insertar {pdf.name}: {e}")
+                    except Exception as e:
+                        print(f"❌ Error al insertar {pdf.name}: {e}")
+                        warnings.append(f"Error al insertar {pdf.name}: {e}")
+                    continue
+                print(f"📥 Abriendo: {pdf}")
+                if not pdf.exists():
+                    print(f"⚠️ Archivo no encontrado: {pdf}")
+                    warnings.append(f"Archivo no encontrado al ensamblar: {pdf.name}")
+                    continue
+                try:
+                    with fitz.open(pdf) as doc:
+                        print(f"📄 {pdf.name} tiene {doc.page_count} páginas")
+                        if doc.page_count > 0:
+                            merged.insert_pdf(doc, from_page=0, to_page=doc.page_count - 1)
+                            inserted_count += 1
+                            print(f"📌 Insertadas páginas de {pdf.name}. Total actual: {len(merged)}")
+                        else:
+                            print(f"⚠️ {pdf.name} no tiene páginas. No se insertará.")
+                            warnings.append(f"Archivo sin paginas: {pdf.name}")
+                except Exception as e:
+                    print(f"❌ Error al insertar {pdf.name}: {e}")
+                    warnings.append(f"Error al insertar {pdf.name}: {e}")
+        return plan
+
+    def write_patient_report(self, plan: Dict) -> List[str]:
+        """Etapa de escritura: guarda el reporte y su manifiesto, libera el
+        plan y retorna sus warnings."""
+        if plan["skipped"]:
+            self.discard_patient_plan(plan)
+            self.report_counts["omitidos"] += 1
+            return plan["warnings"]
+
+        final_pdf_path = plan["final_pdf_path"]
+        with FITZ_LOCK:
+            plan["merged"].save(final_pdf_path)
+        self.discard_patient_plan(plan)
+        plan["manifest"].record(final_pdf_path.name, dict(plan["manifest_entry"], warnings=plan["warnings"]))
+        self.report_counts["generados"] += 1
+        print(f"✅ Reporte guardado: {final_pdf_path}")
+        return plan["warnings"]
+
+    def discard_patient_plan(self, plan: Dict):
+        """Cierra el documento en memoria y borra el directorio de trabajo
+        del plan. Se puede llamar más de una vez."""
+        merged = plan.get("merged")
+        if merged is not None:
+            with FITZ_LOCK:
+                merged.close()
+            plan["merged"] = None
+        shutil.rmtree(plan["work_dir"], ignore_errors=True)
+
+
+    def build_all_reports(self, libreoffice_workers: int = DEFAULT_POOL_SIZE,
+                          batch_caratulas: bool = True,
+                          caratula_renderer: str = "libreoffice", jobs: int = 1,
+                          queue_size: int = DEFAULT_QUEUE_SIZE,
+                          incremental: bool = True,
+                          run_mode: str = "nueva") -> List[str]:
+        """Genera reportes para todos los pacientes. Retorna lista acumulada de warnings.
+
+        Cada corrida queda registrada en la bitácora de la fecha
+        (``RunJournal``), con el estado, los warnings y la duración de cada
+        paciente. ``run_mode`` elige qué pacientes se procesan:
+        ``"nueva"`` (todos), ``"reanudar"`` (los que no terminaron en la
+        última corrida) o ``"reintentar_fallidos"`` (solo los que fallaron en
+        la última corrida). Un paciente que falla no corta la corrida: queda
+        como fallido y su error se agrega a los warnings. Los warnings de los
+        pacientes que ya habían terminado se devuelven igual, en orden.
+
+        Los archivos que se buscan por nombre (ECG, EEG, psicotécnicos,
+        espirometrías, ergometrías) se asignan antes a los pacientes de una
+        sola pasada (``prepare_name_assignments``); los empates ambiguos y los
+        archivos que no quedaron asignados van al principio de los warnings.
+
+        Los estudios de todos los pacientes se planifican de una pasada
+        (``plan_all_studies``) y cada paciente toma los suyos de ese plan.
+
+        Con ``virtual_split`` los PDFs maestros no se separan en archivos: las
+        páginas de cada paciente se insertan desde el maestro, que queda
+        abierto durante toda la corrida.
+
+        Con ``incremental`` solo se regeneran los pacientes cuyas entradas
+        (archivos, tokens de DETALLE o fila del Excel maestro) cambiaron
+        desde la corrida que generó su reporte; ``report_counts`` queda con
+        la cantidad de reportes generados, omitidos y fallidos.
+
+        Los pacientes pasan por un pipeline (``StagePipeline``) con las
+        etapas de ``build_report_for_patient`` en hilos separados:
+        descubrimiento → carátula → estudios (rasterización) → unión →
+        escritura, conectadas por colas de ``queue_size`` pacientes. Las
+        estadísticas de cada etapa quedan en ``last_pipeline_stats`` y se
+        imprimen al terminar.
+
+        Con ``jobs`` > 1 los pacientes se reparten entre ``jobs`` procesos
+        (ver ``_build_all_reports_parallel``); los warnings y los logs se
+        devuelven igual en el orden del Excel maestro.
+
+        ``caratula_renderer`` se pasa a ``build_report_for_patient``; con el
+        renderer nativo no hay conversión por lotes y LibreOffice solo se
+        usa para las carátulas que ese renderer no soporta.
+
+        Con ``batch_caratulas`` todas las carátulas se convierten antes, en
+        pocas invocaciones de LibreOffice que corren en segundo plano, a un
+        directorio de la corrida que se borra al terminar. Las que no salgan
+        del lote se convierten con un pool de ``libreoffice_workers``
+        instancias de LibreOffice que se mantienen vivas durante toda la
+        corrida (0 = una invocación de LibreOffice por carátula). Las
+        carátulas que ya están en el caché persistente no se reconvierten.
+        """
+        if run_mode not in RUN_MODES:
+            raise ValueError(f"Modo de corrida desconocido: {run_mode} (opciones: {list(RUN_MODES)})")
 
-        merged.save(final_pdf_path)
+        df = self.get_patient_records()
+        self.report_counts = {"generados": 0, "omitidos": 0, "fallidos": 0}
+        output_dir = (Path(__file__).resolve().parent.parent / "OUTPUT" / self.base_path.name).resolve()
+        output_dir.mkdir(parents=True, exist_ok=True)
+        jobs = max(1, int(jobs or 1))
+        # Un solo recorrido de la carpeta de la fecha por corrida: todas las
+        # búsquedas de estudios salen de este índice.
+        self.refresh_folder_index()
 
-        merged.close()
-        caratula_pdf.unlink()
-        print(f"✅ Reporte guardado: {final_pdf_path}")
-        return warnings
+        with RunJournal(output_dir / JOURNAL_NAME) as journal:
+            run_id, indices = self._select_run_patients(journal, df, run_mode)
+            print(f"🗒️ Corrida {run_id} ({run_mode}): {len(indices)} de {len(df)} pacientes a procesar")
 
+            all_warnings: List[str] = []
+            try:
+                if indices:
+                    # Las separaciones de PDFs maestros, la asignación de
+                    # archivos por nombre y el plan de estudios se hacen
+                    # antes, para toda la fecha: la etapa de descubrimiento
+                    # de cada paciente solo consulta resultados.
+                    self.prepare_study_splits()
+                    all_warnings.extend(self.prepare_name_assignments())
+                    self.plan_all_studies()
+                if jobs > 1 and len(indices) > 1:
+                    self._build_all_reports_parallel(indices, jobs, caratula_renderer, incremental, journal, run_id)
+                elif indices:
+                    self._build_all_reports_pipelined(
+                        indices, output_dir, libreoffice_workers, batch_caratulas, caratula_renderer,
+                        queue_size, incremental, journal, run_id,
+                    )
+            finally:
+                self._name_assignments = {}
+                self._study_plan = None
+                self.close_master_documents()
+            journal.finish_run(run_id)
+
+            for patient in journal.patients(run_id):
+                if patient["state"] == FAILED:
+                    all_warnings.append(
+                        f"Paciente {patient['dni']}: falló la generación del reporte ({patient['error']})"
+                    )
+                else:
+                    all_warnings.extend(patient["warnings"])
+            summary = journal.summary(run_id)
 
-    def build_all_reports(self) -> List[str]:
-        """Genera reportes para todos los pacientes. Retorna lista acumulada de warnings."""
-        df = self.get_patient_records()
-        all_warnings: List[str] = []
-        for i in range(len(df)):
-            patient_warnings = self.build_report_for_patient(i)
-            all_warnings.extend(patient_warnings)
+        self._print_report_counts(len(indices))
+        print(f"🗒️ Corrida {run_id}: {summary[DONE]} pacientes terminados, {summary[FAILED]} fallidos")
         return all_warnings
+
+    def _select_run_patients(self, journal: RunJournal, df: pd.DataFrame,
+                             run_mode: str) -> Tuple[int, List[int]]:
+        """Retorna el id de corrida y los índices de pacientes a procesar
+        según ``run_mode``. Para reanudar o reintentar se usa la última
+        corrida, siempre que el Excel maestro tenga los mismos pacientes (por
+        DNI) en el mismo orden; si no, se empieza una corrida nueva."""
+        patients = [(i, str(dni).strip().replace(".", "")) for i, dni in enumerate(df["DNI"])]
+        states = RUN_MODES[run_mode]
+        last_run = journal.latest_run() if states is not None else None
+        if last_run is not None:
+            journaled = [(p["idx"], p["dni"]) for p in journal.patients(last_run["run_id"])]
+            if journaled == patients:
+                return last_run["run_id"], journal.reopen_run(last_run["run_id"], states)
+            print("⚠️ El Excel maestro cambió desde la última corrida: se inicia una corrida nueva")
+        elif states is not None:
+            print("ℹ️ No hay corridas previas para esta fecha: se inicia una corrida nueva")
+        run_id = journal.start_run(patients, {"run_mode": run_mode})
+        return run_id, [i for i, _ in patients]
+
+    def _build_all_reports_pipelined(self, indices: List[int], output_dir: Path,
+                                     libreoffice_workers: int, batch_caratulas: bool,
+                                     caratula_renderer: str, queue_size: int, incremental: bool,
+                                     journal: RunJournal, run_id: int):
+        """Genera los reportes de ``indices`` en el pipeline por etapas de
+        este proceso (ver ``build_all_reports``)."""
+        def plan(index: int) -> Dict:
+            journal.mark_running(run_id, index)
+            return self.plan_patient_report(index, caratula_renderer, incremental=incremental)
+
+        def write(plan: Dict) -> List[str]:
+            warnings = self.write_patient_report(plan)
+            journal.mark_done(run_id, plan["index"], warnings)
+            return warnings
+
+        def failed(index: int, error: Exception):
+            self.report_counts["fallidos"] += 1
+            journal.mark_failed(run_id, index, f"{type(error).__name__}: {error}")
+
+        run_cache_dir = Path(tempfile.mkdtemp(prefix=".caratulas_", dir=output_dir))
+        try:
+            with LibreOfficePool(size=libreoffice_workers) as pool, \
+                    ThreadPoolExecutor(max_workers=1, thread_name_prefix="caratulas") as executor:
+                self._libreoffice_pool = pool
+                try:
+                    if batch_caratulas and caratula_renderer == "libreoffice":
+                        self.prepare_caratulas(executor, run_cache_dir, indices=indices)
+                    pipeline = StagePipeline(
+                        [
+                            ("descubrimiento", plan),
+                            ("caratula", self.convert_patient_caratula),
+                            ("estudios", self.materialize_patient_studies),
+                            ("union", self.merge_patient_report),
+                            ("escritura", write),
+                        ],
+                        queue_size=queue_size,
+                        discard=lambda plan: self.discard_patient_plan(plan) if isinstance(plan, dict) else None,
+                        stop_on_error=False,
+                        on_error=failed,
+                    )
+                    try:
+                        pipeline.run(indices)
+                    finally:
+                        self.last_pipeline_stats = pipeline.stats()
+                        print(pipeline.format_stats())
+                finally:
+                    self._libreoffice_pool = None
+                    for future in set(self._prepared_caratulas.values()):
+                        future.cancel()
+                    self._prepared_caratulas = {}
+        finally:
+            shutil.rmtree(run_cache_dir, ignore_errors=True)
+
+    def _print_report_counts(self, total: int):
+        print(
+            f"📦 {self.report_counts['generados']} reportes generados, "
+            f"{self.report_counts['omitidos']} omitidos sin cambios, "
+            f"{self.report_counts['fallidos']} fallidos (de {total})"
+        )
+
+    def _build_all_reports_parallel(self, indices: List[int], jobs: int, caratula_renderer: str,
+                                    incremental: bool, journal: RunJournal, run_id: int):
+        """Genera los reportes de ``indices`` repartiéndolos entre ``jobs``
+        procesos, cada uno con su propio ``ReportAssembler``.
+
+        Las separaciones de PDFs maestros, la asignación de archivos por
+        nombre y el plan de estudios ya están hechos (ver
+        ``build_all_reports``); la asignación y el plan se pasan a cada
+        proceso. Cada proceso convierte sus carátulas
+        con LibreOffice de un solo disparo y un perfil propio (no hay
+        conversión por lotes), aprovechando el caché de carátulas. El log de
+        cada paciente se imprime completo y en orden al recibir su resultado,
+        y recién ahí se registra en la bitácora. Un paciente queda ``running``
+        en la bitácora desde que se encola; si su proceso muere (y con él el
+        pool), se registra como fallido junto con los que quedaban.
+        """
+        n_patients = len(indices)
+        profiles_dir = Path(tempfile.mkdtemp(prefix="lo_jobs_"))
+        # "spawn" y no "fork": el proceso padre (Streamlit) tiene hilos y
+        # fitz/LibreOffice no son seguros en un hijo forkeado.
+        mp_context = multiprocessing.get_context("spawn")
+        print(f"🧵 Generando {n_patients} reportes con {jobs} procesos")
+        try:
+            with ProcessPoolExecutor(
+                max_workers=jobs,
+                mp_context=mp_context,
+                initializer=_init_build_worker,
+                initargs=(str(self.base_path), self.fecha_folder.name, self.caratula_cache, profiles_dir,
+                          self._name_assignments, self._study_plan, self.virtual_split),
+            ) as executor:
+                futures = []
+                for index in indices:
+                    journal.mark_running(run_id, index)
+                    futures.append(executor.submit(_build_patient_in_worker, index, caratula_renderer, incremental))
+                for index, future in zip(indices, futures):
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool as error:
+                        print(f"❌ El proceso que generaba el reporte del paciente {index} terminó inesperadamente")
+                        self.report_counts["fallidos"] += 1
+                        journal.mark_failed(run_id, index, f"{type(error).__name__}: {error}")
+                        continue
+                    print(result["log"], end="")
+                    if result["error"] is not None:
+                        self.report_counts["fallidos"] += 1
+                        error = result["error"]
+                        journal.mark_failed(run_id, index, f"{type(error).__name__}: {error}", result["duration_s"])
+                        continue
+                    journal.mark_done(run_id, index, result["warnings"], result["duration_s"])
+                    for key, count in result["report_counts"].items():
+                        self.report_counts[key] += count
+        finally:
+            shutil.rmtree(profiles_dir, ignore_errors=True)
+
+
+# Estado de cada proceso de build_all_reports(jobs=N).
+_worker_assembler: Optional[ReportAssembler] = None
+
+
+def _init_build_worker(base_path: str, subfolder: str, caratula_cache: Optional[CaratulaCache],
+                       profiles_dir: Path, name_assignments: Optional[Dict] = None,
+                       study_plan: Optional[Dict[int, List[Dict]]] = None,
+                       virtual_split: bool = False):
+    """Inicializa el ``ReportAssembler`` del proceso worker."""
+    global _worker_assembler
+    _worker_assembler = ReportAssembler(base_path, subfolder)
+    _worker_assembler.virtual_split = virtual_split
+    _worker_assembler.caratula_cache = caratula_cache
+    _worker_assembler._name_assignments = name_assignments or {}
+    _worker_assembler._study_plan = study_plan
+    _worker_assembler._libreoffice_profile = Path(profiles_dir) / f"worker_{os.getpid()}"
+
+
+def _write_split_in_worker(master_pdf: Path, grouped_pages: Dict[str, List[int]], output_dir: Path,
+                           previous: Optional[Dict] = None) -> Tuple[str, int, Dict[str, Dict]]:
+    """Escribe los PDFs por paciente de un maestro que cambiaron respecto
+    del manifiesto ``previous`` en un proceso de ``preprocess_all_studies``
+    (ver ``write_split``). Retorna el log capturado, la cantidad de páginas
+    del maestro y los ``outputs`` del manifiesto nuevo."""
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer):
+        page_count, outputs = write_split(master_pdf, grouped_pages, output_dir, previous)
+    return buffer.getvalue(), page_count, outputs
+
+
+def _build_patient_in_worker(index: int, caratula_renderer: str, incremental: bool = False) -> Dict:
+    """Genera el reporte de un paciente en el proceso worker. Retorna un dict
+    con ``warnings``, el ``log`` capturado, ``report_counts`` (generado u
+    omitido), ``duration_s`` y ``error`` (la excepción, o None)."""
+    buffer = io.StringIO()
+    result = {"warnings": [], "log": "", "error": None, "report_counts": {}, "duration_s": None}
+    _worker_assembler.report_counts = {"generados": 0, "omitidos": 0}
+    started = time.monotonic()
+    with contextlib.redirect_stdout(buffer):
+        try:
+            result["warnings"] = _worker_assembler.build_report_for_patient(
+                index, caratula_renderer=caratula_renderer, incremental=incremental
+            )
+            result["report_counts"] = dict(_worker_assembler.report_counts)
+        except Exception as e:
+            print(f"❌ Error al generar el reporte del paciente {index}: {e}")
+            result["error"] = e
+    result["duration_s"] = time.monotonic() - started
+    result["log"] = buffer.getvalue()
+    return result
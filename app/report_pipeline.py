@@ -0,0 +1,285 @@
+"""
+Pipeline por etapas para generar los reportes de una fecha.
+
+Cada etapa corre en su propio hilo y recibe los pacientes de la anterior por
+una cola acotada: mientras un paciente se une con fitz, el siguiente está
+rasterizando sus imágenes y otro más atrás convierte su carátula. Las colas
+acotadas limitan la cantidad de pacientes en vuelo (y de PDFs intermedios en
+disco). Cada etapa lleva estadísticas de throughput y profundidad de cola.
+
+Lo que imprime cada etapa se guarda por paciente y se vuelca completo, en
+orden, cuando el paciente sale de la última etapa; así el log queda igual
+que en la generación secuencial.
+
+Uso:
+    pipeline = StagePipeline([("descubrimiento", plan), ("escritura", write)])
+    resultados = pipeline.run(range(n))
+    print(pipeline.format_stats())
+"""
+import contextlib
+import io
+import queue
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+DEFAULT_QUEUE_SIZE = 2
+
+# Marca de fin de la entrada en las colas.
+_DONE = object()
+
+
+class _ThreadLogRouter(io.TextIOBase):
+    """Reemplazo de ``sys.stdout`` que manda lo que imprime cada hilo al
+    buffer del paciente que ese hilo está procesando. Los hilos sin buffer
+    escriben en el ``sys.stdout`` que había al instalarlo."""
+
+    def __init__(self, fallback):
+        self._fallback = fallback
+        self._local = threading.local()
+
+    def set_target(self, buffer: Optional[io.StringIO]):
+        self._local.target = buffer
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        target = getattr(self._local, "target", None)
+        return (target or self._fallback).write(text)
+
+    def flush(self):
+        self._fallback.flush()
+
+
+_router_lock = threading.Lock()
+_router: Optional[_ThreadLogRouter] = None
+_router_users = 0
+
+
+@contextlib.contextmanager
+def _redirect_thread_stdout(buffer: io.StringIO):
+    """Como ``contextlib.redirect_stdout`` pero solo para el hilo actual.
+
+    ``redirect_stdout`` cambia ``sys.stdout`` para todo el proceso y, usado
+    desde varios hilos a la vez, restaura en desorden. Acá el router se
+    instala mientras haya al menos una etapa ejecutando y se retira con la
+    última; lo que imprimen los demás hilos sigue yendo a la salida original.
+    """
+    global _router, _router_users
+    with _router_lock:
+        if _router_users == 0:
+            _router = _ThreadLogRouter(sys.stdout)
+            sys.stdout = _router
+        _router_users += 1
+        router = _router
+    router.set_target(buffer)
+    try:
+        yield
+    finally:
+        router.set_target(None)
+        with _router_lock:
+            _router_users -= 1
+            if _router_users == 0:
+                # Si alguien más cambió sys.stdout mientras tanto, no se pisa.
+                if sys.stdout is router:
+                    sys.stdout = router._fallback
+                _router = None
+
+
+class StagePipeline:
+    """Ejecuta ``stages`` (lista de ``(nombre, función)``) sobre cada ítem,
+    una etapa por hilo, conectadas por colas de a lo sumo ``queue_size``
+    ítems. Cada función recibe lo que retornó la etapa anterior.
+
+    Si una etapa falla con un ítem, se llama a ``discard`` con el valor que
+    tenía (si se indicó) y a ``on_error`` con el ítem de entrada y la
+    excepción (cualquier ``BaseException``, no solo ``Exception``). Con ``stop_on_error`` los ítems que ya estaban en vuelo
+    también se descartan y ``run`` relanza la excepción después de volcar el
+    log del ítem que falló; si no, el ítem se omite de los resultados y el
+    resto sigue.
+    """
+
+    def __init__(self, stages: List[Tuple[str, Callable[[Any], Any]]],
+                 queue_size: int = DEFAULT_QUEUE_SIZE,
+                 discard: Optional[Callable[[Any], None]] = None,
+                 stop_on_error: bool = True,
+                 on_error: Optional[Callable[[Any, BaseException], None]] = None):
+        self.stages = stages
+        self.queue_size = max(1, int(queue_size))
+        self.discard = discard
+        self.stop_on_error = stop_on_error
+        self.on_error = on_error
+        self._queues: List[queue.Queue] = []
+        self._stats: List[Dict] = [
+            {"stage": name, "items": 0, "busy_s": 0.0, "wait_s": 0.0,
+             "max_queue": 0, "queue_samples": 0, "queue_total": 0}
+            for name, _ in stages
+        ]
+        self._stats_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._started_at: Optional[float] = None
+        self._elapsed: Optional[float] = None
+        self._feed_error: Optional[BaseException] = None
+
+    def run(self, items: Iterable[Any]) -> List[Any]:
+        """Procesa ``items`` y retorna el resultado de la última etapa para
+        cada uno, en el orden de entrada."""
+        self._queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        self._stop.clear()
+        self._started_at = time.monotonic()
+        self._elapsed = None
+        self._feed_error = None
+
+        threads = [threading.Thread(target=self._feed, args=(items,), name="pipeline-entrada", daemon=True)]
+        for position, (name, func) in enumerate(self.stages):
+            threads.append(threading.Thread(
+                target=self._run_stage, args=(position, func),
+                name=f"pipeline-{name}", daemon=True,
+            ))
+        for thread in threads:
+            thread.start()
+
+        results: List[Any] = []
+        error: Optional[BaseException] = None
+        finished = False
+        try:
+            while True:
+                envelope = self._queues[-1].get()
+                if envelope is _DONE:
+                    finished = True
+                    break
+                if envelope.get("skipped"):
+                    continue
+                sys.stdout.write(envelope["log"].getvalue())
+                if envelope["error"] is not None:
+                    if self.on_error is not None:
+                        self.on_error(envelope["input"], envelope["error"])
+                    if self.stop_on_error and error is None:
+                        error = envelope["error"]
+                        self._stop.set()
+                    continue
+                results.append(envelope["value"])
+        finally:
+            self._stop.set()
+            if not finished:
+                # Si on_error (o una interrupción) cortó el ciclo, se vacía
+                # la última cola para que ninguna etapa quede bloqueada.
+                self._drain(self._queues[-1])
+            for thread in threads:
+                thread.join()
+            self._elapsed = time.monotonic() - self._started_at
+
+        if error is None:
+            error = self._feed_error
+        if error is not None:
+            raise error
+        return results
+
+    def _feed(self, items: Iterable[Any]):
+        try:
+            for item in items:
+                if self._stop.is_set():
+                    break
+                self._queues[0].put({"input": item, "value": item, "log": io.StringIO(), "error": None})
+        except BaseException as e:
+            # Un iterable de entrada que falla corta la corrida como un
+            # error de etapa con stop_on_error.
+            self._feed_error = e
+            self._stop.set()
+        finally:
+            self._queues[0].put(_DONE)
+
+    def _run_stage(self, position: int, func: Callable[[Any], Any]):
+        inbox = self._queues[position]
+        outbox = self._queues[position + 1]
+        stats = self._stats[position]
+        # _DONE sale siempre por el finally: el ciclo de run nunca queda
+        # esperando una etapa que terminó.
+        try:
+            while True:
+                waited = time.monotonic()
+                envelope = inbox.get()
+                depth = inbox.qsize()
+                with self._stats_lock:
+                    stats["wait_s"] += time.monotonic() - waited
+                    stats["queue_samples"] += 1
+                    stats["queue_total"] += depth
+                    stats["max_queue"] = max(stats["max_queue"], depth + 1)
+                if envelope is _DONE:
+                    return
+
+                if envelope["error"] is None and not envelope.get("skipped"):
+                    if self._stop.is_set():
+                        envelope["skipped"] = True
+                        self._discard(envelope["value"])
+                    else:
+                        started = time.monotonic()
+                        with _redirect_thread_stdout(envelope["log"]):
+                            try:
+                                envelope["value"] = func(envelope["value"])
+                            except BaseException as e:
+                                print(f"❌ Falló la etapa {stats['stage']}: {e}")
+                                envelope["error"] = e
+                                self._discard(envelope["value"])
+                        with self._stats_lock:
+                            stats["items"] += 1
+                            stats["busy_s"] += time.monotonic() - started
+                outbox.put(envelope)
+        finally:
+            outbox.put(_DONE)
+
+    def _drain(self, inbox: queue.Queue):
+        """Consume ``inbox`` hasta ``_DONE`` descartando los ítems que
+        llegan y que ya nadie va a usar."""
+        while True:
+            envelope = inbox.get()
+            if envelope is _DONE:
+                return
+            if envelope["error"] is None and not envelope.get("skipped"):
+                self._discard(envelope["value"])
+
+    def _discard(self, value: Any):
+        if self.discard is None:
+            return
+        try:
+            self.discard(value)
+        except Exception:
+            pass
+
+    def stats(self) -> List[Dict]:
+        """Estadísticas por etapa: ítems procesados, tiempo ocupado y en
+        espera, throughput (ítems/s ocupados), profundidad actual, máxima y
+        promedio de la cola de entrada. Se puede consultar durante ``run``."""
+        snapshot = []
+        with self._stats_lock:
+            for position, stats in enumerate(self._stats):
+                depth = self._queues[position].qsize() if self._queues else 0
+                snapshot.append({
+                    "stage": stats["stage"],
+                    "items": stats["items"],
+                    "busy_s": round(stats["busy_s"], 3),
+                    "wait_s": round(stats["wait_s"], 3),
+                    "items_per_s": round(stats["items"] / stats["busy_s"], 2) if stats["busy_s"] else None,
+                    "queue_depth": depth,
+                    "max_queue": stats["max_queue"],
+                    "avg_queue": round(stats["queue_total"] / stats["queue_samples"], 2)
+                    if stats["queue_samples"] else 0.0,
+                })
+        return snapshot
+
+    def format_stats(self) -> str:
+        """Resumen de ``stats()`` en texto, para los logs."""
+        lines = ["📊 Etapas del pipeline:"]
+        for stats in self.stats():
+            rate = f"{stats['items_per_s']:.2f}/s" if stats["items_per_s"] is not None else "-"
+            lines.append(
+                f"   {stats['stage']:<15} {stats['items']:>4} ítems  ocupada {stats['busy_s']:>7.2f}s  "
+                f"espera {stats['wait_s']:>7.2f}s  {rate:>9}  cola máx {stats['max_queue']} "
+                f"prom {stats['avg_queue']:.2f}"
+            )
+        if self._elapsed is not None:
+            lines.append(f"   total {self._elapsed:.2f}s")
+        return "\n".join(lines)
@@ -0,0 +1,174 @@
+"""
+Bitácora de corridas de ``build_all_reports`` en SQLite.
+
+Cada corrida registra el estado de cada paciente (``pending``, ``running``,
+``done`` o ``failed``) con sus warnings, el error y la duración, y se
+actualiza a medida que avanza. Si la corrida se corta (reinicio del
+contenedor, LibreOffice colgado) se puede reanudar con los pacientes que no
+terminaron, o reintentar solo los que fallaron.
+
+El archivo vive en ``OUTPUT/<fecha>/.run_journal.sqlite``.
+"""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+JOURNAL_NAME = ".run_journal.sqlite"
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Modos de corrida de build_all_reports y estados que vuelve a procesar cada uno.
+RUN_MODES = {
+    "nueva": None,
+    "reanudar": (PENDING, RUNNING, FAILED),
+    "reintentar_fallidos": (FAILED,),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    options TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS patients (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    idx INTEGER NOT NULL,
+    dni TEXT NOT NULL,
+    state TEXT NOT NULL,
+    warnings TEXT NOT NULL DEFAULT '[]',
+    error TEXT,
+    started_at REAL,
+    duration_s REAL,
+    PRIMARY KEY (run_id, idx)
+);
+"""
+
+
+class RunJournal:
+    """Bitácora SQLite de las corridas de una fecha. Se puede usar desde
+    varios hilos (las etapas del pipeline) a la vez."""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start_run(self, patients: List[Tuple[int, str]], options: Optional[Dict] = None) -> int:
+        """Crea una corrida con ``patients`` (lista de ``(índice, dni)``)
+        en estado ``pending`` y retorna su id."""
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO runs (started_at, options) VALUES (?, ?)",
+                (time.time(), json.dumps(options or {})),
+            )
+            run_id = cur.lastrowid
+            self._conn.executemany(
+                "INSERT INTO patients (run_id, idx, dni, state) VALUES (?, ?, ?, ?)",
+                [(run_id, idx, dni, PENDING) for idx, dni in patients],
+            )
+        return run_id
+
+    def reopen_run(self, run_id: int, states: Tuple[str, ...]) -> List[int]:
+        """Vuelve a ``pending`` los pacientes de ``run_id`` en ``states`` y
+        retorna sus índices."""
+        placeholders = ",".join("?" for _ in states)
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                f"SELECT idx FROM patients WHERE run_id = ? AND state IN ({placeholders}) ORDER BY idx",
+                (run_id, *states),
+            ).fetchall()
+            self._conn.execute(
+                f"UPDATE patients SET state = ?, error = NULL WHERE run_id = ? AND state IN ({placeholders})",
+                (PENDING, run_id, *states),
+            )
+            self._conn.execute("UPDATE runs SET finished_at = NULL WHERE run_id = ?", (run_id,))
+        return [row["idx"] for row in rows]
+
+    def latest_run(self) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM runs ORDER BY run_id DESC LIMIT 1").fetchone()
+        if row is None:
+            return None
+        run = dict(row)
+        run["options"] = json.loads(run["options"])
+        return run
+
+    def finish_run(self, run_id: int):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), run_id))
+
+    def mark_running(self, run_id: int, idx: int):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE patients SET state = ?, started_at = ? WHERE run_id = ? AND idx = ?",
+                (RUNNING, time.time(), run_id, idx),
+            )
+
+    def mark_done(self, run_id: int, idx: int, warnings: List[str], duration_s: Optional[float] = None):
+        self._finish_patient(run_id, idx, DONE, warnings, None, duration_s)
+
+    def mark_failed(self, run_id: int, idx: int, error: str, duration_s: Optional[float] = None):
+        self._finish_patient(run_id, idx, FAILED, [], error, duration_s)
+
+    def _finish_patient(self, run_id: int, idx: int, state: str, warnings: List[str],
+                        error: Optional[str], duration_s: Optional[float]):
+        """Sin ``duration_s`` la duración se calcula desde ``mark_running``."""
+        now = time.time()
+        with self._lock, self._conn:
+            if duration_s is None:
+                row = self._conn.execute(
+                    "SELECT started_at FROM patients WHERE run_id = ? AND idx = ?", (run_id, idx)
+                ).fetchone()
+                if row is not None and row["started_at"] is not None:
+                    duration_s = now - row["started_at"]
+            self._conn.execute(
+                "UPDATE patients SET state = ?, warnings = ?, error = ?, duration_s = ? "
+                "WHERE run_id = ? AND idx = ?",
+                (state, json.dumps(warnings, ensure_ascii=False), error, duration_s, run_id, idx),
+            )
+
+    def patients(self, run_id: int) -> List[Dict]:
+        """Pacientes de la corrida, en orden de índice."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM patients WHERE run_id = ? ORDER BY idx", (run_id,)
+            ).fetchall()
+        patients = []
+        for row in rows:
+            patient = dict(row)
+            patient["warnings"] = json.loads(patient["warnings"])
+            patients.append(patient)
+        return patients
+
+    def summary(self, run_id: int) -> Dict[str, int]:
+        """Cantidad de pacientes por estado en la corrida."""
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) AS n FROM patients WHERE run_id = ? GROUP BY state", (run_id,)
+            ).fetchall()
+        for row in rows:
+            counts[row["state"]] = row["n"]
+        return counts
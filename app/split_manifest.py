@@ -0,0 +1,228 @@
+"""
+Manifiesto de la separación de cada PDF maestro, para no volver a separarlo
+si no cambió.
+
+Por cada estudio separado se guarda ``<fecha>/.split_manifests/<ESTUDIO>.json``
+con el maestro (ruta, tamaño, mtime y SHA-256), su cantidad de páginas, la
+versión de las reglas de ``app.page_classifier``, la zona del encabezado
+leída (la configurada en ``config/split_regions.json`` y la usada, quizás
+calibrada) y los PDFs generados: por cada clave, sus páginas del maestro y
+una huella de su contenido.
+
+- Maestro sin cambios y PDFs en su lugar: no se hace nada.
+- Maestro sin cambios pero falta algún PDF: se reescriben solo esos, con las
+  páginas guardadas (sin volver a leer el texto del maestro).
+- Maestro cambiado (un proveedor reenvía el PDF corregido) o zona
+  configurada distinta: se vuelve a clasificar y se reescriben solo los PDFs cuyas páginas cambiaron; los de
+  claves que ya no están se borran.
+
+La huella de un PDF es el SHA-256 del contenido de sus páginas en el maestro
+y de sus recursos (imágenes, fuentes, formularios), así que un paciente cuyas
+páginas solo se corrieron de lugar no se reescribe, pero sí uno cuyo escaneo
+cambió.
+El texto ya extraído de las páginas del maestro se copia a los PDFs escritos
+(ver ``app.page_text_cache``).
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import fitz
+
+from app.converters import write_page_groups
+from app.page_classifier import CLASSIFIER_VERSION, Region
+from app.page_text_cache import default_page_text_cache, document_key
+from app.split_regions import load_split_regions, region_json
+
+
+SPLIT_MANIFESTS_DIRNAME = ".split_manifests"
+
+# Cambiarla invalida todos los manifiestos de separación.
+SPLIT_MANIFEST_VERSION = 2
+
+_REFERENCE_RE = re.compile(r"(\d+) 0 R")
+_PARENT_RE = re.compile(r"/Parent\s+\d+ 0 R")
+
+
+def _object_digest(doc: "fitz.Document", xref: int, memo: Dict[int, str], active: Optional[set] = None) -> str:
+    """SHA-256 del objeto ``xref`` de ``doc`` con todo lo que referencia: su
+    fuente (cada referencia reemplazada por la huella del objeto, así no
+    depende de los números de xref del archivo) y los bytes de su stream."""
+    if xref in memo:
+        return memo[xref]
+    active = set() if active is None else active
+    if xref in active:
+        # Referencia circular: basta con que sea estable
+        return "ciclo"
+    active.add(xref)
+    source = _PARENT_RE.sub("", doc.xref_object(xref, compressed=True))
+    digest = hashlib.sha256(_resolve_references(doc, source, memo, active).encode("utf-8"))
+    if doc.xref_is_stream(xref):
+        digest.update(doc.xref_stream_raw(xref) or b"")
+    active.discard(xref)
+    memo[xref] = digest.hexdigest()
+    return memo[xref]
+
+
+def _resolve_references(doc: "fitz.Document", source: str, memo: Dict[int, str], active: set) -> str:
+    return _REFERENCE_RE.sub(lambda m: _object_digest(doc, int(m.group(1)), memo, active), source)
+
+
+def _page_resources(doc: "fitz.Document", page_xref: int, memo: Dict[int, str]) -> str:
+    """Huella de los recursos de una página (los heredados del árbol de
+    páginas si no tiene propios)."""
+    xref = page_xref
+    while xref:
+        kind, value = doc.xref_get_key(xref, "Resources")
+        if kind == "xref":
+            return _object_digest(doc, int(value.split()[0]), memo)
+        if kind == "dict":
+            return _resolve_references(doc, value, memo, set())
+        kind, value = doc.xref_get_key(xref, "Parent")
+        xref = int(value.split()[0]) if kind == "xref" else 0
+    return ""
+
+
+def pages_fingerprint(doc: "fitz.Document", pages: List[int]) -> str:
+    """SHA-256 del contenido y los recursos de ``pages`` de ``doc``, en ese
+    orden."""
+    digest = hashlib.sha256()
+    memo: Dict[int, str] = {}
+    for p in pages:
+        page = doc[p]
+        digest.update(page.read_contents())
+        digest.update(b"\0")
+        digest.update(_page_resources(doc, page.xref, memo).encode("ascii"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SplitManifestStore:
+    """Manifiestos de separación de los maestros de una fecha, uno por
+    estudio."""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+
+    def _path_for(self, study: str) -> Path:
+        return self.directory / f"{study}.json"
+
+    def read(self, study: str) -> Optional[Dict]:
+        """Último manifiesto guardado de ``study``, cambie o no su maestro."""
+        try:
+            with open(self._path_for(study), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if entry.get("version") != SPLIT_MANIFEST_VERSION \
+                or entry.get("classifier_version") != CLASSIFIER_VERSION:
+            return None
+        return entry
+
+    def get(self, study: str, master_pdf: Path, method: str,
+            regions: Optional[Dict[str, Optional[Region]]] = None) -> Optional[Dict]:
+        """Manifiesto de ``study`` si se separó ``master_pdf`` tal como está
+        ahora, con el mismo ``method`` y la misma zona configurada
+        (``regions``, por defecto ``load_split_regions()``); si no, None. Si
+        solo cambió el mtime (mismo SHA-256), lo actualiza."""
+        entry = self.read(study)
+        if entry is None or entry.get("master") != str(master_pdf) or entry.get("method") != method:
+            return None
+        regions = load_split_regions() if regions is None else regions
+        if entry.get("region_config") != region_json(regions.get(study.upper())):
+            return None
+        try:
+            stat = Path(master_pdf).stat()
+        except FileNotFoundError:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) == (entry["size"], entry["mtime_ns"]):
+            return entry
+        if stat.st_size != entry["size"] or document_key(master_pdf) != entry["sha256"]:
+            return None
+        entry = dict(entry, mtime_ns=stat.st_mtime_ns)
+        self._write(study, entry)
+        return entry
+
+    def save(self, study: str, master_pdf: Path, method: str, study_dir: Path,
+             page_count: int, outputs: Dict[str, Dict], region: Optional[Region] = None,
+             regions: Optional[Dict[str, Optional[Region]]] = None) -> Dict:
+        """Guarda el manifiesto de ``study``, separado leyendo ``region`` de
+        cada página, (escritura atómica) y lo retorna."""
+        stat = Path(master_pdf).stat()
+        regions = load_split_regions() if regions is None else regions
+        entry = {
+            "version": SPLIT_MANIFEST_VERSION,
+            "classifier_version": CLASSIFIER_VERSION,
+            "region_config": region_json(regions.get(study.upper())),
+            "region": region_json(region),
+            "study": study,
+            "master": str(master_pdf),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": document_key(master_pdf),
+            "page_count": page_count,
+            "method": method,
+            "study_dir": str(study_dir),
+            "outputs": outputs,
+        }
+        self._write(study, entry)
+        return entry
+
+    def _write(self, study: str, entry: Dict):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_name, self._path_for(study))
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+
+def missing_outputs(entry: Dict) -> List[str]:
+    """Claves de ``entry`` cuyo PDF separado ya no está en disco."""
+    study_dir = Path(entry["study_dir"])
+    return [key for key in entry["outputs"] if not (study_dir / f"{key}.pdf").exists()]
+
+
+def write_split(master_pdf: Path, grouped_pages: Dict[str, List[int]], study_dir: Path,
+                previous: Optional[Dict] = None) -> Tuple[int, Dict[str, Dict]]:
+    """Escribe en ``study_dir`` los PDFs de ``grouped_pages`` que faltan o
+    cuyas páginas cambiaron respecto de ``previous`` (el manifiesto
+    anterior) y borra los de claves de ``previous`` que ya no están.
+
+    Retorna la cantidad de páginas del maestro y los ``outputs`` del nuevo
+    manifiesto.
+    """
+    old_outputs = previous["outputs"] if previous else {}
+    with fitz.open(master_pdf) as doc:
+        page_count = doc.page_count
+        outputs = {
+            key: {"pages": pages, "fingerprint": pages_fingerprint(doc, pages)}
+            for key, pages in grouped_pages.items()
+        }
+
+    changed = {
+        key: grouped_pages[key] for key, output in outputs.items()
+        if old_outputs.get(key, {}).get("fingerprint") != output["fingerprint"]
+        or not (study_dir / f"{key}.pdf").exists()
+    }
+    if changed:
+        write_page_groups(master_pdf, changed, study_dir)
+        cache = default_page_text_cache()
+        if cache is not None:
+            master_key = document_key(master_pdf)
+            for key, pages in changed.items():
+                cache.seed_pages(master_key, pages, document_key(study_dir / f"{key}.pdf"))
+    if len(changed) < len(outputs):
+        print(f"♻️ {len(outputs) - len(changed)} PDFs sin cambios en {study_dir.name}")
+
+    for key in old_outputs.keys() - outputs.keys():
+        (study_dir / f"{key}.pdf").unlink(missing_ok=True)
+        print(f"🗑️ Eliminado: {key}.pdf (ya no está en {master_pdf.name})")
+    return page_count, outputs
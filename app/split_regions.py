@@ -0,0 +1,94 @@
+"""
+Zonas de la página donde se busca el DNI o el nombre al separar los PDFs
+maestros.
+
+El DNI y el nombre del paciente están siempre en el encabezado, pero leer
+el texto de la página completa en maestros con gráficos (ergometrías, EEG)
+es lo más caro de la separación. ``config/split_regions.json`` define por
+estudio la zona a leer, en fracciones del ancho y alto de la página
+(``[x0, y0, x1, y1]``). Un estudio sin zona configurada se calibra con sus
+primeras páginas: se usa la franja superior más chica que da la misma clave
+que la página completa. Si ninguna franja sirve se lee la página completa,
+y en cualquier página donde la zona no tenga la clave también.
+"""
+import json
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import fitz
+
+from app.page_classifier import PAGE_RULES, Region, page_text
+
+
+SPLIT_REGIONS_PATH = Path(__file__).resolve().parent.parent / "config" / "split_regions.json"
+
+# Franjas superiores que prueba la calibración (fracción del alto), de la
+# más chica a la más grande.
+CALIBRATION_BANDS = (0.15, 0.25, 0.4, 0.6)
+
+# Páginas con clave que usa la calibración.
+CALIBRATION_PAGES = 3
+
+
+def load_split_regions(config_path: Optional[Path] = None) -> Dict[str, Optional[Region]]:
+    """Zonas configuradas por estudio (None = calibrar)."""
+    config_path = config_path or SPLIT_REGIONS_PATH
+    try:
+        with open(config_path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError as e:
+        print(f"⚠️ Error al cargar zonas de separación: {e}")
+        return {}
+    return {
+        study.upper(): tuple(region) if region else None
+        for study, region in data.get("regiones", {}).items()
+    }
+
+
+def region_json(region: Optional[Region]) -> Optional[List[float]]:
+    """``region`` como se guarda en los mapas y manifiestos (JSON)."""
+    return list(region) if region is not None else None
+
+
+def calibrate_region(doc: "fitz.Document", method: str,
+                     pages: int = CALIBRATION_PAGES) -> Optional[Region]:
+    """Franja superior más chica de ``CALIBRATION_BANDS`` en la que las
+    primeras ``pages`` páginas con clave dan la misma clave que leyendo la
+    página completa. None si no hay páginas con clave o ninguna franja
+    sirve."""
+    rules = PAGE_RULES[method]
+    page_format = rules.document_format(doc)
+    key_of = lambda text: rules.key(text, page_format)
+    samples = []
+    for page in doc:
+        key = key_of(page_text(page))
+        if key is not None:
+            samples.append((page, key))
+            if len(samples) == pages:
+                break
+    if not samples:
+        return None
+    for band in CALIBRATION_BANDS:
+        region = (0.0, 0.0, 1.0, band)
+        if all(key_of(page_text(page, region)) == key for page, key in samples):
+            return region
+    return None
+
+
+def split_region(study: str, doc: "fitz.Document", method: str,
+                 regions: Optional[Dict[str, Optional[Region]]] = None) -> Optional[Region]:
+    """Zona a leer de las páginas del maestro ``doc`` de ``study``: la
+    configurada o, si no hay, la calibrada. None = página completa."""
+    if regions is None:
+        regions = load_split_regions()
+    region = regions.get(study.upper())
+    if region is not None:
+        return region
+    region = calibrate_region(doc, method)
+    if region is None:
+        print(f"📐 {study}: sin zona de encabezado, se lee la página completa")
+    else:
+        print(f"📐 {study}: zona de encabezado calibrada {region}")
+    return region
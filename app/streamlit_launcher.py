@@ -3,6 +3,7 @@ from PIL import Image
 
 from pathlib import Path
 from app.report_assembler import ReportAssembler
+import os
 import sys
 import io
 
@@ -59,12 +60,54 @@ def mostrar_compilador(assembler: ReportAssembler, df, modo=None, selected_index
         2. Elegí si querés compilar los informes de todos los pacientes o los de uno solo.
         3. Si seleccionás compilar por paciente, elegí el nombre desde el desplegable.
         4. Hacé click en **Discriminar estudios por paciente** para separar los PDFs generales.
-        5. Hacé click en **Compilar resultados por paciente** para generar un informe médico único.
+        5. Opcional: hacé click en **Verificar estudios** para ver, sin compilar, a qué pacientes les faltan estudios.
+        6. Hacé click en **Compilar resultados por paciente** para generar un informe médico único.
         """)
     
     # Obtener configuración del sidebar si no se pasó
     if modo is None:
         modo, selected_index = obtener_configuracion_sidebar(assembler, df)
+
+    motor_caratulas = st.sidebar.radio(
+        "Motor de carátulas",
+        ["LibreOffice", "Nativo (rápido)"],
+        help="El motor nativo dibuja la carátula sin LibreOffice; si la planilla usa algo que no soporta, se convierte con LibreOffice igual."
+    )
+    caratula_renderer = "native" if motor_caratulas.startswith("Nativo") else "libreoffice"
+    assembler.virtual_split = st.sidebar.checkbox(
+        "Separación virtual de estudios",
+        value=assembler.virtual_split,
+        help="Al discriminar no se escribe un PDF por paciente: se guarda qué páginas de cada PDF general son de cada paciente y al compilar se copian directo del PDF general."
+    )
+
+    jobs = 1
+    recompilar_todo = False
+    run_mode = "nueva"
+    if modo != "Un solo paciente":
+        modos_corrida = {
+            "Corrida nueva": "nueva",
+            "Reanudar la última corrida": "reanudar",
+            "Reintentar solo pacientes fallidos": "reintentar_fallidos",
+        }
+        corrida = st.sidebar.radio(
+            "Corrida",
+            list(modos_corrida),
+            help="Reanudar procesa los pacientes que no terminaron en la última corrida (por ejemplo, si se reinició el contenedor)."
+        )
+        run_mode = modos_corrida[corrida]
+        recompilar_todo = st.sidebar.checkbox(
+            "Recompilar todos los informes",
+            value=False,
+            help="Por defecto solo se regeneran los informes cuyos estudios, carátula o fila del Excel cambiaron desde la última compilación."
+        )
+        jobs = st.sidebar.number_input(
+            "Procesos en paralelo",
+            min_value=1,
+            max_value=os.cpu_count() or 1,
+            value=1,
+            step=1,
+            help="Cantidad de pacientes que se compilan a la vez. Con 1 se compila de a uno, como siempre."
+        )
     
     # Compilar estudios
     _, col4, col5, _ = st.columns([0.5, 3, 3, 0.5])
@@ -75,20 +118,28 @@ def mostrar_compilador(assembler: ReportAssembler, df, modo=None, selected_index
     with col5:
         compilar_clicked = st.button("📄 2. Compilar resultados por paciente")
 
-    if discriminar_clicked:
-        studies_by_dni = ["LABORATORIO", "AUDIOMETRIA", "ERGOMETRIA"]
-        studies_by_name = ["EEG", "PSICOS", "ESPIROMETRIA"]
+    verificar_clicked = st.button(
+        "🗺️ Verificar estudios (sin compilar)",
+        help="Busca los estudios de cada paciente sin generar informes y muestra cuáles faltan."
+    )
 
+    if verificar_clicked:
         buffer = io.StringIO()
         sys.stdout = buffer
+        try:
+            indices = [int(selected_index)] if modo == "Un solo paciente" else None
+            st.session_state.plan_estudios = assembler.plan_reports(indices)
+        finally:
+            sys.stdout = sys.__stdout__
+            st.session_state.logs_compilacion = buffer.getvalue()
+            st.session_state.accion_realizada = True
 
-        for study in studies_by_dni:
-            print(f"\n{'✂️'*3} Separando {study.lower()} por paciente {'✂️'*3}\n")
-            assembler.preprocess_study_results_by_dni(study)
+    if discriminar_clicked:
+        buffer = io.StringIO()
+        sys.stdout = buffer
 
-        for study in studies_by_name:
-            print(f"\n{'✂️'*3} Separando {study.lower()} por paciente {'✂️'*3}\n")
-            assembler.preprocess_study_results_by_name(study)
+        # Los seis PDFs generales se separan a la vez, en procesos aparte.
+        assembler.preprocess_all_studies()
 
         sys.stdout = sys.__stdout__
         st.session_state.logs_discriminacion = buffer.getvalue()
@@ -100,9 +151,25 @@ def mostrar_compilador(assembler: ReportAssembler, df, modo=None, selected_index
 
         try:
             if modo == "Un solo paciente":
-                warnings = assembler.build_report_for_patient(selected_index)
+                warnings = assembler.build_report_for_patient(selected_index, caratula_renderer=caratula_renderer)
             else:
-                warnings = assembler.build_all_reports()
+                warnings = assembler.build_all_reports(
+                    caratula_renderer=caratula_renderer,
+                    jobs=int(jobs),
+                    incremental=not recompilar_todo,
+                    run_mode=run_mode,
+                )
+                conteo = assembler.report_counts
+                if conteo["fallidos"]:
+                    st.error(
+                        f"❌ {conteo['fallidos']} informes fallaron. Se pueden reintentar con "
+                        f"\"Reintentar solo pacientes fallidos\"."
+                    )
+                if conteo["omitidos"]:
+                    st.info(
+                        f"⏭️ {conteo['omitidos']} informes sin cambios se omitieron; "
+                        f"{conteo['generados']} se generaron."
+                    )
             st.session_state.compilation_warnings = warnings if warnings else []
         except Exception as e:
             print(f"❌ Error al compilar informes: {e}")
@@ -126,6 +193,16 @@ def mostrar_compilador(assembler: ReportAssembler, df, modo=None, selected_index
 {st.session_state.logs_compilacion}
 ```""")
 
+    plan_estudios = st.session_state.get("plan_estudios")
+    if plan_estudios is not None and not plan_estudios.empty:
+        con_faltantes = plan_estudios[(plan_estudios["faltantes"] > 0) | ~plan_estudios["caratula"]]
+        with st.expander("🗺️ Estudios esperados vs. encontrados", expanded=True):
+            if con_faltantes.empty:
+                st.success(f"✅ Los {len(plan_estudios)} pacientes tienen todos sus estudios y su carátula.")
+            else:
+                st.warning(f"⚠️ {len(con_faltantes)} de {len(plan_estudios)} pacientes con estudios faltantes o sin carátula.")
+            st.dataframe(plan_estudios, use_container_width=True, hide_index=True)
+
     # Mostrar warnings de compilacion (estudios faltantes, fuzzy matches, etc.)
     if st.session_state.get("compilation_warnings"):
         with st.expander("⚠️ Advertencias de compilación", expanded=True):
@@ -141,6 +218,7 @@ def mostrar_compilador(assembler: ReportAssembler, df, modo=None, selected_index
             st.session_state.logs_compilacion = ""
             st.session_state.accion_realizada = False
             st.session_state.compilation_warnings = []
+            st.session_state.plan_estudios = None
             st.rerun()
 
 
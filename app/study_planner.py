@@ -0,0 +1,161 @@
+"""
+Planificador vectorizado de estudios sobre el Excel maestro.
+
+En vez de resolver los estudios fila por fila (``df_master.iloc[index]`` y
+una búsqueda por estudio), ``plan_studies`` explota los tokens de DETALLE a
+través de ``study_map`` en una tabla larga (paciente × estudio) y la cruza
+con pandas contra el índice de la carpeta de la fecha:
+
+- LABORATORIO y AUDIOMETRIA por DNI limpio (``<DNI>.pdf``),
+- RX por DNI encontrado en el nombre de la subcarpeta,
+- PSICOS por nombre normalizado del paciente (``normalize_name``) contra los
+  nombres normalizados de los PDFs del split: gana el archivo con el nombre
+  exacto (``APELLIDO_NOMBRE.pdf``); si no hay, uno solo que coincida sin
+  acentos ni espacios de más y que no coincida con otro paciente.
+
+Las filas que no se resuelven con un cruce exacto (ECG, EEG, ESPIROMETRIA y
+ERGOMETRIA, que dependen de patrones y fuzzy matching, o un estudio no
+encontrado) quedan con ``resolved=False`` y ``ReportAssembler`` las busca
+con la lógica de siempre.
+"""
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+
+from app.folder_index import FolderIndex, _DNI_IN_NAME_RE
+from app.fuzzy_match import normalize_name
+
+
+PLAN_COLUMNS = [
+    "idx", "token_pos", "token", "study_pos", "study", "dni", "apellido", "nombre",
+    "nombre_normalizado", "resolved", "kind", "path", "inputs", "output_name",
+]
+
+
+def explode_patient_studies(df: pd.DataFrame, study_map: Dict[str, List[str]]) -> pd.DataFrame:
+    """Tabla larga con una fila por (paciente, estudio), en el orden de los
+    tokens de DETALLE y de ``study_map``. ``idx`` es la posición del paciente
+    en ``df``; dni, apellido y nombre quedan como los usa
+    ``plan_patient_report``."""
+    patients = pd.DataFrame({
+        "idx": range(len(df)),
+        "dni": df["DNI"].astype(str).str.strip().str.replace(".", "", regex=False).to_numpy(),
+        "apellido": df["APELLIDOS"].astype(str).str.strip().str.replace(" ", "_", regex=False).to_numpy(),
+        "nombre": df["NOMBRES"].to_numpy(),
+        "token": df["DETALLE"].str.upper().str.replace(",", "", regex=False).str.split("+").to_numpy(),
+    })
+    long = patients.explode("token", ignore_index=True)
+    long["token"] = long["token"].str.strip()
+    long["token_pos"] = long.groupby("idx").cumcount()
+
+    studies = pd.DataFrame(
+        [(token, position, study.upper())
+         for token, token_studies in study_map.items()
+         for position, study in enumerate(token_studies)],
+        columns=["token", "study_pos", "study"],
+    )
+    long = long.merge(studies, on="token", how="inner")
+    long = long.sort_values(["idx", "token_pos", "study_pos"], kind="stable").reset_index(drop=True)
+
+    has_name = long["nombre"].map(lambda n: isinstance(n, str) and bool(n.strip())) & (long["apellido"] != "")
+    full_name = long["apellido"].str.replace("_", " ", regex=False).str.strip() + " " \
+        + long["nombre"].where(has_name, "").astype(str).str.strip()
+    long["nombre_normalizado"] = full_name.where(has_name).map(
+        lambda n: normalize_name(n) if isinstance(n, str) else None
+    )
+    long["_archivo_nombre"] = full_name.str.upper().str.replace(" ", "_", regex=False).where(has_name) + ".pdf"
+    return long
+
+
+def _files_by_normalized_name(folder_index: FolderIndex, directory: Path) -> pd.DataFrame:
+    """PDFs de ``directory`` con el nombre normalizado de su stem como
+    columna ``nombre_normalizado``."""
+    paths = folder_index.glob(directory, "*.pdf")
+    return pd.DataFrame({
+        "nombre_normalizado": [folder_index.normalized_stem(p) for p in paths],
+        "_archivo": paths,
+    }, columns=["nombre_normalizado", "_archivo"], dtype=object)
+
+
+def _unambiguous_name_matches(matched: pd.DataFrame) -> pd.DataFrame:
+    """Un archivo por fila de los cruces por nombre normalizado: el de
+    nombre exacto (``_archivo_nombre``) o, si no hay, el único candidato,
+    siempre que ningún otro paciente lo reclame."""
+    exact = matched[matched["_archivo"].map(lambda path: path.name) == matched["_archivo_nombre"]]
+    others = matched[~matched.index.isin(exact.index) & ~matched["_archivo"].isin(set(exact["_archivo"]))]
+    others = others[~others.index.duplicated(keep=False)]
+    others = others[others.groupby("_archivo")["idx"].transform("nunique") == 1]
+    return pd.concat([exact, others])
+
+
+def _files_by_stem(folder_index: FolderIndex, directory: Path, key: str) -> pd.DataFrame:
+    """PDFs de ``directory`` con su stem como columna ``key``. Las tablas de
+    archivos son siempre ``object``, aunque estén vacías: pandas no cruza
+    una columna de texto con una vacía (``float64``)."""
+    paths = folder_index.glob(directory, "*.pdf")
+    return pd.DataFrame({key: [p.stem for p in paths], "_archivo": paths}, columns=[key, "_archivo"], dtype=object)
+
+
+def _rx_folders(folder_index: FolderIndex, rx_root: Path) -> pd.DataFrame:
+    """Primera subcarpeta de RX (por nombre) para cada DNI en su nombre, con
+    sus JPGs."""
+    rows = [(number, folder)
+            for folder in folder_index.dirs(rx_root)
+            for number in _DNI_IN_NAME_RE.findall(folder.name)]
+    folders = pd.DataFrame(rows, columns=["dni", "_carpeta"], dtype=object)
+    folders = folders.sort_values(["dni", "_carpeta"]).drop_duplicates("dni")
+    folders["_jpgs"] = folders["_carpeta"].map(lambda folder: folder_index.glob(folder, "*.jpg"))
+    return folders[folders["_jpgs"].map(len) > 0]
+
+
+def plan_studies(df: pd.DataFrame, study_map: Dict[str, List[str]], folder_index: FolderIndex,
+                 base_path: Path, fecha_folder: Path) -> pd.DataFrame:
+    """Plan de estudios de todos los pacientes de ``df`` en una pasada.
+
+    Retorna la tabla larga de ``explode_patient_studies`` con las columnas
+    de ``PLAN_COLUMNS``: para las filas ``resolved``, ``kind``/``path``/
+    ``inputs`` son los de ``resolve_required_studies``; ``output_name`` es
+    el nombre del PDF a generar en el directorio de trabajo del paciente
+    (RX y audiometría).
+    """
+    long = explode_patient_studies(df, study_map)
+
+    def join(study: str, key: str, matched: pd.DataFrame, mask: pd.Series = None,
+             columns: List[str] = ()) -> pd.DataFrame:
+        """Filas de ``study`` que cruzan con ``matched`` por ``key`` (con las
+        ``columns`` de ``long`` que se pidan), indexadas como en ``long``."""
+        selected = long["study"] == study
+        if mask is not None:
+            selected &= mask
+        return long.loc[selected, [key, *columns]].reset_index().merge(matched, on=key).set_index("index")
+
+    found = []
+
+    lab = join("LABORATORIO", "dni", _files_by_stem(folder_index, fecha_folder / "LABORATORIO", "dni"))
+    found.append(pd.DataFrame({"kind": "pdf", "path": lab["_archivo"]}, index=lab.index))
+
+    audio = join("AUDIOMETRIA", "dni", _files_by_stem(folder_index, fecha_folder / "AUDIOMETRIA", "dni"))
+    found.append(pd.DataFrame({
+        "kind": "audiometria",
+        "inputs": audio["_archivo"].map(lambda path: [path]),
+        "output_name": "audiometria_" + audio["dni"] + ".pdf",
+    }, index=audio.index))
+
+    rx = join("RX", "dni", _rx_folders(folder_index, base_path / f"RX {base_path.name}"))
+    found.append(pd.DataFrame({
+        "kind": "rx",
+        "inputs": rx["_jpgs"],
+        "output_name": "rx_" + rx["dni"] + ".pdf",
+    }, index=rx.index))
+
+    psicos = _unambiguous_name_matches(join(
+        "PSICOS", "nombre_normalizado", _files_by_normalized_name(folder_index, fecha_folder / "PSICOS"),
+        mask=long["nombre_normalizado"].notna(), columns=["idx", "_archivo_nombre"],
+    ))
+    found.append(pd.DataFrame({"kind": "pdf", "path": psicos["_archivo"]}, index=psicos.index))
+
+    resolved = pd.concat(found, sort=False).reindex(columns=["kind", "path", "inputs", "output_name"])
+    long = long.join(resolved)
+    long["resolved"] = long["kind"].notna()
+    return long[PLAN_COLUMNS]
@@ -0,0 +1,11 @@
+import pytest
+
+from app import page_text_cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_page_text_cache(tmp_path, monkeypatch):
+    """Cada test usa su propio caché de texto de páginas, no el de
+    ``OUTPUT/.cache``."""
+    monkeypatch.setenv("REPORT_PAGE_TEXT_CACHE_PATH", str(tmp_path / "page_text.sqlite"))
+    monkeypatch.setattr(page_text_cache, "_default_cache", None)
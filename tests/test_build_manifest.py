@@ -0,0 +1,59 @@
+import os
+
+import pandas as pd
+
+from app import build_manifest
+from app.build_manifest import BuildManifest, row_fingerprint
+
+
+def _entry(manifest, paths, previous=None, tokens=("LAB",), row=None):
+    row = row if row is not None else pd.Series({"DNI": "30111222", "DETALLE": "LAB"})
+    return {
+        "tokens": list(tokens),
+        "row_hash": row_fingerprint(row),
+        "caratula_renderer": "libreoffice",
+        "inputs": manifest.describe_inputs(paths, previous),
+    }
+
+
+def test_unchanged_inputs_skip_and_changed_inputs_rebuild(tmp_path):
+    caratula = tmp_path / "caratula.xlsx"
+    estudio = tmp_path / "30111222.pdf"
+    caratula.write_bytes(b"caratula")
+    estudio.write_bytes(b"estudio v1")
+    manifest = BuildManifest(tmp_path / "OUTPUT")
+    manifest.record("reporte.pdf", dict(_entry(manifest, [caratula, estudio]), warnings=["w"]))
+
+    previous = manifest.get("reporte.pdf")
+    assert previous["warnings"] == ["w"]
+    assert BuildManifest.matches(previous, _entry(manifest, [caratula, estudio], previous))
+
+    # Mismo contenido con otro mtime: no cuenta como cambio
+    stat = estudio.stat()
+    os.utime(estudio, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert BuildManifest.matches(previous, _entry(manifest, [caratula, estudio], previous))
+
+    # Cambia el contenido de una entrada, la lista de entradas, los tokens o la fila
+    estudio.write_bytes(b"estudio v2")
+    assert not BuildManifest.matches(previous, _entry(manifest, [caratula, estudio], previous))
+    estudio.write_bytes(b"estudio v1")
+    assert not BuildManifest.matches(previous, _entry(manifest, [caratula], previous))
+    assert not BuildManifest.matches(previous, _entry(manifest, [caratula, estudio], previous, tokens=("RX",)))
+    other_row = pd.Series({"DNI": "30111222", "DETALLE": "LAB+RX"})
+    assert not BuildManifest.matches(previous, _entry(manifest, [caratula, estudio], previous, row=other_row))
+    estudio.unlink()
+    assert not BuildManifest.matches(previous, _entry(manifest, [caratula, estudio], previous))
+    assert not BuildManifest.matches(None, _entry(manifest, [caratula]))
+
+
+def test_other_manifest_version_is_ignored(tmp_path, monkeypatch):
+    caratula = tmp_path / "caratula.xlsx"
+    caratula.write_bytes(b"caratula")
+    manifest = BuildManifest(tmp_path)
+    manifest.record("reporte.pdf", _entry(manifest, [caratula]))
+    assert manifest.get("reporte.pdf") is not None
+
+    monkeypatch.setattr(build_manifest, "MANIFEST_VERSION", build_manifest.MANIFEST_VERSION + 1)
+    assert manifest.get("reporte.pdf") is None
+    manifest.forget("reporte.pdf")
+    assert not manifest._path_for("reporte.pdf").exists()
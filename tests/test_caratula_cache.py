@@ -0,0 +1,47 @@
+import os
+
+from app.caratula_cache import CaratulaCache
+
+
+def _pdf(path, size):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"%PDF" + b"x" * (size - 4))
+    return path
+
+
+def test_key_changes_with_xlsx_content_and_renderer(tmp_path):
+    cache = CaratulaCache(tmp_path / "cache")
+    xlsx = tmp_path / "caratula.xlsx"
+    xlsx.write_bytes(b"libro v1")
+    key = cache.key_for(xlsx)
+    cache.put(key, _pdf(tmp_path / "v1.pdf", 100))
+
+    xlsx.write_bytes(b"libro v1")
+    assert cache.get(cache.key_for(xlsx)) == cache.cache_dir / f"{key}.pdf"
+    assert cache.get(cache.key_for(xlsx, "native")) is None
+    xlsx.write_bytes(b"libro v2")
+    assert cache.key_for(xlsx) != key
+    assert cache.get(cache.key_for(xlsx)) is None
+
+
+def test_eviction_drops_least_recently_used_but_not_checked_out_copies(tmp_path):
+    cache = CaratulaCache(tmp_path / "cache", max_bytes=250)
+    for age, key in enumerate(("vieja", "usada", "media")):
+        path = cache.put(key, _pdf(tmp_path / f"{key}.pdf", 100))
+        os.utime(path, (1000 + age, 1000 + age))
+    # "vieja" estaba por encima del límite desde el tercer put
+    assert cache.get("vieja") is None
+
+    work_copy = cache.checkout("usada", tmp_path / "trabajo" / "caratula_0.pdf")
+    assert work_copy.read_bytes() == (tmp_path / "usada.pdf").read_bytes()
+    cache.put("nueva", _pdf(tmp_path / "nueva.pdf", 100))
+
+    # "usada" se acaba de leer: se desaloja "media", y la recién puesta queda
+    assert cache.get("media") is None
+    assert (cache.cache_dir / "usada.pdf").exists() and (cache.cache_dir / "nueva.pdf").exists()
+    os.utime(cache.cache_dir / "usada.pdf", (1000, 1000))
+    cache.put("otra", _pdf(tmp_path / "otra.pdf", 100))
+    assert cache.get("usada") is None
+    # La copia del paciente sobrevive al desalojo de la entrada
+    assert work_copy.read_bytes() == (tmp_path / "usada.pdf").read_bytes()
+    assert cache.checkout("usada", tmp_path / "trabajo" / "caratula_1.pdf") is None
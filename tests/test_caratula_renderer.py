@@ -0,0 +1,161 @@
+import datetime
+import io
+import shutil
+import sys
+import zipfile
+
+import fitz
+import openpyxl
+import pytest
+from openpyxl.drawing.image import Image
+from openpyxl.styles import Border, Side
+from PIL import Image as PILImage
+
+from app import converters
+from app.caratula_renderer import CaratulaRenderError, render_caratula_to_pdf
+from app.report_assembler import ReportAssembler
+
+
+def _caratula(path, extra=None):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws["A1"] = "PACIENTE"
+    ws["B1"] = "GARCIA ALEJANDRO"
+    ws.merge_cells("B1:D1")
+    ws["A2"] = "FECHA"
+    ws["B2"] = datetime.datetime(2025, 5, 20)
+    ws["B2"].number_format = "mm-dd-yy"
+    ws["A3"] = "IMPORTE"
+    ws["B3"] = 1234.5
+    ws["B3"].number_format = "#,##0.00"
+    ws["A1"].border = Border(bottom=Side(style="thin"))
+    ws.column_dimensions["A"].width = 14
+    if extra:
+        extra(ws)
+    wb.save(path)
+    return path
+
+
+def _words(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        assert doc.page_count == 1
+        return [(w[4], w[0], w[1]) for w in doc[0].get_text("words")]
+
+
+def test_native_render_draws_cells_with_argentine_formats(tmp_path):
+    pdf = tmp_path / "caratula.pdf"
+    render_caratula_to_pdf(_caratula(tmp_path / "1.xlsx"), pdf)
+    words = [text for text, _, _ in _words(pdf)]
+    assert words == ["PACIENTE", "GARCIA", "ALEJANDRO", "FECHA", "20/05/2025", "IMPORTE", "1.234,50"]
+
+
+@pytest.mark.skipif(shutil.which(converters.LIBREOFFICE_BIN) is None, reason="LibreOffice no instalado")
+def test_native_render_matches_libreoffice(tmp_path):
+    xlsx = _caratula(tmp_path / "1.xlsx")
+    render_caratula_to_pdf(xlsx, tmp_path / "native.pdf")
+    converters.convert_xlsx_to_pdf(xlsx, tmp_path / "libreoffice.pdf")
+
+    native, libreoffice = _words(tmp_path / "native.pdf"), _words(tmp_path / "libreoffice.pdf")
+    assert [w[0] for w in native] == [w[0] for w in libreoffice]
+    for (text, x, y), (_, lo_x, lo_y) in zip(native, libreoffice):
+        assert abs(x - lo_x) < 6 and abs(y - lo_y) < 6, text
+
+
+def _formula_without_value(ws):
+    ws["A5"] = "=B3*2"
+
+
+def _non_latin1_text(ws):
+    ws["A5"] = "Δ presión"
+
+
+def _scientific_format(ws):
+    ws["A5"] = 3.5
+    ws["A5"].number_format = "0.0E+00"
+
+
+@pytest.mark.parametrize("extra, reason", [
+    (_formula_without_value, "fórmulas sin valor calculado"),
+    (_non_latin1_text, "Latin-1"),
+    (_scientific_format, "formato numérico"),
+])
+def test_unsupported_sheets_raise(tmp_path, extra, reason):
+    with pytest.raises(CaratulaRenderError, match=reason):
+        render_caratula_to_pdf(_caratula(tmp_path / "1.xlsx", extra), tmp_path / "caratula.pdf")
+
+
+# LibreOffice de prueba: escribe un PDF con una marca para reconocerlo.
+_FAKE_LIBREOFFICE = '''#!{python}
+import os, sys, fitz
+args = sys.argv[1:]
+outdir = args[args.index("--outdir") + 1]
+xlsx = [a for a in args if a.endswith(".xlsx")][0]
+doc = fitz.open()
+doc.new_page().insert_text((72, 72), "CONVERTIDO POR LIBREOFFICE")
+doc.save(os.path.join(outdir, os.path.splitext(os.path.basename(xlsx))[0] + ".pdf"))
+'''
+
+
+def _caratula_with_corrupt_logo(path):
+    """Carátula con un logo PNG que openpyxl acepta (el encabezado es
+    válido) pero cuyos datos MuPDF no puede decodificar."""
+    png = io.BytesIO()
+    PILImage.new("RGB", (8, 8), "red").save(png, "png")
+    png = png.getvalue()
+    idat = png.index(b"IDAT") + 4
+    corrupt = png[:idat] + b"\xff" * (len(png) - idat)
+
+    def add_logo(ws):
+        ws.add_image(Image(io.BytesIO(png)), "C2")
+
+    _caratula(path.with_suffix(".tmp"), add_logo)
+    with zipfile.ZipFile(path.with_suffix(".tmp")) as src, zipfile.ZipFile(path, "w") as dst:
+        for item in src.infolist():
+            data = src.read(item.filename)
+            dst.writestr(item, corrupt if item.filename.startswith("xl/media/") else data)
+    return path
+
+
+def test_unexpected_render_failure_becomes_caratula_render_error(tmp_path):
+    output = tmp_path / "caratula.pdf"
+    output.write_bytes(b"de una corrida anterior")
+    with pytest.raises(CaratulaRenderError, match="FzErrorFormat") as excinfo:
+        render_caratula_to_pdf(_caratula_with_corrupt_logo(tmp_path / "1.xlsx"), output)
+    assert excinfo.value.__cause__ is not None
+    assert not output.exists()
+
+
+@pytest.fixture
+def fallback_assembler(tmp_path, monkeypatch):
+    fake = tmp_path / "libreoffice-arg"
+    fake.write_text(_FAKE_LIBREOFFICE.format(python=sys.executable))
+    fake.chmod(0o755)
+    monkeypatch.setattr(converters, "LIBREOFFICE_BIN", str(fake))
+    # _convert_caratula solo usa el pool y el perfil de LibreOffice
+    assembler = ReportAssembler.__new__(ReportAssembler)
+    assembler._libreoffice_pool = None
+    assembler._libreoffice_profile = None
+    return assembler
+
+
+def test_native_renderer_falls_back_to_libreoffice(tmp_path, fallback_assembler, capsys):
+    assembler = fallback_assembler
+    supported = _caratula(tmp_path / "1.xlsx")
+    assembler._convert_caratula(supported, tmp_path / "nativa.pdf", renderer="native")
+    unsupported = _caratula(tmp_path / "2.xlsx", _formula_without_value)
+    assembler._convert_caratula(unsupported, tmp_path / "fallback.pdf", renderer="native")
+
+    with fitz.open(tmp_path / "nativa.pdf") as doc:
+        assert "LIBREOFFICE" not in doc[0].get_text()
+    with fitz.open(tmp_path / "fallback.pdf") as doc:
+        assert doc[0].get_text().strip() == "CONVERTIDO POR LIBREOFFICE"
+    assert "no soportada por el renderer nativo (fórmulas sin valor calculado)" in capsys.readouterr().out
+
+
+def test_unreadable_logo_falls_back_to_libreoffice(tmp_path, fallback_assembler, capsys):
+    xlsx = _caratula_with_corrupt_logo(tmp_path / "1.xlsx")
+    fallback_assembler._convert_caratula(xlsx, tmp_path / "fallback.pdf", renderer="native")
+
+    with fitz.open(tmp_path / "fallback.pdf") as doc:
+        assert doc[0].get_text().strip() == "CONVERTIDO POR LIBREOFFICE"
+    assert "no soportada por el renderer nativo (error inesperado: FzErrorFormat" in capsys.readouterr().out
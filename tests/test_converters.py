@@ -0,0 +1,46 @@
+import sys
+import time
+
+from app import converters
+
+# LibreOffice de prueba: en un lote convierte el primer archivo, deja el
+# segundo a medio escribir y se cuelga; de a uno convierte bien.
+_FAKE_LIBREOFFICE = '''#!{python}
+import os, sys, time
+args = sys.argv[1:]
+outdir = args[args.index("--outdir") + 1]
+inputs = [a for a in args if a.endswith(".xlsx")]
+def write(xlsx, complete):
+    name = os.path.splitext(os.path.basename(xlsx))[0] + ".pdf"
+    with open(os.path.join(outdir, name), "wb") as f:
+        f.write(b"%PDF-1.4\\n" + (b"%%EOF\\n" if complete else b""))
+if len(inputs) == 1:
+    write(inputs[0], True)
+    sys.exit(0)
+write(inputs[0], True)
+write(inputs[1], False)
+time.sleep(60)
+'''
+
+
+def test_batch_timeout_kills_libreoffice_and_converts_the_rest_one_by_one(tmp_path, monkeypatch):
+    fake = tmp_path / "libreoffice-arg"
+    fake.write_text(_FAKE_LIBREOFFICE.format(python=sys.executable))
+    fake.chmod(0o755)
+    monkeypatch.setattr(converters, "LIBREOFFICE_BIN", str(fake))
+    monkeypatch.setattr(converters, "BATCH_TIMEOUT_BASE_S", 1.0)
+    monkeypatch.setattr(converters, "BATCH_TIMEOUT_PER_FILE_S", 0.5)
+    xlsx_paths = []
+    for name in ("GARCIA", "NUNEZ", "PEREZ"):
+        xlsx = tmp_path / "caratulas" / f"{name}.xlsx"
+        xlsx.parent.mkdir(exist_ok=True)
+        xlsx.write_bytes(b"xlsx")
+        xlsx_paths.append(xlsx)
+
+    started = time.monotonic()
+    converted = converters.convert_xlsx_batch_to_pdf(xlsx_paths, tmp_path / "out")
+    assert time.monotonic() - started < 30
+
+    assert converted == {xlsx: tmp_path / "out" / f"{xlsx.stem}.pdf" for xlsx in xlsx_paths}
+    for pdf in converted.values():
+        assert pdf.read_bytes().endswith(b"%%EOF\n")
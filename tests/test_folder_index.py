@@ -0,0 +1,59 @@
+from app.folder_index import FolderIndex
+
+
+def _touch(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"")
+
+
+def test_glob_and_dirs_match_path_glob(tmp_path):
+    for name in ("b.pdf", "a.pdf", "c.PDF", "notas.txt"):
+        _touch(tmp_path / "LABORATORIO" / name)
+    (tmp_path / "RX 20-05-2025" / "GARCIA 30111222").mkdir(parents=True)
+    (tmp_path / "RX 20-05-2025" / "ALVAREZ 28111333").mkdir()
+    index = FolderIndex(tmp_path)
+
+    lab = tmp_path / "LABORATORIO"
+    assert index.glob(lab, "*.pdf") == sorted(lab.glob("*.pdf")) == [lab / "a.pdf", lab / "b.pdf"]
+    assert index.glob(lab, "*.PDF") == [lab / "c.PDF"]
+    assert index.dirs(tmp_path / "RX 20-05-2025") == sorted((tmp_path / "RX 20-05-2025").iterdir())
+    assert index.dirs(tmp_path) == [tmp_path / "LABORATORIO", tmp_path / "RX 20-05-2025"]
+    assert index.glob(tmp_path / "NO_EXISTE", "*.pdf") == []
+    assert index.exists(lab / "a.pdf") and index.is_dir(lab) and not index.exists(lab / "z.pdf")
+
+
+def test_find_by_dni_exact_number_then_substring(tmp_path):
+    rx = tmp_path / "RX"
+    for name in ("GARCIA 30111222", "GARCIA 301112220", "PEREZ 25.444.555", "NUNEZ_28111333_b"):
+        (rx / name).mkdir(parents=True)
+    index = FolderIndex(tmp_path)
+
+    # Secuencia de dígitos exacta: no toma la que solo la contiene
+    assert index.find_by_dni(rx, "30111222") == [rx / "GARCIA 30111222"]
+    assert index.find_by_dni(rx, "28111333") == [rx / "NUNEZ_28111333_b"]
+    # Sin secuencia exacta se busca como subcadena del nombre
+    assert index.find_by_dni(rx, "444") == [rx / "PEREZ 25.444.555"]
+    assert index.find_by_dni(rx, "1112220") == [rx / "GARCIA 301112220"]
+    assert index.find_by_dni(rx, "99999999") == []
+
+
+def test_refresh_sees_only_rescanned_changes(tmp_path):
+    lab = tmp_path / "LABORATORIO"
+    _touch(lab / "30111222.pdf")
+    index = FolderIndex(tmp_path)
+
+    _touch(lab / "28111333.pdf")
+    _touch(tmp_path / "PSICOS" / "GARCIA_ALEJANDRO.pdf")
+    assert index.glob(lab, "*.pdf") == [lab / "30111222.pdf"]
+    assert index.find_by_dni(lab, "28111333") == []
+
+    index.refresh(lab)
+    assert index.glob(lab, "*.pdf") == [lab / "28111333.pdf", lab / "30111222.pdf"]
+    assert index.find_by_dni(lab, "28111333") == [lab / "28111333.pdf"]
+    assert not index.is_dir(tmp_path / "PSICOS")
+
+    (lab / "30111222.pdf").unlink()
+    index.refresh()
+    assert index.glob(lab, "*.pdf") == [lab / "28111333.pdf"]
+    assert index.glob(tmp_path / "PSICOS", "*.pdf") == [tmp_path / "PSICOS" / "GARCIA_ALEJANDRO.pdf"]
+    assert tmp_path / "PSICOS" in index.dirs(tmp_path)
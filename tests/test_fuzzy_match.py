@@ -0,0 +1,61 @@
+import difflib
+from pathlib import Path
+
+from app.fuzzy_match import (
+    FUZZY_BLOCKING_MIN_CANDIDATES,
+    FuzzyCandidateIndex,
+    _extract_name_from_ecg_stem,
+    assign_best_matches,
+    fuzzy_find_best_match,
+    normalize_name,
+)
+
+APELLIDOS = ["GARCIA", "PEREZ", "GOMEZ", "LOPEZ", "FERNANDEZ", "MARTINEZ", "RODRIGUEZ",
+             "SANCHEZ", "ROMERO", "ACOSTA", "MEDINA", "HERRERA", "SUAREZ", "BENITEZ"]
+NOMBRES = ["JUAN", "MARIA", "JOSE", "LUCAS", "CARLOS", "LAURA", "PABLO", "SOFIA", "DIEGO"]
+
+
+def _ecg_paths():
+    return [
+        Path(f"{apellido}_{nombre}_20_05_2025_10_12_59_a.m..pdf")
+        for apellido in APELLIDOS for nombre in NOMBRES
+    ]
+
+
+def test_exact_scores_match_sequence_matcher():
+    paths = _ecg_paths()
+    index = FuzzyCandidateIndex(paths, _extract_name_from_ecg_stem, exact=True)
+    target = "Pérez José"
+    for path, score in index.scores(target):
+        expected = difflib.SequenceMatcher(
+            None, normalize_name(target), normalize_name(_extract_name_from_ecg_stem(path.stem))
+        ).ratio()
+        assert score == expected
+
+
+def test_blocking_finds_same_best_match_as_exact():
+    paths = _ecg_paths()
+    assert len(paths) >= FUZZY_BLOCKING_MIN_CANDIDATES
+    exact = FuzzyCandidateIndex(paths, _extract_name_from_ecg_stem, exact=True)
+    blocking = FuzzyCandidateIndex(paths, _extract_name_from_ecg_stem, exact=False)
+    for target in ["FERNANDES LAURA", "RODRIGEZ PABLO", "Suárez Sofía", "MEDINA DIEGO"]:
+        assert blocking.best_match(target) == exact.best_match(target)
+    assert len(blocking.scores("MEDINA DIEGO")) < len(paths)
+
+
+def test_best_match_respects_threshold():
+    paths = _ecg_paths()
+    assert fuzzy_find_best_match("HERRERA CARLOS", FuzzyCandidateIndex(paths, _extract_name_from_ecg_stem)) \
+        == Path("HERRERA_CARLOS_20_05_2025_10_12_59_a.m..pdf")
+    assert fuzzy_find_best_match("ZZZZ QQQQ", paths) is None
+
+
+def test_assign_best_matches_gives_each_file_to_one_patient():
+    paths = [Path("GARCIA_ALEJANDRO.pdf"), Path("GARCIA_ALEJANDRA.pdf"), Path("VIVAS_CESAR.pdf")]
+    targets = {1: "GARCIA ALEJANDRA", 2: "GARCIA ALEJANDRO", 3: "GARCIA ALEJANDRO"}
+    assignment, warnings = assign_best_matches(targets, FuzzyCandidateIndex(paths))
+    assert assignment[1][0] == Path("GARCIA_ALEJANDRA.pdf")
+    assert assignment[2][0] == Path("GARCIA_ALEJANDRO.pdf")
+    assert 3 not in assignment
+    assert any("Empate ambiguo" in w and "GARCIA_ALEJANDRO.pdf" in w for w in warnings)
+    assert "Archivo sin paciente asignado: VIVAS_CESAR.pdf" in warnings
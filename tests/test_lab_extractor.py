@@ -0,0 +1,65 @@
+import re
+
+import fitz
+
+from app.lab_extractor import (
+    LabParameterMatcher,
+    LaboratoryPDFExtractor,
+    _line_info,
+    _LineTable,
+    parse_laboratory_data,
+)
+
+
+def test_locator_finds_overlapping_variant_starts():
+    matcher = LabParameterMatcher({
+        "COLESTEROL_TOTAL": {"nombre": "COLESTEROL TOTAL", "sinonimos": ["COL", "COLES."]},
+        "HDL": {"nombre": "HDL", "sinonimos": ["HDL-C"]},
+        "LDL": {"nombre": "LDL", "sinonimos": []},
+    })
+    text = "Protocolo HDLDL\ncolesterol total....... 180 mg/dl\nHDL-C......\n45\nmg/dl"
+    expected = {
+        literal: [m.start() for m in re.finditer(f"(?={re.escape(literal)})", text, re.IGNORECASE)]
+        for literal in ("COLESTEROL", "COL", "COLES", "HDL", "HDL-C", "LDL")
+    }
+    assert matcher.locate(text) == expected
+    assert [(r["parametro"], r["valor"]) for r in matcher.match(text)] == [
+        ("COLESTEROL TOTAL", 180.0), ("HDL", 45.0),
+    ]
+
+
+def test_line_table_window_matches_text_split():
+    text = "GLUCOSA.......\n\n  95 \nmg/dl\nHOMBRES: 70 a 110\nFecha 20/05\n"
+    table = _LineTable(text)
+    for pos in range(len(text) + 1):
+        expected = [_line_info(line) for line in text[pos:].split('\n')[:8]]
+        assert table.window(pos, 8) == expected
+    assert [info["valor"] for info in table.window(15, 3)] == [None, "95", None]
+    assert table.window(15, 4)[2]["unidad"] == "mg/dl"
+
+
+def test_layout_rows_keep_value_and_unit_in_their_row(tmp_path):
+    pdf = tmp_path / "lab.pdf"
+    with fitz.open() as doc:
+        page = doc.new_page()
+        for y, cells in ((100, ("GLUCEMIA........", "95", "mg/dl", "70 - 110")),
+                         (120, ("V.S.G.........", "12", "mm", "HASTA 20")),
+                         (140, ("COLOR........", "AMARILLO", "", ""))):
+            for x, cell in zip((50, 200, 280, 350), cells):
+                page.insert_text((x, y), cell)
+        doc.save(pdf)
+    with LaboratoryPDFExtractor(pdf) as extractor:
+        text = extractor.extract_text()
+        rows = extractor.extract_rows()
+
+    assert [(r["nombre"], r["valor"], r["unidad"], r["referencia"]) for r in rows] == [
+        ("GLUCEMIA", "95", "mg/dl", "70 - 110"), ("V.S.G", "12", "mm", "HASTA 20"), ("COLOR", "AMARILLO", "", ""),
+    ]
+    matcher = LabParameterMatcher({
+        "GLUCOSA": {"nombre": "GLUCOSA", "unidad": "mg/dl", "sinonimos": ["GLUCEMIA"]},
+        "VSG": {"nombre": "V.S.G.", "unidad": "mm", "sinonimos": []},
+        "COLOR": {"nombre": "COLOR", "unidad": "", "tipo_valor": "cualitativo", "sinonimos": []},
+    })
+    assert [(r["parametro"], r["valor"], r["unidad"]) for r in parse_laboratory_data(text, matcher=matcher, rows=rows)] == [
+        ("GLUCOSA", 95.0, "mg/dl"), ("V.S.G.", 12.0, "mm"), ("COLOR", "AMARILLO", ""),
+    ]
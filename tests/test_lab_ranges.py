@@ -0,0 +1,49 @@
+import json
+import os
+
+from app.lab_extractor import parse_laboratory_data
+from app.lab_ranges import LaboratoryRanges
+
+
+def _write_config(path, parametros, mtime_ns):
+    path.write_text(json.dumps({"version": "1", "parametros": parametros}), encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_matcher_is_compiled_once_per_json_version(tmp_path):
+    config = tmp_path / "lab_ranges.json"
+    _write_config(config, {"GLUCOSA": {"nombre": "GLUCOSA", "unidad": "mg/dl", "sinonimos": []}}, 10**18)
+    ranges = LaboratoryRanges(config)
+    matcher = ranges.parameter_matcher()
+    assert ranges.parameter_matcher() is matcher
+    assert LaboratoryRanges(config).parameter_matcher() is matcher
+
+    text = "GLUCEMIA.......... 95 mg/dl"
+    assert parse_laboratory_data(text, matcher=matcher) == []
+
+    _write_config(config, {"GLUCOSA": {"nombre": "GLUCOSA", "unidad": "mg/dl", "sinonimos": ["GLUCEMIA"]}},
+                  2 * 10**18)
+    resultados = parse_laboratory_data(text, matcher=ranges.parameter_matcher())
+    assert [(r["parametro"], r["valor"]) for r in resultados] == [("GLUCOSA", 95.0)]
+    assert ranges.ranges["GLUCOSA"]["sinonimos"] == ["GLUCEMIA"]
+
+
+def test_synonym_index_keeps_first_match_and_follows_add_range(tmp_path):
+    config = tmp_path / "lab_ranges.json"
+    _write_config(config, {
+        "HEMOGLOBINA": {"unidad": "g/dl", "sinonimos": ["HB"], "requiere_sexo": True,
+                        "rangos": {"hombre": {"min": 13, "max": 17}, "mujer": {"min": 12, "max": 16}}},
+        "HB_GLICOSILADA": {"unidad": "%", "sinonimos": ["Hb.."], "min": 4, "max": 6},
+        "COLOR": {"tipo_valor": "cualitativo", "sinonimos": ["color orina"]},
+    }, 10**18)
+    ranges = LaboratoryRanges(config)
+
+    assert ranges.get_range("hb", sexo="F") == (12, 16)
+    assert ranges.get_range("Hb..") == (13, 17)
+    assert ranges.get_unidad("HB") == "g/dl"
+    assert not ranges.should_validate_range("Color Orina")
+    assert ranges.get_range("TSH") is None and ranges.should_validate_range("TSH")
+
+    ranges.add_range("TSH", 0.4, 4.0, "uUI/ml", ["Tirotrofina"])
+    assert ranges.get_range("tirotrofina") == (0.4, 4.0)
+    assert ranges.get_unidad("TIROTROFINA") == "uUI/ml"
@@ -0,0 +1,145 @@
+import importlib.util
+import json
+import re
+import subprocess
+import sys
+import threading
+
+import fitz
+import pytest
+
+from app import converters, libreoffice_pool
+from app.libreoffice_pool import LibreOfficePool, LibreOfficeWorker, _BRIDGE_SCRIPT
+
+needs_no_uno = pytest.mark.skipif(
+    importlib.util.find_spec("uno") is not None, reason="el python de los tests tiene uno"
+)
+
+# LibreOffice de prueba: como servidor (--accept) solo espera; como
+# conversión directa escribe un PDF con una marca.
+_FAKE_LIBREOFFICE = '''#!{python}
+import os, sys, time, fitz
+args = sys.argv[1:]
+if any(a.startswith("--accept") for a in args):
+    time.sleep(60)
+    sys.exit(0)
+outdir = args[args.index("--outdir") + 1]
+xlsx = [a for a in args if a.endswith(".xlsx")][0]
+doc = fitz.open()
+doc.new_page().insert_text((72, 72), "CONVERSION DIRECTA")
+doc.save(os.path.join(outdir, os.path.splitext(os.path.basename(xlsx))[0] + ".pdf"))
+'''
+
+
+@pytest.fixture
+def fake_libreoffice(tmp_path, monkeypatch):
+    fake = tmp_path / "libreoffice-arg"
+    fake.write_text(_FAKE_LIBREOFFICE.format(python=sys.executable))
+    fake.chmod(0o755)
+    monkeypatch.setattr(converters, "LIBREOFFICE_BIN", str(fake))
+    monkeypatch.setattr(libreoffice_pool, "LIBREOFFICE_BIN", str(fake))
+    # Puente con un python sin el módulo uno
+    monkeypatch.setenv("LIBREOFFICE_PYTHON", sys.executable)
+    return fake
+
+
+@needs_no_uno
+def test_bridge_reports_not_ready_without_uno():
+    result = subprocess.run(
+        [sys.executable, str(_BRIDGE_SCRIPT), "pipe_de_prueba", "1"],
+        capture_output=True, text=True, timeout=30,
+    )
+    assert result.returncode == 1
+    message = json.loads(result.stdout)
+    assert message["ready"] is False and "uno" in message["error"]
+
+    result = subprocess.run([sys.executable, str(_BRIDGE_SCRIPT)], capture_output=True, text=True, timeout=30)
+    assert result.returncode == 2 and json.loads(result.stdout)["ready"] is False
+
+
+@needs_no_uno
+def test_pool_without_uno_falls_back_and_disables_itself(tmp_path, fake_libreoffice, capsys):
+    xlsx = tmp_path / "1.xlsx"
+    xlsx.write_bytes(b"xlsx")
+    with LibreOfficePool(size=1, startup_timeout=5) as pool:
+        profile_root = pool._profile_root
+        worker = pool._workers[0]
+        for n in range(3):
+            pool.convert(xlsx, tmp_path / f"caratula_{n}.pdf")
+            # El soffice del worker que no arrancó no queda corriendo
+            assert worker._office is None and worker._bridge is None
+        assert not pool.enabled
+        assert worker.start_failures == 2
+    assert not profile_root.exists()
+
+    for n in range(3):
+        with fitz.open(tmp_path / f"caratula_{n}.pdf") as doc:
+            assert doc[0].get_text().strip() == "CONVERSION DIRECTA"
+    out = capsys.readouterr().out
+    assert out.count("No se pudo iniciar el worker LibreOffice 0") == 2
+    assert "Pool de LibreOffice deshabilitado" in out
+
+
+@needs_no_uno
+def test_pool_tries_every_worker_before_disabling(tmp_path, fake_libreoffice, capsys):
+    xlsx = tmp_path / "1.xlsx"
+    xlsx.write_bytes(b"xlsx")
+    with LibreOfficePool(size=2, startup_timeout=5) as pool:
+        for n in range(5):
+            pool.convert(xlsx, tmp_path / f"caratula_{n}.pdf")
+        assert not pool.enabled
+    # El worker 0 agota sus arranques y queda al fondo; recién ahí se prueba el 1
+    intentos = re.findall(r"No se pudo iniciar el worker LibreOffice (\d+)", capsys.readouterr().out)
+    assert intentos == ["0", "0", "1", "1"]
+
+
+@pytest.fixture
+def started_workers(monkeypatch):
+    """Workers que "arrancan" sin LibreOffice y convierten copiando el xlsx."""
+    started = []
+
+    def start(self):
+        started.append(self.worker_id)
+        self.alive = True
+
+    def convert(self, xlsx_path, output_pdf_path, timeout):
+        if getattr(self, "gate", None):
+            self.gate.wait(timeout=5)
+        output_pdf_path.write_bytes(xlsx_path.read_bytes())
+
+    monkeypatch.setattr(LibreOfficeWorker, "start", start)
+    monkeypatch.setattr(LibreOfficeWorker, "is_alive", lambda self: getattr(self, "alive", False))
+    monkeypatch.setattr(LibreOfficeWorker, "convert", convert)
+    monkeypatch.setattr(LibreOfficeWorker, "stop", lambda self: None)
+    return started
+
+
+def test_sequential_jobs_reuse_the_last_worker(tmp_path, started_workers):
+    xlsx = tmp_path / "1.xlsx"
+    xlsx.write_bytes(b"xlsx")
+    with LibreOfficePool(size=3) as pool:
+        for n in range(4):
+            pool.convert(xlsx, tmp_path / f"caratula_{n}.pdf")
+        assert started_workers == [0]
+
+        # Dos trabajos a la vez sí necesitan un segundo worker
+        gate = threading.Barrier(2)
+        for worker in pool._workers:
+            worker.gate = gate
+        threads = [threading.Thread(target=pool.convert, args=(xlsx, tmp_path / f"concurrente_{n}.pdf"))
+                   for n in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+        assert started_workers == [0, 1]
+    assert all((tmp_path / f"concurrente_{n}.pdf").exists() for n in range(2))
+
+
+def test_pool_of_size_zero_converts_directly(tmp_path, fake_libreoffice):
+    xlsx = tmp_path / "1.xlsx"
+    xlsx.write_bytes(b"xlsx")
+    with LibreOfficePool(size=0) as pool:
+        assert not pool.enabled and pool._profile_root is None
+        pool.convert(xlsx, tmp_path / "caratula.pdf")
+    assert (tmp_path / "caratula.pdf").exists()
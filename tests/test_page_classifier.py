@@ -0,0 +1,31 @@
+import fitz
+
+from app.page_classifier import PAGE_RULES, classify_pages
+
+
+def _doc(pages):
+    """PDF en memoria; cada página es una lista de líneas."""
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page()
+        for i, text in enumerate(lines):
+            page.insert_text((72, 72 + 14 * i), text)
+    return doc
+
+
+def test_new_espiro_format_is_detected_once_for_all_pages():
+    doc = _doc([
+        ["Resultados de espirometria", "Apellido", "PEREZ GOMEZ", "Nombre", "MARIA JOSE Sexo"],
+        ["Apellido", "LOPEZ", "Nombre", "ANA"],
+        ["Pagina sin datos"],
+    ])
+    assert classify_pages(doc, "espiros") == [
+        ("PEREZ_GOMEZ_MARIA_JOSE", "new"), ("LOPEZ_ANA", "new"), (None, "new"),
+    ]
+
+
+def test_old_espiro_format_and_dni_rules():
+    doc = _doc([["Grupo pacientes", "Perez", "Juan"]])
+    assert classify_pages(doc, "espiros") == [("PEREZ_JUAN", "old")]
+    assert PAGE_RULES["dni"].key("Paciente (DNI 30.111.222)") == "30111222"
+    assert PAGE_RULES["name"].key("Nombre: JUAN PEREZ FECHA 2020") == "JUAN_PEREZ"
@@ -0,0 +1,69 @@
+import fitz
+
+from app.folder_index import FolderIndex
+from app.page_map import PageMapStore, compute_page_map, page_ranges
+
+
+def _master_pdf(path, texts):
+    doc = fitz.open()
+    for text in texts:
+        doc.new_page().insert_text((72, 72), text)
+    doc.save(path)
+    doc.close()
+
+
+def test_page_map_groups_pages_like_split_by_dni(tmp_path):
+    master = tmp_path / "ERGOMETRIA 20-05-2025.pdf"
+    _master_pdf(master, ["DNI 30.111.222", "DNI 28111333", "DNI 30111222", "sin datos"])
+    assert compute_page_map(master, "dni") == {"30111222": [0, 2], "28111333": [1]}
+    assert page_ranges([0, 1, 2, 5, 7, 8]) == [(0, 2), (5, 5), (7, 8)]
+
+
+def test_page_map_store_invalidates_when_master_changes(tmp_path):
+    master = tmp_path / "ERGOMETRIA 20-05-2025.pdf"
+    _master_pdf(master, ["DNI 30111222"])
+    store = PageMapStore(tmp_path / ".page_maps")
+    study_dir = tmp_path / "ERGOMETRIA"
+    store.save("ERGOMETRIA", master, "dni", study_dir, {"30111222": [0]})
+    assert store.get("ERGOMETRIA", master, "dni")["pages"] == {"30111222": [0]}
+    assert store.get("ERGOMETRIA", master, "name") is None
+    assert len(store.load_all()) == 1
+
+    _master_pdf(master, ["DNI 30111222", "DNI 28111333"])
+    assert store.get("ERGOMETRIA", master, "dni") is None
+    assert store.load_all() == []
+
+
+def test_page_map_store_invalidates_when_rules_or_region_change(tmp_path, monkeypatch):
+    import app.page_map as page_map
+
+    master = tmp_path / "ERGOMETRIA 20-05-2025.pdf"
+    _master_pdf(master, ["DNI 30111222"])
+    store = PageMapStore(tmp_path / ".page_maps")
+    no_regions = {}
+    entry = store.save("ERGOMETRIA", master, "dni", tmp_path / "ERGOMETRIA", {"30111222": [0]},
+                       region=(0.0, 0.0, 1.0, 0.15), regions=no_regions)
+    assert entry["region"] == [0.0, 0.0, 1.0, 0.15] and entry["region_config"] is None
+    assert store.get("ERGOMETRIA", master, "dni", regions=no_regions) is not None
+
+    # Zona configurada nueva para el estudio
+    configured = {"ERGOMETRIA": (0.0, 0.0, 1.0, 0.3)}
+    assert store.get("ERGOMETRIA", master, "dni", regions=configured) is None
+    assert store.load_all(regions=configured) == []
+
+    # Reglas de clasificación nuevas
+    monkeypatch.setattr(page_map, "CLASSIFIER_VERSION", page_map.CLASSIFIER_VERSION + 1)
+    assert store.get("ERGOMETRIA", master, "dni", regions=no_regions) is None
+    assert store.load_all(regions=no_regions) == []
+
+
+def test_folder_index_keeps_virtual_files_across_refresh(tmp_path):
+    index = FolderIndex(tmp_path)
+    study_dir = tmp_path / "ERGOMETRIA"
+    index.set_virtual_files(study_dir, ["30111222.pdf"])
+    assert index.is_dir(study_dir)
+    assert index.glob(study_dir, "*.pdf") == [study_dir / "30111222.pdf"]
+    assert index.find_by_dni(study_dir, "30111222") == [study_dir / "30111222.pdf"]
+    index.refresh()
+    assert index.exists(study_dir / "30111222.pdf")
+    assert study_dir in index.dirs(tmp_path)
@@ -0,0 +1,40 @@
+import fitz
+
+from app.page_text_cache import PageTextCache, document_key, page_text
+
+
+def _pdf(path, texts):
+    doc = fitz.open()
+    for text in texts:
+        doc.new_page().insert_text((72, 72), text)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def test_cached_text_is_reused(tmp_path):
+    pdf = _pdf(tmp_path / "lab.pdf", ["Glucemia 90 mg/dl", "Urea 30 mg/dl"])
+    cache = PageTextCache(tmp_path / "page_text.sqlite")
+    with fitz.open(pdf) as doc:
+        assert "Urea" in page_text(doc[1], cache=cache)
+        key = document_key(pdf)
+        assert cache.get(key, 1) is not None
+        # Con la página en el caché no se vuelve a extraer.
+        cache.put(key, 1, "text", "cacheado")
+        assert page_text(doc[1], cache=cache) == "cacheado"
+        assert "Glucemia" in page_text(doc[0], region=(0, 0, 1, 0.15), cache=cache)
+        assert cache.get(key, 0, "text@0,0,1,0.15") is not None
+
+    cache.seed_pages(key, [1], "separado")
+    assert cache.get("separado", 0) == "cacheado"
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = PageTextCache(tmp_path / "page_text.sqlite", max_bytes=10)
+    cache.put("a", 0, "text", "12345")
+    cache.put("b", 0, "text", "12345")
+    cache.get("a", 0)
+    cache.put("c", 0, "text", "12345")
+    cache.evict()
+    assert cache.get("b", 0) is None
+    assert cache.get("a", 0) == "12345" and cache.get("c", 0) == "12345"
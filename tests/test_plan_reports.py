@@ -0,0 +1,70 @@
+import re
+import shutil
+from pathlib import Path
+
+import fitz
+import openpyxl
+import pandas as pd
+import pytest
+
+from app import report_assembler
+from app.report_assembler import ReportAssembler
+
+FECHA = "plan-20-05-2025"
+
+
+@pytest.fixture
+def assembler(tmp_path):
+    base_path = tmp_path / FECHA
+    fecha_folder = base_path / "20-05-2025"
+    fecha_folder.mkdir(parents=True)
+    pd.DataFrame({
+        "Nº": [1, 2, 3],
+        "FECHA": ["20/05/2025"] * 3,
+        "APELLIDOS": ["GARCIA", "NUNEZ", "PEREZ"],
+        "NOMBRES": ["ALEJANDRO", "LUCAS", "MARIA"],
+        "DNI": ["30111222", "28111333", "25444555"],
+        "DETALLE": ["BASICO + ERGOMETRIA"] * 3,
+    }).to_excel(fecha_folder / "PRUEBA SISTEMA NUEVO.xlsx", index=False)
+    for numero in (1, 2):  # PEREZ no tiene carátula
+        wb = openpyxl.Workbook()
+        wb.active["A1"] = f"CARATULA {numero}"
+        wb.save(fecha_folder / f"{numero}.xlsx")
+    doc = fitz.open()
+    for dni in ("30111222", "25444555", "30111222"):
+        doc.new_page().insert_text((72, 72), f"Paciente DNI {dni}")
+    doc.save(base_path / "ERGOMETRIA 20-05-2025.pdf")
+    doc.close()
+    # Laboratorio ya separado (solo GARCIA)
+    (fecha_folder / "LABORATORIO").mkdir()
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Laboratorio 30111222")
+    doc.save(fecha_folder / "LABORATORIO" / "30111222.pdf")
+    doc.close()
+    assembler = ReportAssembler(str(base_path), "20-05-2025")
+    assembler.caratula_cache = None
+    yield assembler
+    # build_report_for_patient escribe en OUTPUT/<fecha> del repo
+    shutil.rmtree(Path(report_assembler.__file__).resolve().parent.parent / "OUTPUT" / FECHA, ignore_errors=True)
+
+
+def test_plan_writes_nothing_and_counts_missing_like_the_build(assembler):
+    before = sorted(p.relative_to(assembler.base_path) for p in assembler.base_path.rglob("*"))
+    report = assembler.plan_reports()
+
+    # Solo se escriben los mapas de páginas, ningún PDF
+    after = sorted(p.relative_to(assembler.base_path) for p in assembler.base_path.rglob("*"))
+    assert [p for p in after if p not in before and p.suffix == ".pdf"] == []
+    assert {p.parts[1] for p in after if p not in before} == {".page_maps"}
+    assert assembler.virtual_split is False and assembler._study_plan is None
+    assert list(report["caratula"]) == [True, True, False]
+
+    for index in (0, 1):
+        warnings = assembler.build_report_for_patient(index, caratula_renderer="native")
+        counts = [int(m.group(1)) for w in warnings for m in [re.search(r"\((\d+) faltantes\)", w)] if m]
+        assert counts == ([report.loc[index, "faltantes"]] if report.loc[index, "faltantes"] else [])
+    assert list(report["faltantes"]) == [2, 4, 3]
+
+    assembler.virtual_split = True
+    assert list(assembler.plan_reports()["faltantes"]) == [2, 4, 3]
+    assert assembler.virtual_split is True and assembler._study_plan is None
@@ -0,0 +1,83 @@
+import json
+
+import fitz
+import pandas as pd
+
+from app import report_assembler
+from app.page_map import PAGE_MAPS_DIRNAME
+from app.report_assembler import ReportAssembler
+from app.split_manifest import SPLIT_MANIFESTS_DIRNAME
+
+# Páginas del maestro de laboratorio: 25444555 cruza de un tramo de 2
+# páginas al siguiente y 30111222 aparece en dos tramos separados.
+LAB_PAGES = ["30111222", "28111333", "25444555", "25444555", "25444555", "30111222"]
+
+
+def _fecha(tmp_path, name):
+    base_path = tmp_path / name / "20-05-2025"
+    fecha_folder = base_path / "20-05-2025"
+    fecha_folder.mkdir(parents=True)
+    pd.DataFrame({
+        "Nº": [1, 2, 3],
+        "FECHA": ["20/05/2025"] * 3,
+        "APELLIDOS": ["GARCIA", "NUNEZ", "PEREZ"],
+        "NOMBRES": ["ALEJANDRO", "LUCAS", "MARIA"],
+        "DNI": ["30111222", "28111333", "25444555"],
+        "DETALLE": ["BASICO"] * 3,
+    }).to_excel(fecha_folder / "PRUEBA SISTEMA NUEVO.xlsx", index=False)
+    doc = fitz.open()
+    for n, dni in enumerate(LAB_PAGES):
+        doc.new_page().insert_text((72, 72), f"Paciente DNI {dni} hoja {n}")
+    doc.save(base_path / "LABORATORIO 20-5-25.pdf")
+    doc.close()
+    return ReportAssembler(str(base_path))
+
+
+def _split_pdfs(assembler):
+    texts = {}
+    for pdf in sorted((assembler.fecha_folder / "LABORATORIO").glob("*.pdf")):
+        with fitz.open(pdf) as doc:
+            texts[pdf.name] = [page.get_text().strip() for page in doc]
+    return texts
+
+
+def _stored(assembler, dirname, field):
+    with open(assembler.fecha_folder / dirname / "LABORATORIO.json", encoding="utf-8") as f:
+        entry = json.load(f)
+    if field == "outputs":
+        return {key: output["pages"] for key, output in entry["outputs"].items()}
+    return entry[field]
+
+
+def test_parallel_split_matches_sequential_across_shards(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(report_assembler, "SPLIT_SHARD_PAGES", 2)
+    sequential, parallel = _fecha(tmp_path, "secuencial"), _fecha(tmp_path, "paralelo")
+    sequential.preprocess_all_studies(jobs=1)
+    parallel.preprocess_all_studies(jobs=2)
+    assert "en 3 tramos con 2 procesos" in capsys.readouterr().out
+
+    assert _split_pdfs(parallel) == _split_pdfs(sequential)
+    assert _split_pdfs(parallel)["25444555.pdf"] == [f"Paciente DNI 25444555 hoja {n}" for n in (2, 3, 4)]
+    assert _stored(parallel, SPLIT_MANIFESTS_DIRNAME, "outputs") \
+        == _stored(sequential, SPLIT_MANIFESTS_DIRNAME, "outputs") \
+        == {"30111222": [0, 5], "28111333": [1], "25444555": [2, 3, 4]}
+
+    # Maestro sin cambios al que le falta un PDF: se reescribe con las
+    # páginas del manifiesto, sin volver a leer el maestro.
+    (parallel.fecha_folder / "LABORATORIO" / "30111222.pdf").unlink()
+    parallel.preprocess_all_studies(jobs=2)
+    out = capsys.readouterr().out
+    assert "en 0 tramos" in out and "se reescriben 1 PDFs que faltan" in out
+    assert _split_pdfs(parallel) == _split_pdfs(sequential)
+
+
+def test_parallel_virtual_split_matches_sequential_page_map(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_assembler, "SPLIT_SHARD_PAGES", 1)
+    sequential, parallel = _fecha(tmp_path, "secuencial"), _fecha(tmp_path, "paralelo")
+    sequential.virtual_split = parallel.virtual_split = True
+    sequential.preprocess_all_studies(jobs=1)
+    parallel.preprocess_all_studies(jobs=2)
+
+    assert not (parallel.fecha_folder / "LABORATORIO").exists()
+    assert _stored(parallel, PAGE_MAPS_DIRNAME, "pages") == _stored(sequential, PAGE_MAPS_DIRNAME, "pages") \
+        == {"30111222": [0, 5], "28111333": [1], "25444555": [2, 3, 4]}
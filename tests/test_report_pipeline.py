@@ -0,0 +1,82 @@
+import sys
+import time
+
+import pytest
+
+from app.report_pipeline import StagePipeline
+
+
+def _slow(seconds_by_item):
+    def stage(value):
+        time.sleep(seconds_by_item.get(value[0], 0))
+        print(f"etapa de {value[0]}")
+        return value + ["ok"]
+    return stage
+
+
+def test_results_and_logs_keep_input_order(capsys):
+    stdout = sys.stdout
+    pipeline = StagePipeline(
+        [("inicio", lambda item: [item]), ("lenta", _slow({0: 0.05, 2: 0.03})), ("fin", _slow({1: 0.02}))],
+        queue_size=1,
+    )
+    assert pipeline.run(range(5)) == [[i, "ok", "ok"] for i in range(5)]
+    assert sys.stdout is stdout
+    assert capsys.readouterr().out == "".join(f"etapa de {i}\netapa de {i}\n" for i in range(5))
+    assert [stats["items"] for stats in pipeline.stats()] == [5, 5, 5]
+
+
+def _failing_at(bad, error):
+    def stage(value):
+        if value[0] == bad:
+            raise error
+        return value + ["ok"]
+    return stage
+
+
+def test_stop_on_error_raises_and_discards_in_flight_items():
+    errors, discarded = [], []
+    pipeline = StagePipeline(
+        [("inicio", lambda item: [item]), ("falla", _failing_at(2, ValueError("sin carátula"))),
+         ("lenta", _slow({i: 0.01 for i in range(20)}))],
+        discard=discarded.append,
+        on_error=lambda item, error: errors.append((item, error)),
+    )
+    with pytest.raises(ValueError, match="sin carátula"):
+        pipeline.run(range(20))
+    assert [(item, str(error)) for item, error in errors] == [(2, "sin carátula")]
+    assert [2] in discarded
+    # Se cortó la corrida: no todos los ítems llegaron a la última etapa
+    assert pipeline.stats()[-1]["items"] < 19
+
+
+def test_without_stop_on_error_failed_items_are_skipped():
+    errors, discarded = [], []
+    pipeline = StagePipeline(
+        [("inicio", lambda item: [item]), ("falla", _failing_at(1, SystemExit(3)))],
+        discard=discarded.append,
+        stop_on_error=False,
+        on_error=lambda item, error: errors.append((item, type(error))),
+    )
+    # Una BaseException de una etapa llega como error y no cuelga la corrida
+    assert pipeline.run(range(4)) == [[0, "ok"], [2, "ok"], [3, "ok"]]
+    assert errors == [(1, SystemExit)]
+    assert discarded == [[1]]
+
+
+def test_error_in_on_error_does_not_hang_the_stages():
+    discarded = []
+
+    def on_error(item, error):
+        raise RuntimeError("bitácora cerrada")
+
+    pipeline = StagePipeline(
+        [("inicio", lambda item: [item]), ("falla", _failing_at(0, ValueError("x")))],
+        queue_size=1,
+        discard=discarded.append,
+        stop_on_error=False,
+        on_error=on_error,
+    )
+    with pytest.raises(RuntimeError, match="bitácora cerrada"):
+        pipeline.run(range(10))
+    assert [0] in discarded
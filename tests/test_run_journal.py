@@ -0,0 +1,62 @@
+import pandas as pd
+
+from app.report_assembler import ReportAssembler
+from app.run_journal import RunJournal, RUN_MODES, PENDING, RUNNING, DONE, FAILED
+
+
+def _interrupted_run(journal):
+    """Corrida cortada a la mitad: 0 terminado, 1 fallido, 2 en curso, 3 pendiente."""
+    run_id = journal.start_run([(0, "30111222"), (1, "28111333"), (2, "25444555"), (3, "27000111")])
+    journal.mark_running(run_id, 0)
+    journal.mark_done(run_id, 0, ["sin audiometría"])
+    journal.mark_running(run_id, 1)
+    journal.mark_failed(run_id, 1, "RuntimeError: LibreOffice colgado")
+    journal.mark_running(run_id, 2)
+    return run_id
+
+
+def test_resume_reopens_everything_not_done(tmp_path):
+    with RunJournal(tmp_path / "journal.sqlite") as journal:
+        run_id = _interrupted_run(journal)
+        assert journal.summary(run_id) == {PENDING: 1, RUNNING: 1, DONE: 1, FAILED: 1}
+
+        assert journal.latest_run()["run_id"] == run_id
+        assert journal.reopen_run(run_id, RUN_MODES["reanudar"]) == [1, 2, 3]
+        patients = journal.patients(run_id)
+        assert [p["state"] for p in patients] == [DONE, PENDING, PENDING, PENDING]
+        assert patients[0]["warnings"] == ["sin audiometría"]
+        assert patients[1]["error"] is None
+
+
+def test_retry_failed_reopens_only_failed_patients(tmp_path):
+    db_path = tmp_path / "journal.sqlite"
+    with RunJournal(db_path) as journal:
+        run_id = _interrupted_run(journal)
+        journal.mark_done(run_id, 2, [])
+        journal.mark_failed(run_id, 3, "ValueError: sin carátula")
+        journal.finish_run(run_id)
+
+    # La bitácora sobrevive a reabrir el archivo (corrida nueva del proceso)
+    with RunJournal(db_path) as journal:
+        assert journal.latest_run()["finished_at"] is not None
+        assert journal.reopen_run(run_id, RUN_MODES["reintentar_fallidos"]) == [1, 3]
+        assert journal.latest_run()["finished_at"] is None
+        assert journal.summary(run_id) == {PENDING: 2, RUNNING: 0, DONE: 2, FAILED: 0}
+        assert journal.reopen_run(run_id, RUN_MODES["reintentar_fallidos"]) == []
+
+
+def test_run_selection_falls_back_to_new_run_when_master_changes(tmp_path):
+    # _select_run_patients solo usa la bitácora y el Excel maestro
+    assembler = ReportAssembler.__new__(ReportAssembler)
+    df = pd.DataFrame({"DNI": ["30.111.222", "28111333", "25444555", "27000111"]})
+    with RunJournal(tmp_path / "journal.sqlite") as journal:
+        assert assembler._select_run_patients(journal, df, "reanudar") == (1, [0, 1, 2, 3])
+        run_id = 1
+        journal.mark_done(run_id, 0, [])
+        journal.mark_failed(run_id, 2, "RuntimeError: x")
+
+        assert assembler._select_run_patients(journal, df, "reintentar_fallidos") == (run_id, [2])
+        journal.mark_failed(run_id, 2, "RuntimeError: x")
+        assert assembler._select_run_patients(journal, df, "reanudar") == (run_id, [1, 2, 3])
+        assert assembler._select_run_patients(journal, df.iloc[::-1], "reanudar") == (2, [0, 1, 2, 3])
+        assert assembler._select_run_patients(journal, df, "nueva") == (3, [0, 1, 2, 3])
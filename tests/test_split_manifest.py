@@ -0,0 +1,108 @@
+import fitz
+
+from app.page_map import compute_page_map
+from app.split_manifest import SplitManifestStore, missing_outputs, write_split
+
+
+def _master(path, dnis):
+    doc = fitz.open()
+    for dni in dnis:
+        doc.new_page().insert_text((72, 72), f"Paciente DNI {dni}")
+    doc.save(path)
+    doc.close()
+
+
+def _split(store, master, study_dir):
+    pages = compute_page_map(master, "dni")
+    page_count, outputs = write_split(master, pages, study_dir, store.read("LABORATORIO"))
+    return store.save("LABORATORIO", master, "dni", study_dir, page_count, outputs)
+
+
+def test_unchanged_master_is_not_split_again(tmp_path):
+    master, study_dir = tmp_path / "LABORATORIO.pdf", tmp_path / "LABORATORIO"
+    _master(master, ["30111222", "28111333", "30111222"])
+    store = SplitManifestStore(tmp_path / ".split_manifests")
+    assert store.get("LABORATORIO", master, "dni") is None
+
+    entry = _split(store, master, study_dir)
+    assert entry["outputs"]["30111222"]["pages"] == [0, 2]
+    assert store.get("LABORATORIO", master, "dni") == entry
+    assert store.get("LABORATORIO", master, "name") is None
+
+    (study_dir / "28111333.pdf").unlink()
+    assert missing_outputs(entry) == ["28111333"]
+
+
+def test_changed_master_rewrites_only_changed_patients(tmp_path):
+    master, study_dir = tmp_path / "LABORATORIO.pdf", tmp_path / "LABORATORIO"
+    _master(master, ["30111222", "28111333", "25444555"])
+    store = SplitManifestStore(tmp_path / ".split_manifests")
+    _split(store, master, study_dir)
+    kept_mtime = (study_dir / "30111222.pdf").stat().st_mtime_ns
+
+    # El proveedor reenvía el maestro: sin 28111333, con un paciente nuevo.
+    _master(master, ["33444555", "30111222", "25444555"])
+    assert store.get("LABORATORIO", master, "dni") is None
+    entry = _split(store, master, study_dir)
+
+    assert sorted(entry["outputs"]) == ["25444555", "30111222", "33444555"]
+    assert not (study_dir / "28111333.pdf").exists()
+    assert (study_dir / "33444555.pdf").exists()
+    assert (study_dir / "30111222.pdf").stat().st_mtime_ns == kept_mtime
+
+
+def _image_master(path, pages):
+    doc = fitz.open()
+    for dni, color in pages:
+        pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 4, 4), False)
+        pix.set_rect(pix.irect, color)
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Paciente DNI {dni}")
+        page.insert_image(fitz.Rect(72, 100, 144, 172), stream=pix.tobytes("png"))
+    doc.save(path)
+    doc.close()
+
+
+def test_master_that_only_changes_an_image_is_split_again(tmp_path):
+    from app.split_manifest import pages_fingerprint
+
+    red, blue = (255, 0, 0), (0, 0, 255)
+    _image_master(tmp_path / "a.pdf", [("30111222", red), ("30111222", blue)])
+    _image_master(tmp_path / "b.pdf", [("30111222", blue), ("30111222", red)])
+    with fitz.open(tmp_path / "a.pdf") as a, fitz.open(tmp_path / "b.pdf") as b:
+        assert a[0].read_contents() == a[1].read_contents()
+        assert pages_fingerprint(a, [0]) != pages_fingerprint(a, [1])
+        # La huella no depende de los números de xref de cada archivo
+        assert pages_fingerprint(a, [0]) == pages_fingerprint(b, [1])
+
+    master, study_dir = tmp_path / "LABORATORIO.pdf", tmp_path / "LABORATORIO"
+    store = SplitManifestStore(tmp_path / ".split_manifests")
+    _image_master(master, [("30111222", red), ("28111333", red)])
+    before = _split(store, master, study_dir)["outputs"]
+    _image_master(master, [("30111222", blue), ("28111333", red)])
+    after = _split(store, master, study_dir)["outputs"]
+    assert after["30111222"]["fingerprint"] != before["30111222"]["fingerprint"]
+    assert after["28111333"]["fingerprint"] == before["28111333"]["fingerprint"]
+    with fitz.open(study_dir / "30111222.pdf") as doc:
+        assert doc[0].get_pixmap().pixel(100, 110)[:3] == (0, 0, 255)
+
+
+def test_changed_region_config_splits_again(tmp_path):
+    master, study_dir = tmp_path / "LABORATORIO.pdf", tmp_path / "LABORATORIO"
+    _master(master, ["30111222", "28111333"])
+    store = SplitManifestStore(tmp_path / ".split_manifests")
+    no_regions = {}
+    pages = compute_page_map(master, "dni")
+    page_count, outputs = write_split(master, pages, study_dir)
+    entry = store.save("LABORATORIO", master, "dni", study_dir, page_count, outputs,
+                       region=(0.0, 0.0, 1.0, 0.25), regions=no_regions)
+    assert entry["region"] == [0.0, 0.0, 1.0, 0.25] and entry["region_config"] is None
+    assert store.get("LABORATORIO", master, "dni", regions=no_regions) == entry
+
+    # Zona configurada a mano para el estudio: el maestro se vuelve a separar
+    configured = {"LABORATORIO": (0.0, 0.0, 1.0, 0.4)}
+    assert store.get("LABORATORIO", master, "dni", regions=configured) is None
+    entry = store.save("LABORATORIO", master, "dni", study_dir, page_count, outputs,
+                       region=configured["LABORATORIO"], regions=configured)
+    assert store.get("LABORATORIO", master, "dni", regions=configured) == entry
+    assert store.get("LABORATORIO", master, "dni", regions=no_regions) is None
@@ -0,0 +1,43 @@
+import json
+
+import fitz
+
+from app.converters import doc_page_keys
+from app.split_regions import calibrate_region, load_split_regions, split_region
+
+
+def _doc(pages):
+    """PDF en memoria; cada página es una lista de (y, texto)."""
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page()
+        for y, text in lines:
+            page.insert_text((72, y), text)
+    return doc
+
+
+def test_calibration_picks_smallest_header_band():
+    doc = _doc([[(50, "DNI 30111222"), (600, "Resultados")], [(50, "DNI 28111333")]])
+    assert calibrate_region(doc, "dni") == (0.0, 0.0, 1.0, 0.15)
+
+
+def test_calibration_falls_back_to_full_page():
+    doc = _doc([[(780, "DNI 30111222")]])
+    assert calibrate_region(doc, "dni") is None
+    assert calibrate_region(_doc([[(50, "sin datos")]]), "dni") is None
+
+
+def test_page_outside_region_is_read_in_full():
+    doc = _doc([[(50, "DNI 30111222")], [(780, "DNI 28111333")], [(400, "sin datos")]])
+    region = (0.0, 0.0, 1.0, 0.15)
+    assert doc_page_keys(doc, "dni", region=region) == ["30111222", "28111333", None]
+
+
+def test_configured_region_wins_over_calibration(tmp_path):
+    config = tmp_path / "split_regions.json"
+    config.write_text(json.dumps({"regiones": {"ergometria": [0, 0, 0.5, 0.2], "EEG": None}}))
+    regions = load_split_regions(config)
+    assert regions == {"ERGOMETRIA": (0, 0, 0.5, 0.2), "EEG": None}
+    doc = _doc([[(50, "DNI 30111222")]])
+    assert split_region("ERGOMETRIA", doc, "dni", regions) == (0, 0, 0.5, 0.2)
+    assert split_region("EEG", doc, "dni", regions) == (0.0, 0.0, 1.0, 0.15)
@@ -0,0 +1,77 @@
+import pandas as pd
+
+from app.folder_index import FolderIndex
+from app.study_planner import PLAN_COLUMNS, plan_studies
+
+
+STUDY_MAP = {
+    "BASICO": ["LABORATORIO", "ECG", "RX"],
+    "ALTURA": ["EEG", "PSICOS", "AUDIOMETRIA"],
+    "PSICOTECNICO": ["PSICOS"],
+}
+
+
+def _touch(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"")
+
+
+def test_plan_joins_files_by_dni_and_normalized_name(tmp_path):
+    base_path = tmp_path / "20-05-2025"
+    fecha_folder = base_path / "20-05-2025"
+    _touch(fecha_folder / "LABORATORIO" / "30111222.pdf")
+    _touch(fecha_folder / "AUDIOMETRIA" / "28111333.pdf")
+    _touch(base_path / "RX 20-05-2025" / "GARCIA ALEJANDRO 30111222" / "torax.jpg")
+    _touch(base_path / "RX 20-05-2025" / "VIVAS CESAR 33444555" / "informe.txt")
+    for name in ("NUÑEZ_LUCAS.pdf", "PEREZ_GOMEZ_MARIA_JOSE.pdf", "VIVAS_CESAR.pdf", "VIVAS_CÉSAR.pdf"):
+        _touch(fecha_folder / "PSICOS" / name)
+
+    df = pd.DataFrame({
+        "DNI": ["30.111.222", "28111333", "25444555", "33444555"],
+        "APELLIDOS": ["GARCIA", "NUNEZ", "PEREZ  GOMEZ", "VIVAS"],
+        "NOMBRES": ["ALEJANDRO", "LUCAS", "María José", "CÉSAR"],
+        "DETALLE": ["BASICO", "ALTURA", "PSICOTECNICO", "BASICO + PSICOTECNICO"],
+    })
+    plan = plan_studies(df, STUDY_MAP, FolderIndex(tmp_path), base_path, fecha_folder)
+
+    assert list(plan.columns) == PLAN_COLUMNS
+    assert list(zip(plan["idx"], plan["study"])) == [
+        (0, "LABORATORIO"), (0, "ECG"), (0, "RX"),
+        (1, "EEG"), (1, "PSICOS"), (1, "AUDIOMETRIA"),
+        (2, "PSICOS"),
+        (3, "LABORATORIO"), (3, "ECG"), (3, "RX"), (3, "PSICOS"),
+    ]
+    rows = {(i, study): row for i, study, row in zip(plan["idx"], plan["study"], plan.to_dict("records"))}
+
+    assert rows[0, "LABORATORIO"]["path"] == fecha_folder / "LABORATORIO" / "30111222.pdf"
+    assert rows[0, "RX"]["kind"] == "rx"
+    assert rows[0, "RX"]["inputs"] == [base_path / "RX 20-05-2025" / "GARCIA ALEJANDRO 30111222" / "torax.jpg"]
+    assert rows[0, "RX"]["output_name"] == "rx_30111222.pdf"
+    assert rows[1, "AUDIOMETRIA"]["inputs"] == [fecha_folder / "AUDIOMETRIA" / "28111333.pdf"]
+    assert rows[1, "AUDIOMETRIA"]["output_name"] == "audiometria_28111333.pdf"
+
+    # Nombre sin acentos ni espacios de más; con dos candidatos gana el exacto
+    assert rows[1, "PSICOS"]["path"] == fecha_folder / "PSICOS" / "NUÑEZ_LUCAS.pdf"
+    assert rows[2, "PSICOS"]["path"] == fecha_folder / "PSICOS" / "PEREZ_GOMEZ_MARIA_JOSE.pdf"
+    assert rows[3, "PSICOS"]["path"] == fecha_folder / "PSICOS" / "VIVAS_CÉSAR.pdf"
+    assert rows[2, "PSICOS"]["nombre_normalizado"] == "PEREZ GOMEZ MARIA JOSE"
+
+    # Sin cruce exacto: quedan para la búsqueda de siempre
+    for key in [(0, "ECG"), (1, "EEG"), (3, "LABORATORIO"), (3, "ECG"), (3, "RX")]:
+        assert not rows[key]["resolved"] and pd.isna(rows[key]["kind"]), key
+    assert plan["resolved"].sum() == 6
+
+
+def test_plan_with_empty_date_folder_leaves_everything_unresolved(tmp_path):
+    base_path = tmp_path / "20-05-2025"
+    fecha_folder = base_path / "20-05-2025"
+    fecha_folder.mkdir(parents=True)
+    df = pd.DataFrame({
+        "DNI": ["30111222", "28111333"],
+        "APELLIDOS": ["GARCIA", "NUNEZ"],
+        "NOMBRES": ["ALEJANDRO", "LUCAS"],
+        "DETALLE": ["BASICO", "PSICOTECNICO"],
+    })
+    # Ni archivos ni pacientes de AUDIOMETRIA: las dos tablas del cruce vacías
+    plan = plan_studies(df, STUDY_MAP, FolderIndex(tmp_path), base_path, fecha_folder)
+    assert len(plan) == 4 and not plan["resolved"].any()